@@ -0,0 +1,499 @@
+"""A local stand-in for the parts of the GitHub REST API used by the tool.
+
+Organisations are generated on demand from their name: `bench-<n>` has n repositories
+with a realistic spread of pushed_at dates (most repositories recently active, with a long tail of stale ones).
+
+The server counts the requests it receives and the bytes it sends so benchmarks can report on them.
+These counters can be read from `GET /_bench/stats` and the server state reset with `POST /_bench/reset`.
+
+If a rate limit is set, each token may only make that many requests until the server is reset. Responses carry
+GitHub's X-RateLimit headers, and requests over the limit are refused with a 403, as GitHub refuses them.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+
+SEED = 20240101
+
+# GitHub's default and maximum page sizes
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+# The search API only returns the first 1,000 results of a query
+SEARCH_RESULT_LIMIT = 1000
+
+
+def generate_organisation(org: str, size: int, base_url: str) -> dict:
+    """Generates the repositories of an organisation.
+
+    ==========
+
+    Args:
+        org (str): the name of the organisation.
+        size (int): the number of repositories to generate.
+        base_url (str): the URL of the fake GitHub server.
+
+    Returns:
+        dict: {repository name: repository JSON}
+    """
+    rng = random.Random(f"{SEED}-{org}")  # noqa: S311
+    now = datetime.now(UTC)
+
+    repos = {}
+
+    for i in range(size):
+        name = f"{org}-repo-{i:05d}"
+
+        # Log-normal age in days gives many active repositories and a long tail of stale ones
+        age_days = min(rng.lognormvariate(math.log(120), 1.4), 365 * 12)
+        pushed_at = now - timedelta(days=age_days, seconds=rng.randint(0, 86399))
+
+        repos[name] = {
+            "name": name,
+            "full_name": f"{org}/{name}",
+            "url": f"{base_url}/repos/{org}/{name}",
+            "html_url": f"{base_url}/{org}/{name}",
+            "contributors_url": f"{base_url}/repos/{org}/{name}/contributors",
+            "visibility": rng.choices(["public", "private", "internal"], [5, 3, 2])[0],
+            "archived": rng.random() < 0.05,  # noqa: PLR2004
+            "fork": i % 10 == 9,  # noqa: PLR2004
+            "pushed_at": pushed_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "contributor_count": min(int(rng.paretovariate(1.2)), 400),
+        }
+
+    return repos
+
+
+def generate_contributors(repo: dict) -> list:
+    """Generates the contributors of a repository, ordered by number of contributions.
+
+    ==========
+
+    Args:
+        repo (dict): the repository JSON from generate_organisation().
+
+    Returns:
+        list
+    """
+    rng = random.Random(repo["full_name"])  # noqa: S311
+    contributors = []
+
+    for i in range(repo["contributor_count"]):
+        login = f"user{rng.randint(1, 50000)}-{i}"
+        contributors.append(
+            {
+                "login": login,
+                "avatar_url": f"https://avatars.githubusercontent.com/u/{rng.randint(1, 10**8)}?v=4",
+                "html_url": f"https://github.com/{login}",
+                "contributions": int(rng.paretovariate(0.8)) + 1,
+            }
+        )
+
+    contributors.sort(key=lambda x: x["contributions"], reverse=True)
+
+    return contributors
+
+
+def paginate(items: list, query: dict, base_url: str, path: str) -> tuple[list, str]:
+    """Gets a page of items and the Link header GitHub would send with it.
+
+    The page parameter is always last in the links, as the tool reads the page number from the end of the URL.
+
+    ==========
+
+    Args:
+        items (list): all the items.
+        query (dict): the parsed query string of the request.
+        base_url (str): the URL of the fake GitHub server.
+        path (str): the path of the request.
+
+    Returns:
+        tuple: the page of items and the Link header (empty if there is only 1 page).
+    """
+    per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+    page = int(query.get("page", ["1"])[0])
+    last_page = max(math.ceil(len(items) / per_page), 1)
+
+    params = {k: v[0] for k, v in query.items() if k != "page"}
+
+    def link(page_number: int, rel: str) -> str:
+        return f'<{base_url}{path}?{urlencode({**params, "page": page_number})}>; rel="{rel}"'
+
+    links = []
+    if page > 1:
+        links.append(link(page - 1, "prev"))
+        links.append(link(1, "first"))
+    if page < last_page:
+        links.append(link(page + 1, "next"))
+        links.append(link(last_page, "last"))
+
+    return items[(page - 1) * per_page : page * per_page], ", ".join(links)
+
+
+def to_timestamp(value: str, end_of_day: bool = False) -> str:
+    """Converts a search qualifier date or datetime to the pushed_at format so they can be compared as strings."""
+    if "T" in value:
+        return value if value.endswith("Z") else value + "Z"
+
+    return f"{value}T23:59:59Z" if end_of_day else f"{value}T00:00:00Z"
+
+
+def search_repositories(repos: list, query: str) -> list:
+    """Filters repositories using the qualifiers of a GitHub search query.
+
+    Supports the org, archived, fork, is and pushed (<date, >date or start..end) qualifiers.
+    As on GitHub, forks are left out unless the query has fork:true (or fork:only).
+
+    ==========
+
+    Args:
+        repos (list): the repositories of the organisation.
+        query (str): the search query.
+
+    Returns:
+        list
+    """
+    qualifiers = [qualifier.partition(":")[::2] for qualifier in query.split()]
+    forks = next((value for key, value in qualifiers if key == "fork"), "false")
+
+    if forks == "only":
+        results = [repo for repo in repos if repo["fork"]]
+    elif forks == "true":
+        results = repos
+    else:
+        results = [repo for repo in repos if not repo["fork"]]
+
+    for key, value in qualifiers:
+        if key == "archived":
+            results = [repo for repo in results if repo["archived"] == (value == "true")]
+
+        elif key == "is" and value in ("public", "private", "internal"):
+            results = [repo for repo in results if repo["visibility"] == value]
+
+        elif key == "pushed" and value.startswith("<"):
+            results = [repo for repo in results if repo["pushed_at"] < to_timestamp(value[1:])]
+
+        elif key == "pushed" and value.startswith(">"):
+            results = [repo for repo in results if repo["pushed_at"] > to_timestamp(value[1:], True)]
+
+        elif key == "pushed" and ".." in value:
+            start, end = value.split("..")
+            results = [repo for repo in results if to_timestamp(start) <= repo["pushed_at"] <= to_timestamp(end, True)]
+
+    return results
+
+
+class FakeGitHubState:
+    """Holds the organisations served by the fake GitHub server and its counters."""
+
+    def __init__(self, base_url: str, latency_ms: float = 0, rate_limit: int = 0) -> None:
+        self.base_url = base_url
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        # The rate limit resets an hour after the server is reset
+        self.rate_limit_reset = int(time.time()) + 3600
+        self.lock = threading.Lock()
+        self.organisations: dict[str, dict] = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        # {token: requests made with it}
+        self.token_requests: dict[str, int] = {}
+
+    def get_organisation(self, org: str) -> dict:
+        with self.lock:
+            if org not in self.organisations:
+                try:
+                    size = int(org.rsplit("-", 1)[-1])
+                except ValueError:
+                    size = 0
+
+                self.organisations[org] = generate_organisation(org, size, self.base_url)
+
+            return self.organisations[org]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.organisations.clear()
+            self.requests = 0
+            self.bytes_sent = 0
+            self.token_requests.clear()
+            self.rate_limit_reset = int(time.time()) + 3600
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """Handles requests to the fake GitHub server."""
+
+    server: "FakeGitHubServer"
+
+    # The X-RateLimit headers of the request being handled (set by parse())
+    rate_limit_headers: dict[str, str]
+
+    def log_message(self, format: str, *args) -> None:
+        """Silences the default request logging."""
+
+    def send_json(self, body: object, status: int = HTTPStatus.OK, link: str = "") -> None:
+        payload = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for header, value in self.rate_limit_headers.items():
+            self.send_header(header, value)
+        if link:
+            self.send_header("Link", link)
+        self.end_headers()
+        self.wfile.write(payload)
+
+        if not self.path.startswith("/_bench/"):
+            with self.server.state.lock:
+                self.server.state.bytes_sent += len(payload)
+
+    def not_found(self) -> None:
+        self.send_json({"message": "Not Found"}, HTTPStatus.NOT_FOUND)
+
+    def parse(self) -> tuple[list, dict]:
+        url = urlparse(self.path)
+        state = self.server.state
+        self.rate_limit_headers = {}
+
+        if not url.path.startswith("/_bench/"):
+            token = self.headers.get("Authorization", "")
+
+            with state.lock:
+                state.requests += 1
+                state.token_requests[token] = state.token_requests.get(token, 0) + 1
+                used = state.token_requests[token]
+
+            if state.rate_limit:
+                self.rate_limit_headers = {
+                    "X-RateLimit-Limit": str(state.rate_limit),
+                    "X-RateLimit-Remaining": str(max(state.rate_limit - used, 0)),
+                    "X-RateLimit-Reset": str(state.rate_limit_reset),
+                }
+
+            if state.latency:
+                time.sleep(state.latency)
+
+        return [part for part in url.path.split("/") if part], parse_qs(url.query)
+
+    def rate_limited(self) -> bool:
+        """Refuses the request with a 403 if its token has used up its rate limit."""
+        if self.rate_limit_headers.get("X-RateLimit-Remaining") != "0":
+            return False
+
+        token = self.headers.get("Authorization", "")
+
+        # The request which used the last of the limit is still served
+        if self.server.state.token_requests.get(token, 0) <= self.server.state.rate_limit:
+            return False
+
+        self.send_json({"message": "API rate limit exceeded"}, HTTPStatus.FORBIDDEN)
+        return True
+
+    def find_repo(self, parts: list) -> dict | None:
+        org, name = parts[1], parts[2]
+        return self.server.state.get_organisation(org).get(name)
+
+    def search(self, query: dict) -> None:
+        """Sends a page of the repositories matching a search, as the search API does."""
+        state = self.server.state
+        search_query = query.get("q", [""])[0]
+        org = next((q[4:] for q in search_query.split() if q.startswith("org:")), "")
+
+        repos = search_repositories(list(state.get_organisation(org).values()), search_query)
+        repos.sort(key=lambda x: x["pushed_at"], reverse=True)
+
+        per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = int(query.get("page", ["1"])[0])
+
+        if page * per_page > SEARCH_RESULT_LIMIT:
+            self.send_json(
+                {"message": "Only the first 1000 search results are available"}, HTTPStatus.UNPROCESSABLE_ENTITY
+            )
+        else:
+            page_repos, link = paginate(repos, query, state.base_url, urlparse(self.path).path)
+            self.send_json({"total_count": len(repos), "incomplete_results": False, "items": page_repos}, link=link)
+
+    def do_GET(self) -> None:
+        """Handles GET requests."""
+        parts, query = self.parse()
+        state = self.server.state
+
+        if self.rate_limited():
+            return
+
+        if parts == ["_bench", "stats"]:
+            self.send_json({"requests": state.requests, "bytes": state.bytes_sent, "tokens": state.token_requests})
+
+        elif len(parts) == 3 and parts[0] == "orgs" and parts[2] == "repos":  # noqa: PLR2004
+            repos = list(state.get_organisation(parts[1]).values())
+            repo_type = query.get("type", ["all"])[0]
+
+            if repo_type in ("public", "private", "internal"):
+                repos = [repo for repo in repos if repo["visibility"] == repo_type]
+
+            repos.sort(key=lambda x: x["pushed_at"], reverse=True)
+
+            page, link = paginate(repos, query, state.base_url, urlparse(self.path).path)
+            self.send_json(page, link=link)
+
+        elif parts == ["search", "repositories"]:
+            self.search(query)
+
+        elif len(parts) == 3 and parts[0] == "repos":  # noqa: PLR2004
+            repo = self.find_repo(parts)
+
+            if repo is None:
+                self.not_found()
+            else:
+                self.send_json(repo)
+
+        elif len(parts) == 4 and parts[0] == "repos" and parts[3] == "contributors":  # noqa: PLR2004
+            repo = self.find_repo(parts)
+
+            if repo is None:
+                self.not_found()
+            else:
+                page, link = paginate(generate_contributors(repo), query, state.base_url, urlparse(self.path).path)
+                self.send_json(page, link=link)
+
+        else:
+            self.not_found()
+
+    def do_PATCH(self) -> None:
+        """Handles PATCH requests (archiving and unarchiving repositories)."""
+        parts, _ = self.parse()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        if self.rate_limited():
+            return
+
+        repo = self.find_repo(parts) if len(parts) == 3 and parts[0] == "repos" else None  # noqa: PLR2004
+
+        if repo is None:
+            self.not_found()
+            return
+
+        if "archived" in body:
+            repo["archived"] = bool(body["archived"])
+
+        self.send_json(repo)
+
+    def do_POST(self) -> None:
+        """Handles POST requests (resetting the server)."""
+        parts, _ = self.parse()
+
+        if parts == ["_bench", "reset"]:
+            self.server.state.reset()
+            self.send_json({})
+        else:
+            self.not_found()
+
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str, port: int, latency_ms: float = 0, rate_limit: int = 0) -> None:
+        super().__init__((host, port), FakeGitHubHandler)
+        self.state = FakeGitHubState(f"http://{host}:{self.server_address[1]}", latency_ms, rate_limit)
+
+
+def _serve(host: str, port: int, latency_ms: float, rate_limit: int, ready: multiprocessing.Queue) -> None:
+    server = FakeGitHubServer(host, port, latency_ms, rate_limit)
+    ready.put(server.state.base_url)
+    server.serve_forever()
+
+
+def start_server(
+    host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, rate_limit: int = 0
+) -> tuple[multiprocessing.Process, str]:
+    """Starts the fake GitHub server in a separate process.
+
+    Running the server in its own process keeps its CPU and memory use out of the benchmark's measurements.
+
+    ==========
+
+    Args:
+        host (str): the host to listen on.
+        port (int): the port to listen on. Defaults to 0 (any free port).
+        latency_ms (float): artificial latency added to each API request.
+        rate_limit (int): the requests each token may make until the server is reset. Defaults to 0 (unlimited).
+
+    Returns:
+        tuple: the server process and its base URL.
+    """
+    ready: multiprocessing.Queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(host, port, latency_ms, rate_limit, ready), daemon=True)
+    process.start()
+
+    return process, ready.get(timeout=10)
+
+
+def get_stats(base_url: str) -> dict:
+    """Gets the request and byte counters of a running fake GitHub server."""
+    return requests.get(f"{base_url}/_bench/stats", timeout=10).json()
+
+
+def reset_server(base_url: str) -> None:
+    """Regenerates all organisations and resets the counters of a running fake GitHub server."""
+    requests.post(f"{base_url}/_bench/reset", timeout=10)
+
+
+class LocalGitHubInterface:
+    """A github_interface which sends requests to the fake GitHub server instead of api.github.com.
+
+    Responses are handled the same way as github_api_toolkit: a Response is returned if successful,
+    otherwise the raised HTTPError.
+    """
+
+    def __init__(self, token: str, base_url: str) -> None:
+        self.headers = {"Authorization": f"token {token}"}
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def handle_response(self, response: requests.Response) -> requests.Response | requests.HTTPError:
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            return e
+        return response
+
+    def get(
+        self, url: str, params: dict | None = None, add_prefix: bool = True
+    ) -> requests.Response | requests.HTTPError:
+        if add_prefix:
+            url = self.base_url + url
+        return self.handle_response(self.session.get(url, headers=self.headers, params=params or {}, timeout=30))
+
+    def patch(self, url: str, params: dict, add_prefix: bool = True) -> requests.Response | requests.HTTPError:
+        if add_prefix:
+            url = self.base_url + url
+        return self.handle_response(self.session.patch(url, headers=self.headers, json=params, timeout=30))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake GitHub server in the foreground.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_github = FakeGitHubServer(args.host, args.port, args.latency_ms, args.rate_limit)
+    print(f"Fake GitHub serving on {fake_github.state.base_url} (organisations are named bench-<size>)")
+    fake_github.serve_forever()
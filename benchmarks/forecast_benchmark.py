@@ -0,0 +1,95 @@
+"""Measures the archive forecast (forecast.py) for a large organisation, against a loop over the repositories.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/forecast_benchmark.py --repos 100000 --days 365 --thresholds 10
+
+A repositories.json of the given size is generated (see memory_benchmark.py) and decoded, then:
+
+- dates: the time to load the repositories' dates into NumPy arrays (RepositoryDates.from_repositories).
+- forecast: the time to forecast every threshold for the given days from the arrays.
+- loop: the time to compute the same forecast with a Python loop over the repositories for each threshold.
+
+The script exits with a non-zero status if the forecast and the loop disagree.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+import forecast  # noqa: E402
+import models  # noqa: E402
+from memory_benchmark import generate_repositories  # noqa: E402
+from run_benchmarks import percentile  # noqa: E402
+
+
+def loop_forecast(repos: list[models.Repository], today: date, days: int, thresholds: list[int]) -> list[list[int]]:
+    """Counts the repositories which become eligible on each day, for each threshold, one repository at a time."""
+    counts = []
+
+    for threshold in thresholds:
+        newly_eligible = [0] * days
+
+        for repo in repos:
+            start = repo.exemption.until if repo.exemption is not None else repo.date_added
+            due = max((start - today).days + threshold, 0)
+
+            if due < days:
+                newly_eligible[due] += 1
+
+        counts.append(newly_eligible)
+
+    return counts
+
+
+def time_runs(run, runs: int) -> tuple[float, object]:
+    durations = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run()
+        durations.append(time.perf_counter() - start)
+
+    return percentile(durations, 50), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=100000, help="the number of repositories in the store")
+    parser.add_argument("--days", type=int, default=365, help="the number of days to forecast")
+    parser.add_argument("--thresholds", type=int, default=10, help="the number of thresholds to forecast")
+    parser.add_argument("--runs", type=int, default=5, help="times each measurement is taken")
+    args = parser.parse_args()
+
+    repos = models.decode_repositories(json.loads(generate_repositories(args.repos)))
+    today = date.today()
+    thresholds = [30 * (i + 1) for i in range(args.thresholds)]
+
+    dates_s, dates = time_runs(lambda: forecast.RepositoryDates.from_repositories(repos, today), args.runs)
+    forecast_s, result = time_runs(lambda: forecast.forecast(dates, today, args.days, thresholds), args.runs)
+    loop_s, expected = time_runs(lambda: loop_forecast(repos, today, args.days, thresholds), 1)
+
+    matches = [series["newlyEligible"] for series in result["forecasts"]] == expected
+
+    print(
+        f"Forecast of {args.thresholds} thresholds for {args.days} days ({args.repos} repositories, p50 of {args.runs} runs)\n"
+    )
+    print(f"  {'dates (NumPy arrays)':<28} {dates_s:>8.3f}s")
+    print(f"  {'forecast (vectorised)':<28} {forecast_s:>8.3f}s")
+    print(f"  {'loop (one run)':<28} {loop_s:>8.3f}s")
+    print(f"\nForecast matches the loop: {'yes' if matches else 'NO'}")
+
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
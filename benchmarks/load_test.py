@@ -0,0 +1,491 @@
+"""Load tests the tool's main routes with concurrent users, on the production server and the development server.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/load_test.py --repos 1000 --workers 1 2 4 --concurrency 16 --duration 15
+
+For each server, the tool is started against the fake GitHub server and an S3 stand-in shared by its workers
+(see local_app.py), with an organisation of the given size already found. Concurrent clients, each with their
+own session, then request a random mix of routes as fast as they can for the given duration:
+
+- manage: GET /manage_repositories
+- exempt: POST /set_exempt_date for one of the repositories which are not eligible for archive. Each client
+  exempts its own repositories, so the last reason each client set for a repository should be the one stored.
+- recently_archived: GET /recently_archived
+- archive: GET /archive_repositories. Half of the repositories are eligible for archive when the server starts.
+  Each client records the batches it was told it created.
+
+--mix sets how often each route is requested (i.e --mix manage=70 exempt=15 recently_archived=10 archive=5).
+
+The benchmark reports the requests completed, error rate, throughput and latency percentiles of each route and
+of all of them, and the lost updates once the clients had finished:
+
+- exemptions which succeeded but were not stored.
+- archive batches which were created but not stored, stored more than once, or which archived a repository that
+  is still stored or was also archived by another batch.
+
+The script exits with a non-zero status if any updates were lost.
+
+Results can be saved as a baseline with --save-baseline. When run with --baseline, the script exits with a
+non-zero status if any result is worse than the baseline by more than --threshold.
+
+A running instance can be load tested instead with --url (the clients need to be able to get a token).
+Lost updates are only counted, and exemptions only made, against local_app.py.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+import fake_github
+import local_s3
+import requests
+from run_benchmarks import LATENCY_NOISE_FLOOR_S, percentile
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+PATH = "/manage_repositories"
+
+# How often each route is requested by default (out of the total of the weights)
+DEFAULT_MIX = {"manage": 70, "exempt": 15, "recently_archived": 10, "archive": 5}
+
+# Metrics compared against the baseline, by whether a higher or lower value is worse
+HIGHER_IS_WORSE = ("p50_s", "p99_s", "error_rate", "lost_updates")
+LOWER_IS_WORSE = ("throughput_rps",)
+
+# The redirect of an archive which created a batch (i.e /recently_archived?msg=Batch%2012%20created)
+BATCH_CREATED_PATTERN = re.compile(r"Batch%20(\d+)%20created")
+
+# Rendered by templates/error.html, which the tool responds with (as a 200) when a route fails
+ERROR_PAGE_TITLE = b"Repository Archive Tool - Error"
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout_s: float) -> None:
+    """Waits until the server responds, raising an error if it exits or takes longer than timeout_s."""
+    deadline = time.monotonic() + timeout_s
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode}")
+
+        with contextlib.suppress(requests.ConnectionError):
+            requests.get(url + PATH, timeout=30)
+            return
+
+        time.sleep(0.2)
+
+    raise RuntimeError(f"The server did not start within {timeout_s}s")
+
+
+@contextlib.contextmanager
+def serve(server: str, workers: int, threads: int, stand_ins: dict[str, str]):
+    """Starts the tool with the given server ("gunicorn" or "dev"), yielding its URL.
+
+    stand_ins is the environment local_app.py reads the fake GitHub and S3 from (see get_stand_ins()).
+    """
+    port = get_free_port()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            **stand_ins,
+            "LOAD_TEST_WORKDIR": workdir,
+            "PORT": str(port),
+            "GUNICORN_WORKERS": str(workers),
+            "GUNICORN_THREADS": str(threads),
+        }
+
+        if server == "gunicorn":
+            command = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py"]
+            command += ["--pythonpath", "repoarchivetool,benchmarks", "--access-logfile", os.devnull, "local_app:app"]
+        else:
+            command = [sys.executable, "benchmarks/local_app.py"]
+
+        log_path = os.path.join(workdir, "server.log")
+
+        with open(log_path, "w", encoding="utf-8") as log:
+            process = subprocess.Popen(  # noqa: S603
+                command, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+
+            try:
+                url = f"http://127.0.0.1:{port}"
+                wait_until_ready(url, process, timeout_s=120)
+                yield url
+            except RuntimeError:
+                with open(log_path, encoding="utf-8") as f:
+                    print(f.read()[-4000:], file=sys.stderr)
+                raise
+            finally:
+                process.terminate()
+                process.wait(timeout=120)
+
+
+def get_stand_ins(github_url: str, s3_address: str, s3_authkey: bytes, repos: int) -> dict[str, str]:
+    """Gets the environment which points local_app.py at the fake GitHub and the shared S3."""
+    return {
+        "LOAD_TEST_GITHUB_URL": github_url,
+        "LOAD_TEST_S3_ADDRESS": s3_address,
+        "LOAD_TEST_S3_AUTHKEY": s3_authkey.hex(),
+        "LOAD_TEST_REPOS": str(repos),
+    }
+
+
+def get_stored_repositories(url: str) -> dict | None:
+    """Gets each stored repository's exemption reason and eligibility from local_app.py, or None if it is not available."""
+    with contextlib.suppress(requests.RequestException, ValueError):
+        response = requests.get(url + "/_load_test/repositories", timeout=120)
+
+        if response.ok:
+            return response.json()
+
+    return None
+
+
+def get_stored_archive_batches(url: str) -> list | None:
+    """Gets the repositories archived by each stored archive batch from local_app.py, or None if it is not available."""
+    with contextlib.suppress(requests.RequestException, ValueError):
+        response = requests.get(url + "/_load_test/archive_batches", timeout=120)
+
+        if response.ok:
+            return response.json()
+
+    return None
+
+
+def count_lost_archives(created: list[int], batches: list, stored: dict) -> int:
+    """Counts the archive batches which were lost or overwritten by concurrent archives.
+
+    ==========
+
+    Args:
+        created (list): the IDs of the batches the clients were told they created.
+        batches (list): the stored archive batches, from get_stored_archive_batches().
+        stored (dict): the stored repositories, from get_stored_repositories().
+
+    Returns:
+        int: the created batches which are not stored, the batch IDs stored more than once, and the repositories
+        which are archived by more than one batch or still stored after being archived.
+    """
+    batch_ids = [batch["batchID"] for batch in batches]
+    archived = [repo_name for batch in batches for repo_name in batch["repos"]]
+
+    missing = sum(batch_id not in batch_ids for batch_id in set(created))
+    duplicated = (len(batch_ids) - len(set(batch_ids))) + (len(archived) - len(set(archived)))
+    still_stored = sum(repo_name in stored for repo_name in set(archived))
+
+    return missing + duplicated + still_stored
+
+
+def is_ok(response: requests.Response) -> bool:
+    """Checks whether the tool handled a request, rather than responding with an error status or its error page."""
+    return (
+        response.status_code < HTTPStatus.BAD_REQUEST
+        and "error" not in response.headers.get("Location", "")
+        and ERROR_PAGE_TITLE not in response.content
+    )
+
+
+class Client:
+    """A user with their own session, requesting a random mix of routes."""
+
+    def __init__(self, url: str, index: int, mix: dict[str, int], targets: list[str]) -> None:
+        self.url = url
+        self.index = index
+        self.session = requests.Session()
+        # Each client is seeded, so the same routes are requested in the same order every run
+        self.random = random.Random(index)  # noqa: S311
+        self.routes = list(mix)
+        self.weights = list(mix.values())
+        # The repositories this client exempts
+        self.targets = targets
+        self.exemptions = 0
+        # The last reason this client stored for each of its repositories ({repository: reason})
+        self.expected: dict[str, str] = {}
+        # The IDs of the archive batches this client created
+        self.batches: list[int] = []
+
+    def exempt(self) -> bool:
+        repo_name = self.targets[self.exemptions % len(self.targets)]
+        reason = f"Load test client {self.index} exemption {self.exemptions}"
+        self.exemptions += 1
+
+        response = self.session.post(
+            f"{self.url}/set_exempt_date",
+            params={"repoName": repo_name},
+            data={"date": "3", "reason": reason, "name": "Load Test", "email": "load.test@ons.gov.uk"},
+            allow_redirects=False,
+            timeout=60,
+        )
+
+        if is_ok(response):
+            self.expected[repo_name] = reason
+            return True
+
+        # The exemption may or may not have been stored, so the repository can no longer be checked
+        self.expected.pop(repo_name, None)
+        return False
+
+    def archive(self) -> bool:
+        response = self.session.get(f"{self.url}/archive_repositories", allow_redirects=False, timeout=300)
+
+        if not is_ok(response):
+            return False
+
+        if match := BATCH_CREATED_PATTERN.search(response.headers.get("Location", "")):
+            self.batches.append(int(match.group(1)))
+
+        return True
+
+    def request(self, route: str) -> bool:
+        if route == "exempt":
+            return self.exempt()
+
+        if route == "archive":
+            return self.archive()
+
+        path = {"manage": "/manage_repositories", "recently_archived": "/recently_archived"}[route]
+
+        return is_ok(self.session.get(self.url + path, allow_redirects=False, timeout=300))
+
+    def run(
+        self, deadline: float, latencies: dict[str, list[float]], errors: dict[str, int], lock: threading.Lock
+    ) -> None:
+        # The first request sets up the session (i.e gets an installation token), so is not measured
+        self.session.get(self.url + PATH, timeout=60)
+
+        while time.monotonic() < deadline:
+            route = self.random.choices(self.routes, self.weights)[0]
+            start = time.perf_counter()
+
+            try:
+                ok = self.request(route)
+            except requests.RequestException:
+                ok = False
+
+            duration = time.perf_counter() - start
+
+            with lock:
+                if ok:
+                    latencies[route].append(duration)
+                else:
+                    errors[route] += 1
+
+
+def summarise(latencies: list[float], errors: int, duration_s: float) -> dict:
+    total = len(latencies) + errors
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": errors / total if total else 0,
+        "throughput_rps": len(latencies) / duration_s,
+        "p50_s": percentile(latencies, 50) if latencies else 0,
+        "p95_s": percentile(latencies, 95) if latencies else 0,
+        "p99_s": percentile(latencies, 99) if latencies else 0,
+    }
+
+
+def run_clients(url: str, concurrency: int, duration_s: float, mix: dict[str, int]) -> dict:
+    """Requests the mix of routes from concurrent clients for duration_s seconds.
+
+    ==========
+
+    Returns:
+        dict: the results of each route, and of all of them ("all"), which also has the lost updates
+        (None if the stored repositories could not be checked).
+    """
+    stored = get_stored_repositories(url)
+    targets = sorted(name for name, repo in (stored or {}).items() if not repo["eligible"])
+
+    if len(targets) < concurrency:
+        # Without repositories of their own to exempt, clients would overwrite each other's exemptions
+        mix = {route: weight for route, weight in mix.items() if route != "exempt"}
+
+    clients = [Client(url, i, mix, targets[i::concurrency]) for i in range(concurrency)]
+    latencies: dict[str, list[float]] = {route: [] for route in mix}
+    errors = dict.fromkeys(mix, 0)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration_s
+
+    threads = [threading.Thread(target=client.run, args=(deadline, latencies, errors, lock)) for client in clients]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    results = {route: summarise(latencies[route], errors[route], duration_s) for route in mix}
+    results["all"] = summarise(
+        [latency for route in mix for latency in latencies[route]], sum(errors.values()), duration_s
+    )
+
+    stored = get_stored_repositories(url) if stored is not None else None
+    batches = get_stored_archive_batches(url) if stored is not None else None
+    results["all"]["lost_updates"] = (
+        sum(
+            stored.get(repo_name, {}).get("exemptReason") != reason
+            for client in clients
+            for repo_name, reason in client.expected.items()
+        )
+        + count_lost_archives([batch_id for client in clients for batch_id in client.batches], batches, stored)
+        if stored is not None and batches is not None
+        else None
+    )
+
+    return results
+
+
+def parse_mix(values: list[str]) -> dict[str, int]:
+    """Parses --mix (route=weight pairs) into the weight of each route."""
+    mix = {}
+
+    for value in values:
+        route, _, weight = value.partition("=")
+
+        if route not in DEFAULT_MIX or not weight.isdigit():
+            raise argparse.ArgumentTypeError(
+                f"{value} is not one of {', '.join(DEFAULT_MIX)} with a weight (i.e manage=70)"
+            )
+
+        mix[route] = int(weight)
+
+    return {route: weight for route, weight in mix.items() if weight > 0}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Compares results against a baseline, returning a description of each regression."""
+    regressions = []
+
+    for server, routes in results.items():
+        for route, result in routes.items():
+            expected = baseline.get(server, {}).get(route)
+
+            if expected is None:
+                continue
+
+            for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+                if result.get(metric) is None or expected.get(metric) is None:
+                    continue
+
+                if metric.endswith("_s") and result[metric] < LATENCY_NOISE_FLOOR_S:
+                    continue
+
+                if metric in HIGHER_IS_WORSE and result[metric] > expected[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{route} ({server}): {metric} {result[metric]:.3f} > baseline {expected[metric]:.3f} (+{threshold:.0%})"
+                    )
+
+                if metric in LOWER_IS_WORSE and result[metric] < expected[metric] * (1 - threshold):
+                    regressions.append(
+                        f"{route} ({server}): {metric} {result[metric]:.3f} < baseline {expected[metric]:.3f} (-{threshold:.0%})"
+                    )
+
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    header = f"{'server':<22} {'route':<18} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'lost':>5}"
+    print(header)
+    print("-" * len(header))
+
+    for server, routes in results.items():
+        for route, r in routes.items():
+            lost = r.get("lost_updates")
+            print(
+                f"{server:<22} {route:<18} {r['requests']:>9} {r['error_rate']:>7.1%} {r['throughput_rps']:>8.1f} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['p99_s']:>9.3f} {'-' if lost is None else lost:>5}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=1000, help="the size of the organisation")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="gunicorn worker counts to test")
+    parser.add_argument("--threads", type=int, default=4, help="threads per gunicorn worker")
+    parser.add_argument("--no-dev-server", action="store_true", help="skip the development server")
+    parser.add_argument("--concurrency", type=int, default=16, help="the number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=15, help="seconds to run each load test for")
+    parser.add_argument("--mix", nargs="+", help="route=weight pairs setting how often each route is requested")
+    parser.add_argument("--url", help="load test a running instance instead of starting one")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON file")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    results = {}
+
+    if args.url:
+        results[args.url] = run_clients(args.url.rstrip("/"), args.concurrency, args.duration, mix)
+    else:
+        github, github_url = fake_github.start_server()
+        s3, s3_address, s3_authkey = local_s3.start_shared()
+
+        stand_ins = get_stand_ins(github_url, s3_address, s3_authkey, args.repos)
+
+        try:
+            servers = [] if args.no_dev_server else [("dev", "development server", 1)]
+            servers += [("gunicorn", f"gunicorn {workers}x{args.threads}", workers) for workers in args.workers]
+
+            for server, name, workers in servers:
+                with serve(server, workers, args.threads, stand_ins) as url:
+                    results[name] = run_clients(url, args.concurrency, args.duration, mix)
+        finally:
+            github.terminate()
+            s3.shutdown()
+
+    print(f"{args.repos} repositories, {args.concurrency} clients, {args.duration:.0f}s each\n")
+    print_results(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=4)
+
+    lost = sum(routes["all"]["lost_updates"] or 0 for routes in results.values())
+
+    if lost > 0:
+        print(f"\n{lost} updates were lost")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+
+        print(f"\nNo regressions beyond {args.threshold:.0%} of the baseline.")
+
+    return 1 if lost > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""The tool, wired to the fake GitHub server and an in-memory S3, for load testing with a real WSGI server.
+
+This is started by load_test.py, either with gunicorn (using the production configuration):
+
+    poetry run gunicorn --config gunicorn.conf.py --pythonpath benchmarks local_app:app
+
+or with Flask's development server (python benchmarks/local_app.py).
+
+Settings (environment variables):
+
+- LOAD_TEST_GITHUB_URL: the base URL of a running fake GitHub server.
+- LOAD_TEST_REPOS: the size of the organisation to find repositories in. Defaults to 1000.
+- LOAD_TEST_WORKDIR: the directory to keep the app's local files in.
+- LOAD_TEST_S3_ADDRESS and LOAD_TEST_S3_AUTHKEY (hex): a LocalS3 served by local_s3.start_shared(), shared by every
+  worker as S3 would be. Without them, each process has its own in-memory S3, so workers do not see each other's writes.
+- PORT: the port the development server listens on. Defaults to 5000.
+
+The organisation's repositories are found when this module is loaded. With gunicorn this happens once, in the
+master process, so every worker starts with a copy of the same store. Every other repository is then made
+eligible for archive, so /archive_repositories has repositories to archive.
+
+GET /_load_test/repositories lists each stored repository's exemption reason and whether it is eligible for archive,
+so load_test.py can choose repositories to exempt and check that none of its exemptions were lost.
+GET /_load_test/archive_batches lists the repositories archived by each stored archive batch, so it can check that
+no archive batch was lost or archived the same repositories as another.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import os
+from datetime import datetime, timedelta
+
+import local_s3
+from run_benchmarks import Harness
+
+harness = Harness(os.environ["LOAD_TEST_GITHUB_URL"], os.environ["LOAD_TEST_WORKDIR"])
+
+if "LOAD_TEST_S3_ADDRESS" in os.environ:
+    harness.storage.get_s3_client = local_s3.connect(
+        os.environ["LOAD_TEST_S3_ADDRESS"], bytes.fromhex(os.environ["LOAD_TEST_S3_AUTHKEY"])
+    )
+    harness.s3 = harness.storage.get_s3_client()
+
+# Every session is given the same installation token, without calling AWS or GitHub
+harness.github_auth.get_installation_token = lambda org, github_app=None: (
+    "benchmark-token",
+    datetime.now().astimezone() + timedelta(days=1),
+)
+
+org = f"bench-{os.getenv('LOAD_TEST_REPOS', '1000')}"
+
+app = harness.app.app
+
+
+@app.route("/_load_test/repositories")
+def load_test_repositories() -> dict:
+    """Lists each stored repository's exemption reason (or None) and whether it is eligible for archive."""
+    return {
+        repo.name: {
+            "exemptReason": repo.exemption.reason if repo.exemption is not None else None,
+            "eligible": harness.sweeps.is_eligible_for_archive(repo),
+        }
+        for repo in harness.organisation_storage.load_repositories(org)
+    }
+
+
+@app.route("/_load_test/archive_batches")
+def load_test_archive_batches() -> list:
+    """Lists each stored archive batch's ID and the repositories it archived successfully."""
+    return [
+        {"batchID": batch.batch_id, "repos": [entry.name for entry in batch.repos if entry.status == "Success"]}
+        for batch in harness.organisation_storage.load_archive_list(org)
+    ]
+
+
+# Routes can only be added before the app handles its first request, so the repositories are found afterwards
+harness.reset(org)
+harness.find()
+harness.make_eligible({repo.name for repo in harness.organisation_storage.load_repositories(org, "name")[::2]})
+
+
+if __name__ == "__main__":
+    app.run(port=int(os.getenv("PORT", "5000")), threaded=True)
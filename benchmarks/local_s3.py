@@ -0,0 +1,261 @@
+"""An in-memory stand-in for the S3 client used by storage_interface.
+
+Only the client methods the tool uses are implemented. Missing keys raise the same ClientError as boto3,
+so storage_interface's error handling is exercised as it would be against S3.
+
+A LocalS3 can also be served to several processes (start_shared() and connect()), so gunicorn's workers
+see each other's writes as they would in S3.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, W0613
+
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime
+from multiprocessing.managers import BaseManager
+
+from botocore.exceptions import ClientError
+
+
+class LocalS3:
+    """Stores objects in memory and counts the operations and bytes moved.
+
+    If bandwidth is set (in bytes per second), each operation also takes as long as moving its bytes over a link
+    of that speed would, to approximate the time spent transferring objects to and from S3. If latency is set
+    (in seconds), each operation takes at least that long, to approximate the round trip of each request.
+    """
+
+    def __init__(self, bandwidth: float | None = None, latency: float = 0) -> None:
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.objects: dict[tuple[str, str], dict] = {}
+        # {upload ID: (bucket, key, metadata, {part number: body})}
+        self.uploads: dict[str, tuple[str, str, dict, dict[int, bytes]]] = {}
+        self.operations: dict[str, int] = {}
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.operations.clear()
+            self.bytes_uploaded = 0
+            self.bytes_downloaded = 0
+
+    def clear(self) -> None:
+        with self.lock:
+            self.objects.clear()
+            self.uploads.clear()
+        self.reset_counters()
+
+    def _count(self, operation: str, uploaded: int = 0, downloaded: int = 0) -> None:
+        with self.lock:
+            self.operations[operation] = self.operations.get(operation, 0) + 1
+            self.bytes_uploaded += uploaded
+            self.bytes_downloaded += downloaded
+
+        if self.bandwidth or self.latency:
+            time.sleep(self.latency + (uploaded + downloaded) / (self.bandwidth or float("inf")))
+
+    def _get(self, bucket: str, key: str, operation: str) -> dict:
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise ClientError(
+                {"Error": {"Code": "NoSuchKey", "Message": "The specified key does not exist."}}, operation
+            ) from None
+
+    def _put(self, bucket: str, key: str, body: bytes, **metadata) -> dict:
+        obj = {
+            "Body": body,
+            "LastModified": datetime.now(UTC),
+            "ETag": f'"{hashlib.md5(body).hexdigest()}"',  # noqa: S324
+            **metadata,
+        }
+
+        with self.lock:
+            self.objects[(bucket, key)] = obj
+
+        return obj
+
+    def _describe(self, obj: dict) -> dict:
+        description = {k: v for k, v in obj.items() if k != "Body"}
+        description["ContentLength"] = len(obj["Body"])
+        return description
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        obj = self._get(Bucket, Key, "HeadObject")
+        self._count("HeadObject")
+        return self._describe(obj)
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        obj = self._get(Bucket, Key, "GetObject")
+        self._count("GetObject", downloaded=len(obj["Body"]))
+        return {**self._describe(obj), "Body": io.BytesIO(obj["Body"])}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes | str = b"", **kwargs) -> dict:
+        if isinstance(Body, str):
+            Body = Body.encode()
+        elif not isinstance(Body, bytes):
+            Body = Body.read()
+
+        obj = self._put(Bucket, Key, Body, **kwargs)
+        self._count("PutObject", uploaded=len(Body))
+        return {"ETag": obj["ETag"]}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        self._count("DeleteObject")
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **kwargs) -> dict:
+        self._count("ListObjectsV2")
+
+        with self.lock:
+            contents = [
+                {"Key": key, **self._describe(obj)}
+                for (bucket, key), obj in sorted(self.objects.items())
+                if bucket == Bucket and key.startswith(Prefix)
+            ]
+
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **kwargs) -> None:
+        try:
+            obj = self._get(Bucket, Key, "HeadObject")
+        except ClientError as e:
+            # boto3's transfer manager reports missing keys as a 404 from HeadObject
+            e.response["Error"]["Code"] = "404"
+            raise
+
+        # Like boto3's transfer manager, the file is downloaded to a temporary file which is then renamed over it
+        temp_filename = f"{Filename}.{uuid.uuid4().hex[:8]}"
+
+        with open(temp_filename, "wb") as f:
+            f.write(obj["Body"])
+
+        os.replace(temp_filename, Filename)
+
+        self._count("GetObject", downloaded=len(obj["Body"]))
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs: dict | None = None, **kwargs) -> None:
+        with open(Filename, "rb") as f:
+            body = f.read()
+
+        self._put(Bucket, Key, body, **(ExtraArgs or {}))
+        self._count("PutObject", uploaded=len(body))
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> dict:
+        upload_id = uuid.uuid4().hex
+
+        with self.lock:
+            self.uploads[upload_id] = (Bucket, Key, kwargs, {})
+
+        self._count("CreateMultipartUpload")
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def _get_upload(self, upload_id: str, operation: str) -> tuple:
+        try:
+            return self.uploads[upload_id]
+        except KeyError:
+            raise ClientError(
+                {"Error": {"Code": "NoSuchUpload", "Message": "The specified upload does not exist."}}, operation
+            ) from None
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes, **kwargs) -> dict:
+        parts = self._get_upload(UploadId, "UploadPart")[3]
+
+        with self.lock:
+            parts[PartNumber] = Body
+
+        self._count("UploadPart", uploaded=len(Body))
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}  # noqa: S324
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict, **kwargs) -> dict:
+        _, _, metadata, parts = self._get_upload(UploadId, "CompleteMultipartUpload")
+        body = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+        with self.lock:
+            del self.uploads[UploadId]
+
+        obj = self._put(Bucket, Key, body, **metadata)
+        self._count("CompleteMultipartUpload")
+        return {"ETag": obj["ETag"]}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> dict:
+        with self.lock:
+            self.uploads.pop(UploadId, None)
+
+        self._count("AbortMultipartUpload")
+        return {}
+
+
+class SharedS3Manager(BaseManager):
+    """Serves a LocalS3 from its own process. Each method call is made over a local socket."""
+
+
+# The LocalS3 a SharedS3Manager's process serves
+_shared_s3 = LocalS3()
+
+
+def _get_shared_s3() -> LocalS3:
+    return _shared_s3
+
+
+SharedS3Manager.register("get_s3", callable=_get_shared_s3)
+
+
+def start_shared() -> tuple[SharedS3Manager, str, bytes]:
+    """Starts a process serving a LocalS3.
+
+    ==========
+
+    Returns:
+        The manager (shut it down with .shutdown()), the address it listens on and its authentication key.
+    """
+    authkey = os.urandom(16)
+    manager = SharedS3Manager(address=("127.0.0.1", 0), authkey=authkey)
+    manager.start()
+
+    host, port = manager.address
+
+    return manager, f"{host}:{port}", authkey
+
+
+def connect(address: str, authkey: bytes) -> Callable[[], LocalS3]:
+    """Gets a stand-in for storage_interface.get_s3_client which returns the LocalS3 served at address.
+
+    ==========
+
+    Like get_s3_client, each process makes its own connection on first use, as connections cannot be shared
+    with the processes gunicorn forks.
+
+    Args:
+        address (str): the address from start_shared(), as host:port.
+        authkey (bytes): the authentication key from start_shared().
+
+    Returns:
+        A function returning a proxy for the LocalS3.
+    """
+    host, port = address.rsplit(":", 1)
+    clients: dict[int, LocalS3] = {}
+    lock = threading.Lock()
+
+    def get_s3_client() -> LocalS3:
+        pid = os.getpid()
+
+        with lock:
+            if pid not in clients:
+                manager = SharedS3Manager(address=(host, int(port)), authkey=authkey)
+                manager.connect()
+                clients[pid] = manager.get_s3()
+
+            return clients[pid]
+
+    return get_s3_client
@@ -0,0 +1,134 @@
+"""Compares the memory and time taken to hold repositories.json as plain dictionaries and as typed records.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/memory_benchmark.py --repos 100000
+
+A store of the given size is generated in the storage format, then loaded both ways. For each, the
+benchmark reports the memory held once loaded (measured with tracemalloc), and the time taken to
+decode and encode it.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, C0415
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+import models  # noqa: E402
+
+
+def generate_repositories(count: int, seed: int = 0) -> bytes:
+    """Generates the contents of repositories.json for an organisation with count repositories.
+
+    Contributors are drawn from a pool the size of a large organisation's membership, so the same people
+    appear across many repositories, as they do in practice.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    today = date.today()
+
+    members = [
+        {
+            "avatar": f"https://avatars.githubusercontent.com/u/{i}?v=4",
+            "login": f"member-{i}",
+            "url": f"https://github.com/member-{i}",
+        }
+        for i in range(0, 2000)
+    ]
+
+    repos = []
+
+    for i in range(0, count):
+        exempt = rng.random() < 0.1  # noqa: PLR2004
+
+        repos.append(
+            {
+                "name": f"repository-{i}",
+                "type": rng.choice(("public", "private", "internal")),
+                "contributors": [
+                    {**member, "contributions": rng.randint(1, 500)}
+                    for member in rng.sample(members, rng.randint(0, 5))
+                ],
+                "apiUrl": f"https://api.github.com/repos/bench/repository-{i}",
+                "lastCommit": str(today - timedelta(days=rng.randint(365, 3650))),
+                "dateAdded": str(today - timedelta(days=rng.randint(0, 30))),
+                "exemptUntil": str(today + timedelta(days=90)) if exempt else models.NO_EXEMPTION,
+                "exemptReason": "Still in use" if exempt else "",
+                "exemptBy": (
+                    {"name": "Benchmark", "email": "benchmark@ons.gov.uk"} if exempt else {"name": "", "email": ""}
+                ),
+            }
+        )
+
+    return json.dumps(repos, indent=4).encode()
+
+
+def measure(load: Callable[[], object], dump: Callable[[object], object]) -> dict:
+    """Measures the memory held by the result of load(), and the time taken by load() and dump().
+
+    Memory is measured on a separate load, as tracing allocations slows the load down.
+    """
+    gc.collect()
+    tracemalloc.start()
+    loaded = load()
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del loaded
+    gc.collect()
+
+    start = time.perf_counter()
+    loaded = load()
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dump(loaded)
+    dump_s = time.perf_counter() - start
+
+    return {"held_mb": held / 1024 / 1024, "load_s": load_s, "dump_s": dump_s}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=100000, help="the number of stored repositories")
+    args = parser.parse_args()
+
+    contents = generate_repositories(args.repos)
+
+    results = {
+        "dictionaries": measure(lambda: json.loads(contents), lambda repos: json.dumps(repos, indent=4)),
+        "records": measure(
+            lambda: models.decode_repositories(json.loads(contents)),
+            lambda repos: json.dumps(models.encode_repositories(repos), indent=4),
+        ),
+    }
+
+    print(f"{args.repos} repositories ({len(contents) / 1024 / 1024:.1f} MB stored)\n")
+
+    header = f"{'representation':<14} {'held (MB)':>10} {'load (s)':>9} {'dump (s)':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for name, r in results.items():
+        print(f"{name:<14} {r['held_mb']:>10.1f} {r['load_s']:>9.3f} {r['dump_s']:>9.3f}")
+
+    saving = 1 - results["records"]["held_mb"] / results["dictionaries"]["held_mb"]
+    print(f"\nTyped records hold {saving:.0%} less memory.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
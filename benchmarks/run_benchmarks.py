@@ -0,0 +1,352 @@
+"""Runs the tool's find, manage, revisit, exempt, archive and undo flows against a fake GitHub and an in-memory S3.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/run_benchmarks.py --sizes 100 1000 10000
+
+For each organisation size and scenario this reports the GitHub requests issued, the bytes moved
+to/from GitHub and S3, the scenario's latency percentiles and the peak RSS of the process.
+The revisit scenario loads the manage page again with the ETag from a previous visit, as a browser does.
+
+Results can be saved as a baseline with --save-baseline. When run with --baseline, the script exits
+with a non-zero status if any result is worse than the baseline by more than --threshold.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, C0415, W0621
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import fake_github
+from local_s3 import LocalS3
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ("find", "search", "manage", "revisit", "exempt", "archive", "undo")
+
+# Metrics compared against the baseline. Latencies under the noise floor are never treated as a regression.
+COMPARED_METRICS = ("p50_s", "p95_s", "github_requests", "github_bytes", "s3_bytes", "peak_rss_mb")
+LATENCY_NOISE_FLOOR_S = 0.005
+
+STATE_FILES = ("repositories.json", "archived.json")
+
+
+def percentile(values: list, pct: float) -> float:
+    """Gets the given percentile of values using the nearest-rank method."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def peak_rss_mb() -> float:
+    """Gets the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class Harness:
+    """Wires the app to the fake GitHub server and the in-memory S3, then runs scenarios against it."""
+
+    def __init__(self, base_url: str, workdir: str) -> None:
+        self.base_url = base_url
+        self.workdir = workdir
+        self.s3 = LocalS3()
+
+        sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+        import app as archive_tool
+        import github_api_toolkit
+        import github_auth
+        import organisation_storage
+        import settings
+        import storage_interface
+        import sweeps
+
+        storage_interface.get_s3_client = lambda: self.s3
+        github_api_toolkit.github_interface = lambda token: fake_github.LocalGitHubInterface(token, base_url)
+
+        self.app = archive_tool
+        self.settings = settings
+        self.github_auth = github_auth
+        self.organisation_storage = organisation_storage
+        self.sweeps = sweeps
+        self.storage = storage_interface
+        self.client = archive_tool.app.test_client()
+
+        os.chdir(workdir)
+
+    def clear_local_files(self) -> None:
+        for filename in STATE_FILES:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.workdir, filename))
+
+    def clear_storage(self) -> None:
+        """Empties S3 and the local files, leaving empty state files in S3 as a newly provisioned deployment has."""
+        self.storage.flush_uploads()
+        self.s3.clear()
+        self.clear_local_files()
+
+        for filename in ("repositories.json", "archived.json"):
+            self.s3.put_object(Bucket=self.settings.bucket_name, Key=f"repo-archive/{filename}", Body=b"[]")
+
+    def reset(self, org: str) -> None:
+        """Starts an organisation from scratch with nothing stored."""
+        fake_github.reset_server(self.base_url)
+        self.clear_storage()
+        self.settings.organisations = [org]
+
+        with self.client.session_transaction() as session:
+            session["pats"] = {org: "benchmark-token"}
+            session["token_expirations"] = {org: datetime.now().astimezone() + timedelta(days=1)}
+
+    def request(self, method: str, url: str, **kwargs) -> None:
+        # data_retrieval prints while searching for the archive date
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.open(url, method=method, **kwargs)
+
+        if response.status_code >= 400:  # noqa: PLR2004
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+
+        location = response.headers.get("Location", "")
+        if "error" in location or b"error" in response.data[:2000].lower():
+            raise RuntimeError(f"{method} {url} returned an error page")
+
+    def find(self, discovery_mode: str = "listing") -> None:
+        find_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+        self.request(
+            "POST",
+            "/find_repositories",
+            data={"date": find_date, "repoType": "all", "discoveryMode": discovery_mode},
+        )
+
+    def exempt(self, repo_name: str) -> None:
+        self.request(
+            "POST",
+            f"/set_exempt_date?repoName={repo_name}",
+            data={"date": "3", "reason": "Benchmark", "name": "Benchmark", "email": "benchmark@ons.gov.uk"},
+        )
+
+    def make_eligible(self, names: set[str] | None = None) -> None:
+        """Backdates the stored repositories with the given names (defaults to all) so they are eligible for archive."""
+        self.organisation_storage.check_file_integrity(["repositories.json"])
+        # Copied, as the dictionaries read are shared with other reads of the file
+        repos = [dict(repo) for repo in self.storage.read_file("repositories.json")]
+
+        for repo in repos:
+            if names is not None and repo["name"] not in names:
+                continue
+
+            repo["dateAdded"] = (datetime.now() - timedelta(days=self.settings.archive_threshold_days + 1)).strftime(
+                "%Y-%m-%d"
+            )
+
+        self.storage.write_file(self.settings.bucket_name, "repositories.json", repos)
+
+    def snapshot(self) -> dict:
+        self.storage.flush_uploads()
+        return dict(self.s3.objects)
+
+    def restore(self, snapshot: dict) -> None:
+        """Restores S3 to a snapshot. Local files are removed so each iteration starts with a cold local cache."""
+        self.storage.flush_uploads()
+        self.s3.objects = dict(snapshot)
+        self.clear_local_files()
+
+    def measure(self, run: Callable, before_each: Callable | None, iterations: int) -> dict:
+        durations = []
+        github_requests = github_bytes = s3_bytes = s3_requests = 0
+
+        for _ in range(iterations):
+            if before_each is not None:
+                before_each()
+
+            github_before = fake_github.get_stats(self.base_url)
+            self.s3.reset_counters()
+
+            start = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start)
+
+            # Uploads made in the background after the response are counted, but not timed
+            self.storage.flush_uploads()
+
+            github_after = fake_github.get_stats(self.base_url)
+            github_requests += github_after["requests"] - github_before["requests"]
+            github_bytes += github_after["bytes"] - github_before["bytes"]
+            s3_bytes += self.s3.bytes_uploaded + self.s3.bytes_downloaded
+            s3_requests += sum(self.s3.operations.values())
+
+        return {
+            "iterations": iterations,
+            "p50_s": percentile(durations, 50),
+            "p95_s": percentile(durations, 95),
+            "p99_s": percentile(durations, 99),
+            "github_requests": github_requests // iterations,
+            "github_bytes": github_bytes // iterations,
+            "s3_requests": s3_requests // iterations,
+            "s3_bytes": s3_bytes // iterations,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+    def run_size(self, size: int, scenarios: list, iterations: int) -> dict:
+        org = f"bench-{size}"
+        results = {}
+
+        self.reset(org)
+
+        if "search" in scenarios:
+            results["search"] = self.measure(lambda: self.find("search"), self.clear_storage, iterations)
+
+        if "find" in scenarios:
+            results["find"] = self.measure(self.find, self.clear_storage, iterations)
+        else:
+            self.clear_storage()
+            self.find()
+
+        if "manage" in scenarios:
+            results["manage"] = self.measure(lambda: self.request("GET", "/manage_repositories"), None, iterations)
+
+        if "revisit" in scenarios:
+            etag = self.client.get("/manage_repositories").headers["ETag"]
+
+            results["revisit"] = self.measure(
+                lambda: self.request("GET", "/manage_repositories", headers={"If-None-Match": etag}), None, iterations
+            )
+
+        if "exempt" in scenarios:
+            before_exempt = self.snapshot()
+            self.organisation_storage.check_file_integrity(["repositories.json"])
+            repo_name = self.storage.read_file("repositories.json")[0]["name"]
+
+            results["exempt"] = self.measure(lambda: self.exempt(repo_name), None, iterations)
+
+            # Discard the exemptions so every repository is archived
+            self.restore(before_exempt)
+
+        self.make_eligible()
+        found = self.snapshot()
+
+        if "archive" in scenarios:
+            results["archive"] = self.measure(
+                lambda: self.request("GET", "/archive_repositories"), lambda: self.restore(found), iterations
+            )
+
+        if "undo" in scenarios:
+            self.restore(found)
+            self.request("GET", "/archive_repositories")
+            archived = self.snapshot()
+
+            results["undo"] = self.measure(
+                lambda: self.request("GET", "/undo_batch?batchID=1"), lambda: self.restore(archived), iterations
+            )
+
+        return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Compares results against a baseline.
+
+    ==========
+
+    Args:
+        results (dict): the results of this run.
+        baseline (dict): previously saved results.
+        threshold (float): the allowed fractional increase (i.e 0.2 allows results to be 20% worse).
+
+    Returns:
+        list: a description of each regression.
+    """
+    regressions = []
+
+    for size, scenarios in results.items():
+        for scenario, result in scenarios.items():
+            expected = baseline.get(size, {}).get(scenario)
+
+            if expected is None:
+                continue
+
+            for metric in COMPARED_METRICS:
+                if metric not in expected:
+                    continue
+
+                if metric.endswith("_s") and result[metric] < LATENCY_NOISE_FLOOR_S:
+                    continue
+
+                if result[metric] > expected[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{scenario} ({size} repos): {metric} {result[metric]} > baseline {expected[metric]} (+{threshold:.0%})"
+                    )
+
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    header = f"{'repos':>6} {'scenario':<8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'GH reqs':>8} {'GH bytes':>11} {'S3 reqs':>8} {'S3 bytes':>11} {'peak RSS (MB)':>14}"
+    print(header)
+    print("-" * len(header))
+
+    for size, scenarios in results.items():
+        for scenario, r in scenarios.items():
+            print(
+                f"{size:>6} {scenario:<8} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['p99_s']:>9.3f} {r['github_requests']:>8} {r['github_bytes']:>11} {r['s3_requests']:>8} {r['s3_bytes']:>11} {r['peak_rss_mb']:>14}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="organisation sizes to benchmark")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=3, help="times each scenario is run per size")
+    parser.add_argument("--latency-ms", type=float, default=0, help="artificial latency of each GitHub request")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON file")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    server, base_url = fake_github.start_server(latency_ms=args.latency_ms)
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            harness = Harness(base_url, workdir)
+            results = {str(size): harness.run_size(size, args.scenarios, args.iterations) for size in args.sizes}
+            os.chdir(PROJECT_ROOT)
+    finally:
+        server.terminate()
+
+    print_results(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+
+        print(f"\nNo regressions beyond {args.threshold:.0%} of the baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Compares storing the tool's state files and reports in S3 gzipped against storing them uncompressed.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/s3_compression_benchmark.py --sizes 1000 10000 --bandwidth-mbps 50
+
+For each organisation size, the find, manage and archive scenarios (see run_benchmarks.py) are run with
+compression disabled and then enabled. The in-memory S3 is limited to the given bandwidth, so the time spent
+transferring objects is included in each scenario's latency. The manage scenario starts without local files
+each time, so repositories.json is downloaded as it is by a new instance of the tool.
+
+The size each object is stored at is reported, and the objects stored uncompressed are read again with compression
+enabled, as a deployment upgraded from an uncompressed version of the tool would.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import fake_github
+from run_benchmarks import PROJECT_ROOT, Harness
+
+MODES = {"uncompressed": False, "gzip": True}
+
+
+def measure_mode(harness: Harness, size: int, compressed: bool, iterations: int) -> tuple[dict, dict]:
+    """Runs the scenarios with compression enabled or disabled, returning their results and the stored objects."""
+    harness.storage.COMPRESSION_ENABLED = compressed
+    org = f"bench-{size}"
+    results = {}
+
+    harness.reset(org)
+    results["find"] = harness.measure(harness.find, harness.clear_storage, iterations)
+    found = harness.snapshot()
+
+    results["manage"] = harness.measure(
+        lambda: harness.request("GET", "/manage_repositories"), lambda: harness.restore(found), iterations
+    )
+
+    harness.make_eligible()
+    eligible = harness.snapshot()
+
+    results["archive"] = harness.measure(
+        lambda: harness.request("GET", "/archive_repositories"), lambda: harness.restore(eligible), iterations
+    )
+
+    return results, found
+
+
+def check_legacy_read(harness: Harness, uncompressed: dict) -> bool:
+    """Reads objects stored uncompressed with compression enabled, checking they are read as they are."""
+    harness.storage.COMPRESSION_ENABLED = True
+    harness.restore(uncompressed)
+    harness.request("GET", "/manage_repositories")
+
+    stored = json.loads(uncompressed[(harness.settings.bucket_name, "repo-archive/repositories.json")]["Body"])
+
+    return harness.storage.read_file("repositories.json") == stored
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="organisation sizes to benchmark")
+    parser.add_argument("--iterations", type=int, default=3, help="times each scenario is run per size and mode")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50, help="bandwidth to S3 in megabits per second")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    server, base_url = fake_github.start_server()
+    results: dict = {}
+    stored: dict = {}
+    legacy_read = True
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            harness = Harness(base_url, workdir)
+            harness.s3.bandwidth = args.bandwidth_mbps * 1000 * 1000 / 8
+
+            for size in args.sizes:
+                objects = {}
+
+                for mode, compressed in MODES.items():
+                    results[f"{size} {mode}"], objects[mode] = measure_mode(harness, size, compressed, args.iterations)
+
+                    for (_, key), obj in objects[mode].items():
+                        stored.setdefault(f"{size} {key.removeprefix('repo-archive/')}", {})[mode] = len(obj["Body"])
+
+                legacy_read &= check_legacy_read(harness, objects["uncompressed"])
+
+            os.chdir(PROJECT_ROOT)
+    finally:
+        server.terminate()
+
+    header = f"{'repos':>6} {'mode':<13} {'scenario':<8} {'p50 (s)':>9} {'p95 (s)':>9} {'S3 reqs':>8} {'S3 bytes':>11}"
+    print(f"S3 bandwidth: {args.bandwidth_mbps:g} Mbit/s\n")
+    print(header)
+    print("-" * len(header))
+
+    for name, scenarios in results.items():
+        size, mode = name.split()
+
+        for scenario, r in scenarios.items():
+            print(
+                f"{size:>6} {mode:<13} {scenario:<8} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['s3_requests']:>8} {r['s3_bytes']:>11}"
+            )
+
+    print(f"\n{'object':<40} {'uncompressed':>13} {'gzip':>11} {'ratio':>7}")
+
+    for name, sizes in stored.items():
+        ratio = sizes["gzip"] / sizes["uncompressed"] if sizes.get("uncompressed") else 1
+        print(f"{name:<40} {sizes.get('uncompressed', 0):>13} {sizes.get('gzip', 0):>11} {ratio:>7.2f}")
+
+    print(f"\nObjects stored uncompressed read with compression enabled: {'ok' if legacy_read else 'MISMATCH'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"scenarios": results, "stored_bytes": stored}, f, indent=4)
+
+    return 0 if legacy_read else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
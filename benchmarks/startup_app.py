@@ -0,0 +1,49 @@
+"""The tool with S3 and AWS Secrets Manager replaced, for measuring how quickly it starts.
+
+This is started by startup_benchmark.py, either with gunicorn (using the production configuration) or with
+Flask's development server (python benchmarks/startup_app.py). Unlike local_app.py, nothing is stored or
+imported up front beyond what the tool itself imports, so the tool's own cold start is measured.
+
+Installation tokens are minted by github_api_toolkit as usual, except that GitHub is not called.
+The toolkit is imported here to replace that call, so its import time is counted as part of startup.
+
+Settings (environment variables):
+
+- GITHUB_ORG: the organisation.
+- PORT: the port the development server listens on. Defaults to 5000.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import os
+import sys
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "repoarchivetool"))
+
+import app as archive_tool
+import github_api_toolkit
+import github_auth
+import settings
+import storage_interface
+from local_s3 import LocalS3
+
+s3 = LocalS3()
+
+for filename in ("repositories.json", "archived.json"):
+    s3.put_object(Bucket=settings.bucket_name, Key=f"repo-archive/{filename}", Body=b"[]")
+
+storage_interface.get_s3_client = lambda: s3
+
+github_auth.get_github_app_key = lambda: "startup-benchmark-key"
+github_api_toolkit.get_token_as_installation = lambda org, pem, client_id: (
+    "startup-benchmark-token",
+    (datetime.now(UTC) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+)
+
+app = archive_tool.app
+
+
+if __name__ == "__main__":
+    app.run(port=int(os.getenv("PORT", "5000")), threaded=True)
@@ -0,0 +1,191 @@
+"""Measures how quickly the tool starts: the time to import it, and the time from starting a server to its first response.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/startup_benchmark.py --runs 5
+
+Each measurement is taken in a new process, so nothing is already imported or cached:
+
+- import: the time to import app.py. The heavy modules it loads are listed.
+- first byte: the time from starting the server until GET / responds, with Flask's development server
+  and with gunicorn (one worker). The tool runs against an in-memory S3 and mints installation tokens
+  without calling AWS or GitHub (see startup_app.py).
+
+Results can be saved as a baseline with --save-baseline. When run with --baseline, the script exits
+with a non-zero status if any result is worse than the baseline by more than --threshold.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from load_test import get_free_port
+from run_benchmarks import LATENCY_NOISE_FLOOR_S, percentile
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules which are slow to import, reported if importing the app loads them
+HEAVY_MODULES = ("boto3", "requests", "github_api_toolkit", "dateutil", "data_retrieval", "numpy")
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def get_env() -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(
+                None, (str(PROJECT_ROOT / "repoarchivetool"), str(PROJECT_ROOT / "benchmarks"), os.getenv("PYTHONPATH"))
+            )
+        ),
+        "GITHUB_ORG": "startup-benchmark",
+    }
+
+
+def measure_import(workdir: str) -> tuple[float, list]:
+    """Imports the app in a new process, returning the time taken and the heavy modules loaded."""
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=workdir, env=get_env(), capture_output=True, check=True, text=True
+    )
+    result = json.loads(output.stdout.splitlines()[-1])
+
+    return result["duration"], result["loaded"]
+
+
+def measure_first_byte(server: str, workdir: str, timeout_s: float = 60) -> float:
+    """Starts a server, returning the time until it first responds to GET /."""
+    port = get_free_port()
+    env = {**get_env(), "PORT": str(port), "GUNICORN_WORKERS": "1"}
+
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--config", str(PROJECT_ROOT / "gunicorn.conf.py")]
+        command += ["--pythonpath", env["PYTHONPATH"], "--access-logfile", os.devnull, "startup_app:app"]
+    else:
+        command = [sys.executable, str(PROJECT_ROOT / "benchmarks" / "startup_app.py")]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(  # noqa: S603
+        command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        while time.perf_counter() - start < timeout_s:
+            if process.poll() is not None:
+                raise RuntimeError(f"The {server} server exited with status {process.returncode}")
+
+            with contextlib.suppress(requests.ConnectionError):
+                response = requests.get(f"http://127.0.0.1:{port}/", timeout=timeout_s)
+                duration = time.perf_counter() - start
+
+                if not response.ok:
+                    raise RuntimeError(f"GET / returned {response.status_code}")
+
+                return duration
+
+            time.sleep(0.01)
+
+        raise RuntimeError(f"The {server} server did not respond within {timeout_s}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def summarise(durations: list) -> dict:
+    return {
+        "runs": len(durations),
+        "p50_s": percentile(durations, 50),
+        "p95_s": percentile(durations, 95),
+        "max_s": max(durations),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Compares results against a baseline, returning a description of each regression."""
+    regressions = []
+
+    for measurement, result in results.items():
+        expected = baseline.get(measurement)
+
+        if expected is None:
+            continue
+
+        for metric in ("p50_s", "p95_s"):
+            if result[metric] < LATENCY_NOISE_FLOOR_S:
+                continue
+
+            if result[metric] > expected[metric] * (1 + threshold):
+                regressions.append(
+                    f"{measurement}: {metric} {result[metric]:.3f} > baseline {expected[metric]:.3f} (+{threshold:.0%})"
+                )
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="times each measurement is taken")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="fail if results regress against this JSON file")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression against the baseline")
+    args = parser.parse_args()
+
+    durations: dict[str, list] = {"import": [], "first byte (development server)": [], "first byte (gunicorn)": []}
+    loaded: list = []
+
+    # The app's local files are written to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(args.runs):
+            duration, loaded = measure_import(workdir)
+            durations["import"].append(duration)
+            durations["first byte (development server)"].append(measure_first_byte("dev", workdir))
+            durations["first byte (gunicorn)"].append(measure_first_byte("gunicorn", workdir))
+
+    results = {measurement: summarise(values) for measurement, values in durations.items()}
+
+    header = f"{'measurement':<32} {'p50 (s)':>9} {'p95 (s)':>9} {'max (s)':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for measurement, r in results.items():
+        print(f"{measurement:<32} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['max_s']:>9.3f}")
+
+    print(f"\nHeavy modules loaded by importing the app: {', '.join(loaded) or 'none'}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+
+        print(f"\nNo regressions beyond {args.threshold:.0%} of the baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Measures reading the local copy of repositories.json, and checks it is never read half written while being replaced.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/storage_benchmark.py --repos 10000 --processes 4 --duration 5
+
+A store of the given size is generated in the storage format (see memory_benchmark.py), then:
+
+- read: the time taken by storage_interface.read_file when the file is parsed as JSON (the first read of each
+  version, which writes the snapshot), when it is loaded from the snapshot, and when parsed with json.load.
+- concurrency: writer and reader processes share the same file for the given duration. Writers replace it
+  with write_file while readers read it with read_file. Each version holds a different number of repositories,
+  so a reader which gets an error, or a mix of two versions, is counted as a torn read.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, C0415
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+import storage_interface  # noqa: E402
+from memory_benchmark import generate_repositories  # noqa: E402
+from run_benchmarks import percentile  # noqa: E402
+
+FILENAME = "repositories.json"
+
+# Nothing is uploaded, only the local files are measured
+storage_interface.update_bucket_content = lambda bucket, filename, local_filename="": True
+
+
+def time_runs(run, runs: int) -> float:
+    durations = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start)
+
+    return percentile(durations, 50)
+
+
+def measure_reads(repos: list, runs: int) -> dict:
+    storage_interface.write_file("benchmark", FILENAME, repos)
+
+    # The contents kept from the last read are forgotten first, as another process reading the file would not have them
+    def parse() -> None:
+        storage_interface._contents.pop(FILENAME, None)
+        os.remove(storage_interface.snapshot_file(FILENAME))
+        storage_interface.read_file(FILENAME)
+
+    def load_snapshot() -> None:
+        storage_interface._contents.pop(FILENAME, None)
+        storage_interface.read_file(FILENAME)
+
+    def load_json() -> None:
+        with open(FILENAME, encoding="utf-8") as f:
+            json.load(f)
+
+    return {
+        "read_file (parse JSON, write snapshot)": time_runs(parse, runs),
+        "read_file (load snapshot)": time_runs(load_snapshot, runs),
+        "read_file (unchanged since last read)": time_runs(lambda: storage_interface.read_file(FILENAME), runs),
+        "json.load": time_runs(load_json, runs),
+    }
+
+
+def writer(repos: list, deadline: float, writes, worker: int) -> None:
+    count = 0
+
+    while time.monotonic() < deadline:
+        # Each version has a different length, identifying it to the readers
+        storage_interface.write_file("benchmark", FILENAME, repos[: len(repos) - (count % 50) - worker * 50])
+        count += 1
+
+    writes.value += count
+
+
+def reader(deadline: float, reads, torn) -> None:
+    count = errors = 0
+
+    while time.monotonic() < deadline:
+        try:
+            contents = storage_interface.read_file(FILENAME)
+
+            # Repository names are numbered, so a mix of two versions has a gap or duplicate
+            if any(repo["name"] != f"repository-{i}" for i, repo in enumerate(contents)):
+                errors += 1
+        except (ValueError, EOFError, TypeError):
+            errors += 1
+
+        count += 1
+
+    reads.value += count
+    torn.value += errors
+
+
+def check_concurrency(repos: list, processes: int, duration: float) -> dict:
+    storage_interface.write_file("benchmark", FILENAME, repos)
+
+    context = multiprocessing.get_context("fork")
+    writes, reads, torn = context.Value("i", 0), context.Value("i", 0), context.Value("i", 0)
+    deadline = time.monotonic() + duration
+
+    workers = [context.Process(target=writer, args=(repos, deadline, writes, i)) for i in range(processes)]
+    workers += [context.Process(target=reader, args=(deadline, reads, torn)) for _ in range(processes)]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    return {"writes": writes.value, "reads": reads.value, "torn reads": torn.value}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=10000, help="the number of repositories in the store")
+    parser.add_argument("--runs", type=int, default=5, help="times each read is measured")
+    parser.add_argument("--processes", type=int, default=4, help="writer processes (and reader processes) to run")
+    parser.add_argument("--duration", type=float, default=5, help="seconds to run the concurrency check for")
+    args = parser.parse_args()
+
+    repos = json.loads(generate_repositories(args.repos))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+
+        reads = measure_reads(repos, args.runs)
+        concurrency = check_concurrency(repos, args.processes, args.duration)
+
+    print(f"Reading {FILENAME} ({args.repos} repositories, p50 of {args.runs} runs)\n")
+
+    for measurement, duration in reads.items():
+        print(f"  {measurement:<40} {duration:>8.3f}s")
+
+    print(f"\nConcurrency ({args.processes} writers, {args.processes} readers, {args.duration:.0f}s)\n")
+
+    for measurement, count in concurrency.items():
+        print(f"  {measurement:<40} {count:>8}")
+
+    return 1 if concurrency["torn reads"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
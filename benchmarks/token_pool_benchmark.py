@@ -0,0 +1,108 @@
+"""Finds an organisation's repositories against a rate limited fake GitHub, with one GitHub App and with several pooled.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/token_pool_benchmark.py --repos 1000 --rate-limit 400 --apps 1 2 4
+
+The fake GitHub server refuses each token's requests with a 403 once it has made --rate-limit requests, as GitHub
+does once an installation's hourly rate limit is used up. For each number of Apps (the main App plus the others in
+github_app_pool) POST /find_repositories is run against an empty store, then the benchmark reports:
+
+- found: the repositories stored by the find.
+- incomplete: the stored repositories whose contributors could not be fetched (stored with an error message instead).
+- requests: the GitHub requests received by the server, and how many of them it refused for being over a rate limit.
+  Once every token in the pool is over its limit, requests fail without being sent.
+- per token: the requests made with each App's token, showing how reads are spread across the pool.
+
+The script exits with a non-zero status if the find with the most Apps fails or stores any incomplete repositories.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import fake_github
+from run_benchmarks import PROJECT_ROOT, Harness
+
+
+def run_find(harness: Harness, org: str, apps: int) -> dict:
+    """Finds the organisation's repositories with the given number of GitHub Apps' tokens."""
+    harness.settings.github_app_pool = [(f"pool-app-{i}", f"pool-app-{i}-pem") for i in range(1, apps)]
+    harness.github_auth.token_pools.clear()
+    harness.reset(org)
+
+    error = None
+
+    try:
+        harness.find()
+    except RuntimeError as e:
+        error = str(e)
+
+    stats = fake_github.get_stats(harness.base_url)
+
+    # The stored repositories are read back from S3, so uploads waiting to be made in the background are made first
+    harness.storage.flush_uploads()
+    harness.clear_local_files()
+    harness.organisation_storage.check_file_integrity(["repositories.json"])
+    repos = harness.storage.read_file("repositories.json")
+
+    return {
+        "found": len(repos),
+        "incomplete": sum(not isinstance(repo["contributors"], list) for repo in repos),
+        "requests": stats["requests"],
+        "tokens": stats["tokens"],
+        "error": error,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=1000, help="the size of the organisation")
+    parser.add_argument("--rate-limit", type=int, default=400, help="the requests each token may make")
+    parser.add_argument("--apps", type=int, nargs="+", default=[1, 2, 4], help="numbers of GitHub Apps to pool")
+    args = parser.parse_args()
+
+    org = f"bench-{args.repos}"
+    server, base_url = fake_github.start_server(rate_limit=args.rate_limit)
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            harness = Harness(base_url, workdir)
+
+            # Each App's installation token is minted without calling AWS or GitHub
+            harness.github_auth.get_installation_token = lambda org, github_app=None: (
+                f"{github_app[0] if github_app is not None else 'benchmark'}-token",
+                datetime.now().astimezone() + timedelta(days=1),
+            )
+
+            results = {apps: run_find(harness, org, apps) for apps in sorted(args.apps)}
+            os.chdir(PROJECT_ROOT)
+    finally:
+        server.terminate()
+
+    print(
+        f"Find in a {args.repos} repository organisation, with a rate limit of {args.rate_limit} requests per token\n"
+    )
+    print(f"{'apps':>4} {'found':>7} {'incomplete':>10} {'requests':>9} {'refused':>8}  per token")
+    print("-" * 72)
+
+    for apps, r in results.items():
+        refused = sum(max(used - args.rate_limit, 0) for used in r["tokens"].values())
+        per_token = ", ".join(str(used) for used in r["tokens"].values())
+        print(f"{apps:>4} {r['found']:>7} {r['incomplete']:>10} {r['requests']:>9} {refused:>8}  {per_token}")
+
+        if r["error"] is not None:
+            print(f"     {r['error']}")
+
+    most = results[max(results)]
+    complete = most["error"] is None and most["incomplete"] == 0
+
+    return 0 if complete else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Compares uploading the storage files in the background (write-behind) against uploading them within each request.
+
+Usage (from the project root):
+
+    poetry run python benchmarks/write_behind_benchmark.py --sizes 1000 10000 --rounds 20 --latency-ms 30 --bandwidth-mbps 50
+
+For each organisation size, a burst of exemption edits is made with WRITE_BEHIND_ENABLED off and then on. Each
+round sets a new exemption (POST /set_exempt_date) for one of the stored repositories, then loads the Manage
+Repositories page, which merges the exemption into repositories.json. The in-memory S3 is given the latency and
+bandwidth set, so the time spent uploading is included in each request's latency when it is made within the request.
+
+For each mode the benchmark reports the latency percentiles of the rounds, the time taken to flush the uploads
+still waiting once the burst has finished, and the PutObject and total S3 requests made. It then checks that
+repositories.json in S3 holds every round's exemption and that no exemption overrides are left, exiting with a
+non-zero status if not.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import fake_github
+from run_benchmarks import PROJECT_ROOT, Harness, percentile
+
+MODES = {"in request": False, "write-behind": True}
+
+
+def run_burst(harness: Harness, found: dict, names: list[str], rounds: int, write_behind: bool) -> dict:
+    """Makes a burst of exemption edits, each followed by a load of the Manage Repositories page."""
+    harness.storage.write_behind.WRITE_BEHIND_ENABLED = write_behind
+    harness.restore(found)
+    harness.request("GET", "/manage_repositories")
+    harness.s3.reset_counters()
+
+    durations = []
+    expected = {}
+
+    for i in range(rounds):
+        repo_name = names[i % len(names)]
+        expected[repo_name] = f"Burst {i}"
+
+        start = time.perf_counter()
+        harness.request(
+            "POST",
+            f"/set_exempt_date?repoName={repo_name}",
+            data={"date": "3", "reason": expected[repo_name], "name": "Benchmark", "email": "benchmark@ons.gov.uk"},
+        )
+        harness.request("GET", "/manage_repositories")
+        durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    harness.storage.flush_uploads()
+    flush_s = time.perf_counter() - start
+
+    stored = {
+        repo["name"]: repo.get("exemptReason")
+        for repo in harness.storage.read_object(harness.settings.bucket_name, "repositories.json")
+    }
+    overrides = harness.storage.list_objects(harness.settings.bucket_name, "exemptions/")
+
+    return {
+        "p50_s": percentile(durations, 50),
+        "p95_s": percentile(durations, 95),
+        "flush_s": flush_s,
+        "put_requests": harness.s3.operations.get("PutObject", 0),
+        "s3_requests": sum(harness.s3.operations.values()),
+        "consistent": len(overrides) == 0 and all(stored.get(name) == reason for name, reason in expected.items()),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="organisation sizes to benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="exemption edits in each burst")
+    parser.add_argument("--latency-ms", type=float, default=30, help="latency of each S3 request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50, help="bandwidth to S3 in megabits per second")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    server, base_url = fake_github.start_server()
+    results: dict = {}
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            harness = Harness(base_url, workdir)
+
+            for size in args.sizes:
+                harness.s3.latency = harness.s3.bandwidth = 0
+                harness.reset(f"bench-{size}")
+                harness.find()
+                found = harness.snapshot()
+                names = sorted(repo["name"] for repo in harness.storage.read_file("repositories.json"))
+
+                harness.s3.latency = args.latency_ms / 1000
+                harness.s3.bandwidth = args.bandwidth_mbps * 1000 * 1000 / 8
+
+                for mode, write_behind in MODES.items():
+                    results[f"{size} {mode}"] = run_burst(harness, found, names, args.rounds, write_behind)
+
+            harness.storage.write_behind.WRITE_BEHIND_ENABLED = True
+            os.chdir(PROJECT_ROOT)
+    finally:
+        server.terminate()
+
+    header = f"{'repos':>6} {'mode':<13} {'p50 (s)':>9} {'p95 (s)':>9} {'flush (s)':>10} {'PUTs':>6} {'S3 reqs':>8}  consistent"
+    print(
+        f"{args.rounds} exemption edits, S3 latency {args.latency_ms:g}ms, bandwidth {args.bandwidth_mbps:g} Mbit/s\n"
+    )
+    print(header)
+    print("-" * len(header))
+
+    for name, r in results.items():
+        size, mode = name.split(" ", 1)
+        print(
+            f"{size:>6} {mode:<13} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['flush_s']:>10.3f} {r['put_requests']:>6} {r['s3_requests']:>8}  {'yes' if r['consistent'] else 'NO'}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+    return 0 if all(r["consistent"] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
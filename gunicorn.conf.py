@@ -0,0 +1,105 @@
+"""Gunicorn configuration for serving the tool in production.
+
+Usage (from the project root):
+
+    poetry run gunicorn --config gunicorn.conf.py app:app
+
+The app is loaded once, then forked into several workers, each running several threads.
+Before the server starts listening, the master process warms up the app (installation tokens and
+storage files). Each worker then creates its own S3 client before accepting requests.
+
+On SIGTERM, the workers stop accepting new connections and finish the requests in flight,
+for up to GUNICORN_GRACEFUL_TIMEOUT seconds, then upload any storage files still waiting to be uploaded before exiting.
+
+Settings (environment variables):
+
+- PORT: the port to listen on. Defaults to 5000.
+- GUNICORN_WORKERS: the number of worker processes. Defaults to 2.
+- GUNICORN_THREADS: the number of threads per worker. Defaults to 4.
+- GUNICORN_TIMEOUT: the seconds a request may run before its worker is restarted. Finding and archiving
+  repositories run within a request, so this defaults to 900.
+- GUNICORN_GRACEFUL_TIMEOUT: the seconds given to requests in flight when shutting down. Defaults to 90.
+- GUNICORN_KEEPALIVE: the seconds an idle connection is kept open. This should be longer than the
+  load balancer's idle timeout (60 seconds by default), so the load balancer closes connections first. Defaults to 65.
+- METRICS_MULTIPROCESS_DIR: the directory each process publishes its metrics to, so /metrics covers every worker
+  (see metrics.py). Defaults to a directory in the system's temporary directory, named after the master's pid.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, C0415
+
+import contextlib
+import os
+import tempfile
+
+# The app's modules import each other by name. This is found relative to this file, so the server can be started from any directory.
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repoarchivetool")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "900"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "90"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "65"))
+
+# Load the app before forking, so the workers share its memory and its session secret key
+preload_app = True
+
+accesslog = "-"
+
+# Set before the app is loaded, as metrics.py reads it on import
+os.environ.setdefault(
+    "METRICS_MULTIPROCESS_DIR", os.path.join(tempfile.gettempdir(), f"repoarchivetool-metrics-{os.getpid()}")
+)
+
+
+def on_starting(server) -> None:
+    """Warms up the app before the server starts listening, so no requests arrive until it is ready.
+
+    The app has already been loaded (preload_app), and the workers inherit the installation tokens.
+    Metrics published by an earlier run to the same directory are removed first.
+    """
+    import app
+    import metrics
+
+    metrics.clear_published()
+
+    server.log.info("Warming up")
+    app.warm_up()
+    server.log.info("Warmed up")
+
+
+def post_worker_init(worker) -> None:
+    """Creates the worker's S3 client before it accepts requests.
+
+    Clients hold open connections, so the client created while warming up is not used after forking.
+    """
+    import storage_interface
+
+    storage_interface.get_s3_client()
+
+    worker.log.info("Worker ready")
+
+
+def worker_exit(server, worker) -> None:
+    """Uploads the worker's pending writes to the storage files before it exits.
+
+    Uploads are made in the background (see WRITE_BEHIND_ENABLED in write_behind.py), so some may still be waiting.
+    """
+    import storage_interface
+
+    if not storage_interface.flush_uploads():
+        worker.log.warning("Some storage files could not be uploaded before exiting")
+
+
+def on_exit(server) -> None:
+    """Removes the metrics published by the server's processes (see metrics.py), as they are not used after it exits."""
+    import metrics
+
+    metrics.clear_published()
+
+    # The directory is left if it is not empty, i.e if it was set to one holding other files
+    with contextlib.suppress(OSError):
+        os.rmdir(metrics.MULTIPROCESS_DIR)
@@ -0,0 +1,214 @@
+"""Exports the stored repositories and archive batches as Parquet datasets, for analytics.
+
+repositories.json and archived.json hold nested records, which must be downloaded and parsed
+in full to compute anything from them. The exports flatten them into three datasets, each a
+table with one row per:
+
+- repositories: stored repository, as it was on the day of the export.
+- contributors: contributor stored for a repository (the top contributor_summary_size),
+  as on the day of the export.
+- archived_repositories: repository in an archive batch.
+
+Each dataset is partitioned by date (Hive style, analytics/<dataset>/date=YYYY-MM-DD/),
+so queries can skip the days they do not need, and Parquet lets them read only the columns
+they need.
+Exports are incremental: each archive run writes that day's repositories and contributors,
+replacing any earlier export that day, and its own batch. Batches already exported are only
+written again if they are undone.
+
+pyarrow is an optional dependency (poetry install --extras analytics), imported when an export
+is made.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0415
+
+from __future__ import annotations
+
+import importlib.util
+import io
+from datetime import date
+from typing import TYPE_CHECKING
+
+import models
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Parquet files are compressed column by column, so each dataset is stored as it is rather than gzipped
+CONTENT_TYPE = "application/vnd.apache.parquet"
+PARQUET_COMPRESSION = "zstd"
+
+
+def is_available() -> bool:
+    """Checks whether pyarrow is installed, without importing it."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def partition_file(dataset: str, partition_date: date, name: str) -> str:
+    """Gets the name of a file within a dataset's partition for the given date.
+
+    ==========
+
+    Args:
+        dataset (str): the dataset (repositories, contributors or archived_repositories).
+        partition_date (date): the date of the partition.
+        name (str): the name of the file, without its extension.
+
+    Returns:
+        str
+    """
+    return f"analytics/{dataset}/date={partition_date.isoformat()}/{name}.parquet"
+
+
+def to_parquet(columns: dict, schema: pa.Schema) -> bytes:
+    """Writes columns of values as a Parquet file.
+
+    ==========
+
+    Args:
+        columns (dict): the values of each column ({column name: list}).
+        schema (pyarrow.Schema): the types of the columns.
+
+    Returns:
+        bytes
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pydict(columns, schema=schema), buffer, compression=PARQUET_COMPRESSION)
+
+    return buffer.getvalue()
+
+
+def export_repositories(org: str, repos: list[models.Repository], export_date: date) -> dict[str, bytes]:
+    """Exports an organisation's stored repositories and their contributors.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        repos (list): the organisation's stored repositories.
+        export_date (date): the day of the export, which is the partition the files are written to.
+
+    Returns:
+        dict: the Parquet files to store ({file name: contents}).
+    """
+    import pyarrow as pa
+
+    repositories: dict[str, list] = {
+        "organisation": [],
+        "export_date": [],
+        "name": [],
+        "type": [],
+        "html_url": [],
+        "last_commit": [],
+        "date_added": [],
+        "exempt": [],
+        "exempt_until": [],
+        "exempt_reason": [],
+        "contributor_count": [],
+    }
+    contributors: dict[str, list] = {
+        "organisation": [],
+        "export_date": [],
+        "repository": [],
+        "login": [],
+        "contributions": [],
+    }
+
+    for repo in repos:
+        # Contributors are stored as an error message if they could not be fetched
+        repo_contributors = repo.contributors if isinstance(repo.contributors, list) else []
+
+        repositories["organisation"].append(org)
+        repositories["export_date"].append(export_date)
+        repositories["name"].append(repo.name)
+        repositories["type"].append(repo.type)
+        repositories["html_url"].append(repo.html_url or None)
+        repositories["last_commit"].append(repo.last_commit)
+        repositories["date_added"].append(repo.date_added)
+        repositories["exempt"].append(repo.exemption is not None)
+        repositories["exempt_until"].append(repo.exemption.until if repo.exemption is not None else None)
+        repositories["exempt_reason"].append(repo.exemption.reason if repo.exemption is not None else None)
+        repositories["contributor_count"].append(len(repo_contributors))
+
+        for contributor in repo_contributors:
+            contributors["organisation"].append(org)
+            contributors["export_date"].append(export_date)
+            contributors["repository"].append(repo.name)
+            contributors["login"].append(contributor.login)
+            contributors["contributions"].append(contributor.contributions)
+
+    repository_schema = pa.schema(
+        [
+            ("organisation", pa.dictionary(pa.int32(), pa.string())),
+            ("export_date", pa.date32()),
+            ("name", pa.string()),
+            ("type", pa.dictionary(pa.int32(), pa.string())),
+            ("html_url", pa.string()),
+            ("last_commit", pa.date32()),
+            ("date_added", pa.date32()),
+            ("exempt", pa.bool_()),
+            ("exempt_until", pa.date32()),
+            ("exempt_reason", pa.string()),
+            ("contributor_count", pa.int32()),
+        ]
+    )
+    contributor_schema = pa.schema(
+        [
+            ("organisation", pa.dictionary(pa.int32(), pa.string())),
+            ("export_date", pa.date32()),
+            ("repository", pa.string()),
+            ("login", pa.dictionary(pa.int32(), pa.string())),
+            ("contributions", pa.int64()),
+        ]
+    )
+
+    return {
+        partition_file("repositories", export_date, "repositories"): to_parquet(repositories, repository_schema),
+        partition_file("contributors", export_date, "contributors"): to_parquet(contributors, contributor_schema),
+    }
+
+
+def export_archive_batch(org: str, batch: models.ArchiveBatch) -> dict[str, bytes]:
+    """Exports the repositories in an archive batch.
+
+    ==========
+
+    Each batch is a file in the partition for the day it was archived, so a batch which is undone
+    replaces its own file without changing any other.
+
+    Args:
+        org (str): the organisation.
+        batch (ArchiveBatch): the batch.
+
+    Returns:
+        dict: the Parquet files to store ({file name: contents}).
+    """
+    import pyarrow as pa
+
+    archived: dict[str, list] = {
+        "organisation": [org] * len(batch.repos),
+        "batch_id": [batch.batch_id] * len(batch.repos),
+        "batch_date": [batch.date] * len(batch.repos),
+        "name": [repo.name for repo in batch.repos],
+        "api_url": [repo.api_url for repo in batch.repos],
+        "status": [repo.status for repo in batch.repos],
+        "message": [repo.message for repo in batch.repos],
+    }
+    schema = pa.schema(
+        [
+            ("organisation", pa.dictionary(pa.int32(), pa.string())),
+            ("batch_id", pa.int32()),
+            ("batch_date", pa.date32()),
+            ("name", pa.string()),
+            ("api_url", pa.string()),
+            ("status", pa.dictionary(pa.int32(), pa.string())),
+            ("message", pa.string()),
+        ]
+    )
+
+    return {
+        partition_file("archived_repositories", batch.date, f"batch-{batch.batch_id}"): to_parquet(archived, schema)
+    }
@@ -1,124 +1,296 @@
-"""Application to archive GitHub repositories."""
+"""Application to archive GitHub repositories.
 
-# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, R1710, W0621, R1705, C0200, C0123
+Modules which are slow to import and only needed by some requests (boto3, requests,
+the GitHub API toolkit, dateutil, data_retrieval and numpy) are imported where they are used,
+so the app starts quickly.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103, R1710, W0621, R1705, C0200, C0123, W0718, C0415
+from __future__ import annotations
+
+import importlib
 import json
 import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
 from http import HTTPStatus
-from typing import List
+from typing import TYPE_CHECKING
 
-import boto3
-import data_retrieval
 import flask
-import github_api_toolkit
+import forecast
+import github_auth
+import http_caching
+import metrics
+import models
+import organisation_storage
+import profiling
+import reports
+import settings
 import storage_interface
-from dateutil.relativedelta import relativedelta
-from requests import Response
+import sweeps
+import undo
+import webhooks
+import write_behind
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+# Full contributor lists shared by every session in this process ({(organisation, repository): (contributors, time they expire)})
+contributors_cache: dict[tuple[str, str], tuple[list[models.Contributor], datetime]] = {}
+contributors_cache_lock = threading.Lock()
+
+# The thresholds (in days) the archive forecast compares by default, alongside archive_threshold_days, and the days it covers
+forecast_default_thresholds = (60, 90)
+forecast_default_days = 60
+
+# The dates of each organisation's repositories, shared by every forecast in this process while repositories.json
+# is unchanged ({organisation: ((version of repositories.json, date), dates)})
+forecast_dates_cache: dict[str, tuple[tuple, forecast.RepositoryDates]] = {}
+forecast_dates_cache_lock = threading.Lock()
+
+# GitHub repository names may only contain these characters. Names are used in the keys of exemption overrides.
+repo_name_pattern = re.compile(r"[A-Za-z0-9._-]+")
+
+# Trace IDs given in a request's X-Request-ID header are only used if they match this. They are used in the names of
+# profile files and echoed in responses and logs.
+trace_id_pattern = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# The modules imported where they are used (see the module docstring), imported up front by warm_up()
+deferred_imports = ("boto3", "data_retrieval", "dateutil.relativedelta", "github_api_toolkit", "numpy", "requests")
 
-archive_threshold_days = 30
 
 app = flask.Flask(__name__)
 app.config["SECRET_KEY"] = os.urandom(24)
 
-# GiHub Organisation
-organisation = os.getenv("GITHUB_ORG")  # "ONS-Innovation"
 
-# GitHub App Client ID
-client_id = os.getenv("GITHUB_APP_CLIENT_ID")
+@app.before_request
+def start_request_timer():
+    """Assigns a trace ID to the request and starts timing it.
+
+    The trace ID is taken from the X-Request-ID header if given (i.e by the load balancer) and made of letters,
+    digits, underscores and hyphens, otherwise one is generated.
+    """
+    trace_id = flask.request.headers.get("X-Request-ID", "")
+    flask.g.trace_id = trace_id if trace_id_pattern.fullmatch(trace_id) else uuid.uuid4().hex
+    flask.g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response: flask.Response) -> flask.Response:
+    """Records the duration of the request and logs it if it is slower than the configured threshold."""
+    try:
+        duration = time.perf_counter() - flask.g.request_start
+    except AttributeError:
+        # The request failed before start_request_timer ran
+        return response
+
+    endpoint = flask.request.endpoint or "unknown"
+
+    metrics.observe(
+        "repoarchive_http_request_duration_seconds",
+        duration,
+        "Time taken to handle each request.",
+        endpoint=endpoint,
+        method=flask.request.method,
+        status=response.status_code,
+    )
+
+    if duration * 1000 >= settings.get_features()["metrics"]["slow_request_threshold_ms"]:
+        metrics.inc(
+            "repoarchive_slow_requests_total", 1, "Requests slower than the slow request threshold.", endpoint=endpoint
+        )
+
+        app.logger.warning(
+            "Slow request: %s %s took %.0fms (status=%s, trace_id=%s)",
+            flask.request.method,
+            flask.request.path,
+            duration * 1000,
+            response.status_code,
+            flask.g.trace_id,
+        )
+
+    response.headers["X-Trace-ID"] = flask.g.trace_id
 
-# AWS Secret Manager Secret Name for the .pem file
-secret_name = os.getenv("AWS_SECRET_NAME")
-secret_reigon = os.getenv("AWS_DEFAULT_REGION")
+    return response
 
-account = os.getenv("AWS_ACCOUNT_NAME")
 
-# AWS Bucket Name
-bucket_name = f"{account}-github-audit-tool"
+@app.before_request
+def start_profiler():
+    """Starts a sampling profiler for the request if profiling is enabled in feature.json or the request is signed."""
+    config = settings.get_features()["profiling"]
 
+    if profiling.should_profile(flask.request, config):
+        flask.g.profiler = profiling.SamplingProfiler(config["sample_interval_ms"])
+        flask.g.profiler.start()
 
-def load_config():
-    """Loads the feature configuration from the feature.json file."""
-    with open("./config/feature.json", encoding="utf-8") as f:
-        app.config["FEATURES"] = json.load(f)["features"]
 
+@app.after_request
+def save_profile(response: flask.Response) -> flask.Response:
+    """Stops the request's profiler (if any) and uploads the profile to S3 once the response has been sent."""
+    profiler = flask.g.pop("profiler", None)
 
-load_config()
+    if profiler is None:
+        return response
 
+    profiler.stop()
 
-def check_file_integrity(files: List[str], directory: str = "./"):
-    """Makes sure local storage files are up to date with S3.
+    filename = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{flask.request.endpoint}-{flask.g.trace_id}.speedscope.json"
+    profile = profiler.to_speedscope(f"{flask.request.method} {flask.request.path}")
 
-    If the file does not exist locally or has changed in S3, try to download it.
+    response.headers["X-Profile"] = f"repo-archive/profiles/{filename}"
+    response.call_on_close(lambda: upload_profile(profile, filename))
 
-    If the download is successful, reupload the file to S3 to match the last modified dates.
+    return response
 
-    If the download is not successful, the file does not exist in S3.
-    Therefore, if the file exists locally, remove it as it is outdated.
 
-    If neither the file exists locally or in S3, nothing should happen as this is handled in the UI.
+def upload_profile(profile: dict, filename: str):
+    """Uploads a request profile to S3 under repo-archive/profiles/.
 
     ==========
 
     Args:
-        files (list): the list of files to check. This prevents unneeded calls to S3.
-        directory (str): the directory where the files are stored. Defaults to "./".
+        profile (dict): the speedscope profile.
+        filename (str): the name of the profile file.
     """
-    for file in files:
-        file_path = os.path.join(directory, file)
+    os.makedirs("profiles", exist_ok=True)
+    local_filename = os.path.join("profiles", filename)
 
-        if not os.path.isfile(file_path) or storage_interface.has_file_changed(
-            bucket_name, f"repo-archive/{file}", file
-        ):
+    with open(local_filename, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
 
-            # If the file does not exist locally or has changed in S3, download it
-            download_successful = storage_interface.get_bucket_content(bucket_name, file)
+    storage_interface.update_bucket_content(settings.bucket_name, f"profiles/{filename}", local_filename)
 
-            if download_successful:
-                # Once downloaded, reupload it to match last modified date
-                storage_interface.update_bucket_content(bucket_name, file)
-            elif os.path.isfile(file_path):
-                os.remove(file_path)
+    os.remove(local_filename)
 
-                # If it doesn't exist in either location, nothing should happen as this is handled in the UI
 
+@flask.before_render_template.connect_via(app)
+def start_template_timer(_sender: flask.Flask, **_extra) -> None:
+    """Starts timing a template render."""
+    flask.g.setdefault("template_starts", []).append(time.perf_counter())
 
-def update_token():
-    """Updates the pat and token_expiration session variables with the new token information."""
-    session = boto3.Session()
-    secret_manager = session.client("secretsmanager", region_name=secret_reigon)
 
-    secret = secret_manager.get_secret_value(SecretId=secret_name)["SecretString"]
+@flask.template_rendered.connect_via(app)
+def record_template_metrics(_sender: flask.Flask, template: Template, **_extra) -> None:
+    """Records how long a template took to render."""
+    metrics.observe(
+        "repoarchive_template_render_duration_seconds",
+        time.perf_counter() - flask.g.template_starts.pop(),
+        "Time spent rendering templates.",
+        template=template.name,
+    )
 
-    response = github_api_toolkit.get_token_as_installation(organisation, secret, client_id)
 
-    if isinstance(response, tuple):
-        token = response[0]
-        expiration = response[1]
+@app.before_request
+def check_token():
+    """Checks if the token stored in the session for the request's organisation has expired. If it has, run update_token to get a new one.
 
-        flask.session["pat"] = token
+    Requests which sweep all organisations need a token for each of them.
 
-        expiration = datetime.strptime(expiration, "%Y-%m-%dT%H:%M:%SZ")
-        flask.session["token_expiration"] = expiration + timedelta(minutes=60)
+    This check doesn't run for /set_exempt_date or /success as these pages may be used by external users,
+    for /metrics as it is scraped by monitoring, or for /webhooks/github as it is called by GitHub.
+    """
+    if flask.request.endpoint not in ("set_exempt_date", "success", "metrics", "github_webhook"):
+        orgs = (
+            settings.organisations
+            if flask.request.values.get("allOrganisations") == "true"
+            else [organisation_storage.get_organisation()]
+        )
 
-    else:
-        # If type is not tuple, it is string
-        # This means there is an error with the .pem file
+        for org in orgs:
+            error = github_auth.check_organisation_token(org)
 
-        return flask.render_template("error.html", error="There is an error with the .pem file.")
+            if error is not None:
+                return error
 
 
-@app.before_request
-def check_token():
-    """Checks if the token stored in the session has expired. If it has, run update_token to get a new one.
+app.url_defaults(http_caching.add_static_fingerprint)
 
-    This check doesn't run for /set_exempt_date or /success as these pages may be used by external users
+
+@app.after_request
+def cache_and_compress(response: flask.Response) -> flask.Response:
+    """Marks fingerprinted static assets as immutable and compresses the response if the browser accepts it."""
+    response = http_caching.cache_static_asset(flask.request, response)
+    return http_caching.compress(flask.request, response)
+
+
+def get_page_validators(org: str, filename: str, *parts: object) -> tuple[str, datetime] | None:
+    """Gets the ETag and Last-Modified of a page which shows one of an organisation's storage files.
+
+    ==========
+
+    These come from the version of the file in S3, so are found without downloading or reading it.
+
+    Args:
+        org (str): the organisation.
+        filename (str): the storage file the page shows.
+        parts: anything else the page depends on.
+
+    Returns:
+        The page's ETag and Last-Modified, or None if the file does not exist.
+    """
+    version = storage_interface.get_object_version(settings.bucket_name, organisation_storage.org_file(org, filename))
+
+    if version is None:
+        return None
+
+    s3_etag, last_modified = version
+
+    etag = http_caching.page_etag(
+        http_caching.get_build_version(os.path.join(app.root_path, app.template_folder), app.static_folder),
+        s3_etag,
+        org,
+        settings.organisations,
+        flask.request.full_path,
+        *parts,
+    )
+
+    return etag, last_modified
+
+
+@app.context_processor
+def inject_organisations() -> dict:
+    """Makes the configured organisations and the request's organisation available to every template."""
+    return {"organisations": settings.organisations, "organisation": organisation_storage.get_organisation()}
+
+
+def warm_up_organisation(org: str):
+    """Gets an installation token for the organisation and brings its storage files up to date with S3."""
+    try:
+        if github_auth.get_installation_token(org) is None:
+            app.logger.warning("Could not get an installation token for %s: there is an error with the .pem file", org)
+
+        organisation_storage.load_repositories(org)
+        organisation_storage.load_archive_list(org)
+    except Exception as e:
+        app.logger.warning("Could not warm up %s: %s", org, e)
+
+
+def warm_up():
+    """Prepares the process to serve requests, so the first requests are not slowed down by setting up.
+
+    ==========
+
+    Loads the feature configuration and imports the modules the app imports where they are used.
+    Then creates the S3 client and warms up each organisation concurrently (see warm_up_organisation()).
+    Called by the production server (see gunicorn.conf.py) before it accepts any requests, so the workers
+    it forks inherit all of this.
+    Files written while warming up (i.e merged exemption overrides) are uploaded before it returns rather than
+    in the background, so no uploader thread is started in the process the workers are forked from.
+    Failures are logged rather than raised, as the same work is retried by the first request which needs it.
     """
-    if flask.request.endpoint not in ("set_exempt_date", "success"):
-        try:
-            if flask.session["token_expiration"] < datetime.now().astimezone():
-                update_token()
-        except KeyError:
-            update_token()
+    for module in deferred_imports:
+        importlib.import_module(module)
+
+    settings.get_features()
+    storage_interface.get_s3_client()
+
+    if len(settings.organisations) > 0:
+        with write_behind.write_through(), ThreadPoolExecutor(max_workers=len(settings.organisations)) as executor:
+            executor.map(warm_up_organisation, settings.organisations)
 
 
 @app.route("/", methods=["POST", "GET"])
@@ -127,112 +299,92 @@ def index():
     return flask.render_template(
         "findRepositories.html",
         date=(datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d"),
-        organisation=organisation,
     )
 
 
-@app.route("/success")
-def success():
-    """Return success message template."""
-    return flask.render_template("success.html")
+@app.route("/select_organisation")
+def select_organisation():
+    """Selects the organisation to use for the rest of the session, then redirects back to the given page (or /)."""
+    flask.session["organisation"] = organisation_storage.get_organisation()
 
+    next_url = flask.request.args.get("next", "/")
 
-@app.route("/find_repositories", methods=["POST", "GET"])
-def find_repos():
-    """Gets and stores any Github repositories, using api_controller.py, which fits the given parameters.
+    # Only redirect within the tool
+    if not next_url.startswith("/") or next_url.startswith("//"):
+        next_url = "/"
 
-    ==========
+    return flask.redirect(next_url)
 
-    When posted to, the function will use the inputted values from the homepage to make
-    a request to the Github API using api_controller.py and its APIHandler class.
-    The request will return any repositories which fit the inputted parameters, in which
-    this function will store ANY NEW repositories in JSON (repositories.json).
 
-    If this function is not posted to, it will return a redirect to the homepage.
+@app.route("/metrics", endpoint="metrics")
+def metrics_endpoint():
+    """Returns the collected performance metrics in the Prometheus text format."""
+    if not settings.get_features()["metrics"]["enabled"]:
+        flask.abort(404)
 
-    If the function receives an error after using api_controller.py, it will return a render of
-    error.html with an appropriate error message.
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
-    If the function is successful with obtaining the information, it will return a redirect to
-    /manage_repositories with an in-URL arguement (reposAdded) which is used to display how many
-    repositories are added to JSON.
-    """
-    if flask.request.method == "POST":
-        try:
-            # Create APIHandler instance
-            gh = github_api_toolkit.github_interface(flask.session["pat"])
 
-        except KeyError:
-            return flask.render_template("error.html", error="Personal Access Token Undefined.")
+@app.route("/webhooks/github", methods=["POST"], endpoint="github_webhook")
+def github_webhook():
+    """Updates the stored repositories from a GitHub webhook event.
 
-        else:
-            # Get form values
-            # org = flask.request.form['org']
-            org = organisation
-            date = flask.request.form["date"]
-            repo_type = flask.request.form["repoType"]
+    ==========
 
-            new_repos = data_retrieval.get_organisation_repos(org, date, repo_type, gh)
+    The delivery must be signed with GITHUB_WEBHOOK_SECRET (X-Hub-Signature-256), otherwise a 401 is returned.
 
-            if isinstance(new_repos, str):
-                # Error Message Returned
-                return flask.render_template("error.html", error=new_repos)
+    Events for organisations the tool does not manage, or which the tool does not handle (see webhooks.handlers),
+    are acknowledged and ignored. Otherwise the handler's storage files are loaded, updated and only written
+    back to S3 if the event changed them (i.e a push to a repository which is not waiting to be archived
+    changes nothing).
 
-            # Get current date for logging purposes
-            current_date = datetime.today().strftime("%Y-%m-%d")
+    Returns a 204 once the event has been handled.
+    """
+    body = flask.request.get_data()
 
-            repos_added = 0
+    if not webhooks.has_valid_signature(
+        webhooks.WEBHOOK_SECRET, body, flask.request.headers.get("X-Hub-Signature-256")
+    ):
+        flask.abort(401)
 
-            # Check storage files exist and are up to date with S3
-            check_file_integrity(["repositories.json"])
+    event = flask.request.headers.get("X-GitHub-Event", "")
+    payload = json.loads(body)
 
-            # Get repos from storage
-            stored_repos = storage_interface.read_file("repositories.json")
+    org = webhooks.get_event_organisation(payload)
+    handler = webhooks.get_handler(event, payload)
 
-            new_repos_to_archive = []
+    if org not in settings.organisations or handler is None:
+        return "", HTTPStatus.NO_CONTENT
 
-            for repo in new_repos:
-                if not any(d["name"] == repo["name"] for d in stored_repos):
-                    contributor_list = data_retrieval.get_repo_contributors(gh, repo["contributorsUrl"])
+    handle_event, filenames = handler
 
-                    stored_repos.append(
-                        {
-                            "name": repo["name"],
-                            "type": repo["type"],
-                            "contributors": contributor_list,
-                            "apiUrl": repo["apiUrl"],
-                            "lastCommit": repo["lastCommitDate"],
-                            "dateAdded": current_date,
-                            "exemptUntil": "1900-01-01",
-                            "exemptReason": "",
-                            "exemptBy": {"name": "", "email": ""},
-                        }
-                    )
+    with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+        loaders = {
+            "repositories.json": organisation_storage.load_repositories,
+            "archived.json": organisation_storage.load_archive_list,
+        }
+        savers = {
+            "repositories.json": organisation_storage.save_repositories,
+            "archived.json": organisation_storage.save_archive_list,
+        }
 
-                    new_repos_to_archive.append({"name": repo["name"], "url": repo["htmlUrl"]})
+        files = {filename: loaders[filename](org) for filename in filenames}
 
-                    repos_added += 1
+        for filename in handle_event(payload, files):
+            savers[filename](org, files[filename])
 
-            storage_interface.write_file(bucket_name, "repositories.json", stored_repos)
+    metrics.inc("repoarchive_webhook_events_total", 1, "GitHub webhook events handled.", event=event)
 
-            domain = flask.request.url_root
+    return "", HTTPStatus.NO_CONTENT
 
-            # Create html file to display which NEW repos will be archived
-            with open("./recently_added.html", "w", encoding="utf-8") as f:
-                f.write("<h1>Repositories to be Archived</h1><ul>")
-                for repo in new_repos_to_archive:
-                    f.write(
-                        f"<li>{repo['name']} (<a href='{repo['url']}' target='_blank'>View Repository</a> - <a href='{domain}/set_exempt_date?repoName={repo['name']}' target='_blank'>Mark Repository as Exempt</a>)</li>"
-                    )
-                f.write(
-                    f"</ul><p>Total Repositories: {len(new_repos_to_archive)}</p><p>These repositories will be archived in <b>{archive_threshold_days} days</b>, unless marked as exempt.</p>"
-                )
 
-            storage_interface.update_bucket_content(bucket_name, "recently_added.html")
+@app.route("/success")
+def success():
+    """Return success message template."""
+    return flask.render_template("success.html")
 
-            return flask.redirect(f"/manage_repositories?reposAdded={repos_added}")
 
-    return flask.redirect("/")
+app.add_url_rule("/find_repositories", view_func=sweeps.find_repos, methods=["POST", "GET"])
 
 
 @app.route("/manage_repositories")
@@ -246,11 +398,24 @@ def manage_repos():
     This function can also be passed an arguement called reposAdded, which is used to
     display a success message when being redirected from findRepos().
     """
-    # Check storage files exist and are up to date with S3
-    check_file_integrity(["repositories.json"])
+    org = organisation_storage.get_organisation()
+    today = date.today()
+
+    validators = None
+
+    # Pending exemption overrides are merged when the repositories are loaded, so the page must be rendered
+    if len(organisation_storage.get_new_overrides(org)) == 0:
+        # Exemptions expire at the start of the day, so the page can change at midnight without the file changing
+        validators = get_page_validators(org, "repositories.json", today)
 
-    # Get repos from storage
-    repos = storage_interface.read_file("repositories.json", "name")
+        if validators is not None:
+            validators = (validators[0], max(validators[1], datetime.combine(today, datetime.min.time()).astimezone()))
+
+            if not http_caching.is_modified(flask.request, *validators):
+                return http_caching.not_modified(*validators)
+
+    # Get repos from storage, including any exemptions set since they were last loaded
+    repos = organisation_storage.load_repositories(org, "name")
 
     repos_added = flask.request.args.get("reposAdded")
 
@@ -265,23 +430,212 @@ def manage_repos():
         status_message = ""
 
     # When loading repos, check each repo to see if its exempt date has passed
-    for i in range(0, len(repos)):
-        if (
-            repos[i]["exemptUntil"] != "1900-01-01"
-            and datetime.strptime(repos[i]["exemptUntil"], "%Y-%m-%d") < datetime.today()
-        ):
-            repos[i]["dateAdded"] = datetime.strftime(datetime.today(), "%Y-%m-%d")
-            repos[i]["exemptUntil"] = "1900-01-01"
-            repos[i]["exemptReason"] = ("",)
-            repos[i]["exemptBy"] = {"name": "", "email": ""}
-
-    storage_interface.write_file(bucket_name, "repositories.json", repos)
+    expired = any(repo.exemption is not None and repo.exemption.until <= today for repo in repos)
+
+    if expired:
+        repos = organisation_storage.expire_exemptions(org, today)
+        repos.sort(key=lambda repo: repo.name)
+
+    response = flask.make_response(
+        flask.render_template(
+            "manageRepositories.html",
+            repos=repos,
+            reposAdded=repos_added,
+            statusMessage=status_message,
+            contributorSummarySize=settings.contributor_summary_size,
+        )
+    )
+
+    # Saving the repositories changed their version, so the page is revalidated in full next time
+    if validators is not None and not expired:
+        http_caching.add_validators(response, *validators)
+
+    return response
+
+
+def get_all_contributors(org: str, repo: models.Repository) -> list[models.Contributor] | str:
+    """Gets every contributor to a stored repository, from the cache if they were fetched in the last contributors_ttl.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        repo (Repository): the repository.
+
+    Returns:
+        list: the repository's contributors, with the most contributions first.
+        or
+        str: An error message.
+    """
+    import data_retrieval
+
+    key = (org, repo.name)
+    now = datetime.now().astimezone()
+
+    with contributors_cache_lock:
+        cached = contributors_cache.get(key)
+
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
+    contributors = data_retrieval.get_repo_contributors(
+        github_auth.get_github_interface(org), f"{repo.api_url}/contributors"
+    )
+
+    if isinstance(contributors, str):
+        return contributors
+
+    with contributors_cache_lock:
+        # Expired lists are removed as new ones are added, so the cache only holds recently expanded repositories
+        for expired in [k for k, (_, expires) in contributors_cache.items() if expires <= now]:
+            del contributors_cache[expired]
+
+        contributors_cache[key] = (contributors, now + settings.contributors_ttl)
+
+    return contributors
+
+
+@app.route("/repository_contributors")
+def repository_contributors():
+    """Returns every contributor to a stored repository as JSON.
+
+    ==========
+
+    Used to expand a repository's contributors on the Manage Repositories page, as only its top contributors are stored.
+    Takes the repository's name as the repoName arguement.
+    """
+    org = organisation_storage.get_organisation()
+    repo_name = flask.request.args.get("repoName", "")
+
+    repo = next((repo for repo in organisation_storage.load_repositories(org) if repo.name == repo_name), None)
+
+    if repo is None:
+        flask.abort(HTTPStatus.NOT_FOUND)
+
+    contributors = get_all_contributors(org, repo)
+
+    if isinstance(contributors, str):
+        return flask.jsonify({"error": contributors}), HTTPStatus.BAD_GATEWAY
+
+    response = flask.jsonify({"contributors": [contributor.to_dict() for contributor in contributors]})
+    response.headers["Cache-Control"] = f"private, max-age={int(settings.contributors_ttl.total_seconds())}"
+
+    return response
+
+
+def get_forecast_dates(org: str, today: date) -> forecast.RepositoryDates:
+    """Gets the dates of an organisation's stored repositories for a forecast, from the cache if repositories.json is unchanged.
+
+    ==========
+
+    Pending exemption overrides change the repositories without changing repositories.json until they are merged,
+    so the cache is not used while there are any.
 
+    Args:
+        org (str): the organisation.
+        today (date): the first day of the forecast.
+
+    Returns:
+        RepositoryDates
+    """
+    version = storage_interface.get_object_version(
+        settings.bucket_name, organisation_storage.org_file(org, "repositories.json")
+    )
+    cacheable = version is not None and len(organisation_storage.get_new_overrides(org)) == 0
+    key = (version, today)
+
+    if cacheable:
+        with forecast_dates_cache_lock:
+            cached = forecast_dates_cache.get(org)
+
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    dates = forecast.RepositoryDates.from_repositories(organisation_storage.load_repositories(org), today)
+
+    if cacheable:
+        with forecast_dates_cache_lock:
+            forecast_dates_cache[org] = (key, dates)
+
+    return dates
+
+
+def get_archive_forecast(org: str) -> dict:
+    """Forecasts the repositories which become eligible for archive, using the request's arguements.
+
+    ==========
+
+    Takes the optional arguements:
+        - days: the number of days to forecast (defaults to forecast_default_days).
+        - thresholds: a comma separated list of thresholds in days (defaults to archive_threshold_days
+          and forecast_default_thresholds).
+        - lastCommitBefore: only count repositories last committed to before this date (YYYY-MM-DD).
+
+    Aborts with a 400 if any of them are not valid.
+
+    Args:
+        org (str): the organisation.
+
+    Returns:
+        dict: the forecast (see forecast.forecast()), with the threshold currently in use.
+    """
+    default_thresholds = ",".join(
+        str(threshold) for threshold in (settings.archive_threshold_days, *forecast_default_thresholds)
+    )
+
+    try:
+        days = int(flask.request.args.get("days", forecast_default_days))
+        thresholds = [
+            int(threshold)
+            for threshold in flask.request.args.get("thresholds", default_thresholds).split(",")
+            if threshold.strip() != ""
+        ]
+        last_commit_arg = flask.request.args.get("lastCommitBefore", "")
+        last_commit_before = date.fromisoformat(last_commit_arg) if last_commit_arg != "" else None
+    except ValueError:
+        flask.abort(HTTPStatus.BAD_REQUEST)
+
+    # Repeated thresholds are only forecast once
+    thresholds = list(dict.fromkeys(thresholds))
+
+    if (
+        not 1 <= days <= forecast.MAX_DAYS
+        or not 1 <= len(thresholds) <= forecast.MAX_THRESHOLDS
+        or any(not 0 <= threshold <= forecast.MAX_THRESHOLD_DAYS for threshold in thresholds)
+    ):
+        flask.abort(HTTPStatus.BAD_REQUEST)
+
+    today = date.today()
+    result = forecast.forecast(get_forecast_dates(org, today), today, days, thresholds, last_commit_before)
+    result["currentThreshold"] = settings.archive_threshold_days
+
+    return result
+
+
+@app.route("/archive_forecast_data")
+def archive_forecast_data():
+    """Returns the archive forecast as JSON.
+
+    ==========
+
+    Takes the same arguements as the Archive Forecast page (see get_archive_forecast()).
+    """
+    return flask.jsonify(get_archive_forecast(organisation_storage.get_organisation()))
+
+
+@app.route("/archive_forecast")
+def archive_forecast():
+    """Returns a render of archiveForecast.html.
+
+    ==========
+
+    Charts how many of the stored repositories become eligible for archive on each of the next days,
+    under the current archive threshold and any others being considered (see get_archive_forecast()).
+    """
     return flask.render_template(
-        "manageRepositories.html",
-        repos=repos,
-        reposAdded=repos_added,
-        statusMessage=status_message,
+        "archiveForecast.html",
+        forecast=get_archive_forecast(organisation_storage.get_organisation()),
+        thresholds=flask.request.args.get("thresholds", ""),
     )
 
 
@@ -291,19 +645,36 @@ def clear_repos():
 
     Returns a redirect to manage_repositories.
     """
-    storage_interface.write_file(bucket_name, "repositories.json", [])
+    org = organisation_storage.get_organisation()
+
+    with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+        organisation_storage.save_repositories(org, [])
+
     return flask.redirect("/manage_repositories")
 
 
 @app.route("/set_exempt_date", methods=["POST", "GET"])
 def set_exempt_date():
-    """Set exempt date for a given repository."""
+    """Set exempt date for a given repository.
+
+    ==========
+
+    This is the link in recently_added.html, so is used by repository owners as soon as repositories are found.
+    The exemption is recorded as an override (see record_exemption()), so the request does not need to
+    download or rewrite repositories.json.
+    """
     repo_name = flask.request.args.get("repoName")
+    org = organisation_storage.get_organisation()
 
     if repo_name is None:
         return flask.redirect("/manage_repositories")
 
+    if not repo_name_pattern.fullmatch(repo_name) or repo_name in (".", ".."):
+        flask.abort(400)
+
     if flask.request.method == "POST":
+        from dateutil.relativedelta import relativedelta
+
         months_select_value = flask.request.form["date"]
 
         if months_select_value == "-1":
@@ -325,25 +696,21 @@ def set_exempt_date():
                 message=f"Please enter a valid ONS email address. {exempt_email} is not valid.",
             )
 
-        # Check storage files exist and are up to date with S3
-        check_file_integrity(["repositories.json"])
-
-        # Get repos from storage
-        repos = storage_interface.read_file("repositories.json")
-
-        for i in range(0, len(repos)):
-            if repos[i]["name"] == repo_name:
-                repos[i]["exemptUntil"] = exempt_until
-                repos[i]["exemptReason"] = exempt_reason
-                repos[i]["exemptBy"] = {"name": exempt_name, "email": exempt_email}
-
-        storage_interface.write_file(bucket_name, "repositories.json", repos)
+        organisation_storage.record_exemption(
+            org,
+            repo_name,
+            {
+                "exemptUntil": exempt_until,
+                "exemptReason": exempt_reason,
+                "exemptBy": {"name": exempt_name, "email": exempt_email},
+            },
+        )
 
     else:
         return flask.render_template("setExemptDate.html", repoName=repo_name, message="")
 
     try:
-        type(flask.session["pat"])
+        type(flask.session["pats"][org])
     except KeyError:
         return flask.redirect("/success")
     else:
@@ -356,145 +723,65 @@ def clear_exempt_date():
     repo_name = flask.request.args.get("repoName")
 
     if repo_name is not None:
-        # Check storage files exist and are up to date with S3
-        check_file_integrity(["repositories.json"])
-
-        # Get repos from storage
-        repos = storage_interface.read_file("repositories.json")
-
-        for i in range(0, len(repos)):
-            if repos[i]["name"] == repo_name:
-                repos[i]["dateAdded"] = datetime.now().strftime("%Y-%m-%d")
-                repos[i]["exemptUntil"] = "1900-01-01"
-                repos[i]["exemptReason"] = ""
-                repos[i]["exemptBy"] = {"name": "", "email": ""}
-
-        storage_interface.write_file(bucket_name, "repositories.json", repos)
+        if not repo_name_pattern.fullmatch(repo_name) or repo_name in (".", ".."):
+            flask.abort(400)
+
+        organisation_storage.record_exemption(
+            organisation_storage.get_organisation(),
+            repo_name,
+            {
+                "dateAdded": datetime.now().strftime("%Y-%m-%d"),
+                "exemptUntil": "1900-01-01",
+                "exemptReason": "",
+                "exemptBy": {"name": "", "email": ""},
+            },
+        )
 
     return flask.redirect(f"/manage_repositories?msg={ repo_name }%20exempt%20date%20has%20been%20cleared")
 
 
 @app.route("/download_recently_added")
 def download_recently_added():
-    """Download recently added."""
-    # Check storage files exist and are up to date with S3
-    check_file_integrity(["recently_added.html"])
-
-    return flask.send_file("../recently_added.html", as_attachment=True)
-
-
-# Functions used within archive_repos()
-def get_archive_lists(batch_id: int, repos: list) -> tuple[list, list]:
-    """Archives any repositories older than archive_threshold_days and are not exempt, then logs them in repos_to_remove and archive_instance which get returned.
-
-    ==========
-
-    Args:
-        batch_id (int): the id of the batch within archive_instance.
-        repos (list): a list of repositories stored within the system.
-
-    Returns:
-        repos_to_remove (list)
-        archive_instance (list)
-    """
-    try:
-        gh = github_api_toolkit.github_interface(flask.session["pat"])
-    except KeyError:
-        return flask.render_template("error.html", error="Personal Access Token Undefined.")
-
-    archive_instance = {
-        "batchID": batch_id,
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "repos": [],
-    }
-
-    repos_to_remove = []
-
-    # For each repo, if keep is false and it was added to storage over archive_threshold_days days ago,
-    # Archive them
-    for i in range(0, len(repos)):
-        if repos[i]["exemptUntil"] == "1900-01-01":  # noqa: SIM102
-            if (datetime.now() - datetime.strptime(repos[i]["dateAdded"], "%Y-%m-%d")).days >= archive_threshold_days:
-                response = gh.patch(repos[i]["apiUrl"], {"archived": True}, False)
-
-                if isinstance(response, Response):
-                    if response.status_code == HTTPStatus.OK:
-
-                        archive_instance["repos"].append(
-                            {
-                                "name": repos[i]["name"],
-                                "apiurl": repos[i]["apiUrl"],
-                                "status": "Success",
-                                "message": "Repository Archived Successfully.",
-                            }
-                        )
-
-                        repos_to_remove.append(i)
-
-                else:
-                    archive_instance["repos"].append(
-                        {
-                            "name": repos[i]["name"],
-                            "apiurl": repos[i]["apiUrl"],
-                            "status": "Failed",
-                            "message": f"Error: {response}",
-                        }
-                    )
-
-    return repos_to_remove, archive_instance
-
-
-@app.route("/archive_repositories", methods=["POST", "GET"])
-def archive_repos():
-    """Archives any repositories which are:
-        - older than archive_threshold_days days within the system
-        - have not been marked to be kept using the keep attribute in repositories.json.
+    """Download the recently added report.
 
     ==========
 
-    Loads any archive batches from archived.json into archiveList.
-    Executes get_archive_lists to:
-        - Get a list of repos which need removing from storage (repos_to_remove)
-        - Archive any repositories older than archive_threshold_days
-        - Get a list of repos which have been archived (archive_instance)
-    Add the new archiveInstance to archiveList and write it to archived.json.
-    Remove any archived repositories from repos and write it to repositories.json.
-
-    Returns a redirect to recentlyArchived.
-
-    If the function fails to create an APIHandler instance, it will return a render of error.html
-    with an appropriate error message.
+    The report is streamed from S3 as it is downloaded. Its format is given by the format query parameter
+    (html, json or csv), which defaults to html.
 
+    Reports are stored gzipped, so are sent as they are stored to browsers which accept gzip,
+    and decompressed as they are streamed for those which do not.
     """
-    # Check storage files exist and are up to date with S3
-    check_file_integrity(["archived.json", "repositories.json"])
+    fmt = flask.request.args.get("format", "html")
 
-    # Get archive batches from storage
-    archive_list = storage_interface.read_file("archived.json")
+    if fmt not in reports.formats:
+        flask.abort(HTTPStatus.BAD_REQUEST)
 
-    # Get repos from storage
-    repos = storage_interface.read_file("repositories.json")
+    report = storage_interface.stream_object(
+        settings.bucket_name,
+        organisation_storage.org_file(organisation_storage.get_organisation(), f"recently_added.{fmt}"),
+        accept_gzip=flask.request.accept_encodings["gzip"] > 0,
+    )
 
-    repos_to_remove, archive_instance = get_archive_lists(len(archive_list) + 1, repos)
+    if report is None:
+        flask.abort(HTTPStatus.NOT_FOUND)
 
-    # If repos have been archived, log changes in storage
-    if len(archive_instance["repos"]) > 0:
+    chunks, content_encoding = report
 
-        archive_list.append(archive_instance)
+    response = flask.Response(
+        chunks,
+        content_type=reports.formats[fmt],
+        headers={"Content-Disposition": f"attachment; filename=recently_added.{fmt}"},
+    )
+    response.vary.add("Accept-Encoding")
 
-        storage_interface.write_file(bucket_name, "archived.json", archive_list)
+    if content_encoding is not None:
+        response.headers["Content-Encoding"] = content_encoding
 
-        pop_count = 0
-        for i in repos_to_remove:
-            repos.pop(i - pop_count)
-            pop_count += 1  # noqa: SIM113
+    return response
 
-        storage_interface.write_file(bucket_name, "repositories.json", repos)
 
-        return flask.redirect(f'/recently_archived?msg=Batch%20{archive_instance["batchID"]}%20created')
-
-    else:
-        return flask.redirect("/manage_repositories?msg=No%20repositories%20eligable%20for%20archive")
+app.add_url_rule("/archive_repositories", view_func=sweeps.archive_repos, methods=["POST", "GET"])
 
 
 @app.route("/recently_archived")
@@ -508,11 +795,15 @@ def recently_archived():
     This function can also be passed an arguement called batchID, which is used to
     display a success message when redirected from undoBatch().
     """
-    # Check storage files exist and are up to date with S3
-    check_file_integrity(["archived.json"])
+    org = organisation_storage.get_organisation()
+
+    validators = get_page_validators(org, "archived.json")
+
+    if validators is not None and not http_caching.is_modified(flask.request, *validators):
+        return http_caching.not_modified(*validators)
 
     # Get archive batches from storage
-    archive_list = storage_interface.read_file("archived.json", reverse=True)
+    archive_list = organisation_storage.load_archive_list(org, reverse=True)
 
     batch_id = flask.request.args.get("batchID")
 
@@ -524,135 +815,22 @@ def recently_archived():
     if status_message is None:
         status_message = ""
 
-    return flask.render_template(
-        "recentlyArchived.html",
-        archiveList=archive_list,
-        batchID=batch_id,
-        statusMessage=status_message,
-    )
-
-
-# Functions used within undo_batch()
-def get_repository_information(gh: github_api_toolkit.github_interface, repo_to_undo: dict, batch_id: int) -> dict:
-    """Gets information for a given repo_to_undo as part of the unarchive process.
-
-    ==========
-
-    Args:
-        gh (api_controller): An instance of the api_controller class from api_interface.py.
-        repo_to_undo (dict): The repository to get the information of.
-        batch_id (int): The id of the batch which the repository belongs to.
-
-    Returns:
-        A dictionary of the repo_to_undo's information.
-    """
-    response = gh.get(repo_to_undo["apiurl"], {}, False)
-
-    if type(response) != Response:  # noqa: E721
-        return flask.render_template(
-            "error.html",
-            error=f"Error: {response} <br> Point of Failure: Restoring batch {batch_id}, {repo_to_undo["name"]} to stored repositories",
+    response = flask.make_response(
+        flask.render_template(
+            "recentlyArchived.html",
+            archiveList=archive_list,
+            batchID=batch_id,
+            statusMessage=status_message,
         )
+    )
 
-    repo_json = response.json()
-
-    current_date = datetime.now().strftime("%Y-%m-%d")
-
-    last_update = repo_json["pushed_at"]
-    last_update = datetime.strptime(last_update, "%Y-%m-%dT%H:%M:%SZ")
-    last_update = date(last_update.year, last_update.month, last_update.day)
-
-    contributor_list = data_retrieval.get_repo_contributors(gh, repo_json["contributors_url"])
-
-    repository_information = {
-        "name": repo_json["name"],
-        "type": repo_json["visibility"],
-        "contributors": contributor_list,
-        "apiUrl": repo_json["url"],
-        "lastCommit": str(last_update),
-        "dateAdded": current_date,
-        "exemptUntil": "1900-01-01",
-        "exemptReason": "",
-        "exemptBy": {"name": "", "email": ""},
-    }
-
-    return repository_information
-
-
-@app.route("/undo_batch")
-def undo_batch():
-    """Unarchives a batch of archived repositories.
-
-    ==========
-
-    Creates an instance of the APIHandler class from api_controller.py.
-    Gets the passed batchID arguement.
-    Loads any archive batches from archived.json into archiveList.
-    Loads all stored repositories from repositories.json into storedRepos.
-    Gets the batch that needs undoing from archiveList using the given batchID.
-    Unarchives all repositories within the batch using a patch request from the APIHandler class instance.
-    If any now unarchived repositories are not already stored, fetch their information from Github using a get request
-    from the APIHandler class instance and add it to storedRepos.
-    Remove any now archived repositories from the batch in archiveList.
-
-    Write storedRepos back to repositories.json.
-    Write archive_list back to archived.json.
-
-    Returns a redirect to recentlyArchived with a passed arguement, batchID, which is used to show a success message.
-
-    If the function fails to create an APIHandler instance, it will return a render of error.html
-    with an appropriate error message.
-
-    If the function fails to unarchive a repository or get the repository's information from Github, it will return a render of error.html
-    with an appropriate error message.
-    """
-    try:
-        gh = github_api_toolkit.github_interface(flask.session["pat"])
-    except KeyError:
-        return flask.render_template("error.html", error="Personal Access Token Undefined.")
-
-    batch_id = flask.request.args.get("batchID")
-
-    if batch_id is not None:
-        batch_id = int(batch_id)
-
-        # Check storage files exist and are up to date with S3
-        check_file_integrity(["archived.json", "repositories.json"])
-
-        # Get archive list and stored repos from storage
-        archive_list = storage_interface.read_file("archived.json")
-        stored_repos = storage_interface.read_file("repositories.json")
-
-        batch_to_undo = archive_list[batch_id - 1]
-
-        pop_count = 0
-
-        for i in range(0, len(batch_to_undo["repos"])):
-            # Unarchive the repo
-            response = gh.patch(
-                batch_to_undo["repos"][i - pop_count]["apiurl"],
-                {"archived": False},
-                False,
-            )
-
-            if type(response) is not Response:
-                return flask.render_template("error.html", error=f"Error: {response}")
-
-            if not any(d["name"] == batch_to_undo["repos"][i - pop_count]["name"] for d in stored_repos):
-                # Add the repo to repositories.json
-                stored_repos.append(get_repository_information(gh, batch_to_undo["repos"][i - pop_count], batch_id))
-
-            # Remove the repo from archived.json
-            archive_list[batch_id - 1]["repos"].pop(i - pop_count)
-            pop_count += 1  # noqa: SIM113
+    if validators is not None:
+        http_caching.add_validators(response, *validators)
 
-        # Write changes to storage
-        storage_interface.write_file(bucket_name, "repositories.json", stored_repos)
-        storage_interface.write_file(bucket_name, "archived.json", archive_list)
+    return response
 
-        return flask.redirect(f"/recently_archived?batchID={batch_id}")
 
-    return flask.redirect("/")
+app.add_url_rule("/undo_batch", view_func=undo.undo_batch)
 
 
 @app.route("/confirm")
@@ -680,69 +858,59 @@ def confirm_action():
 @app.route("/insert_test_data", methods=["POST", "GET"])
 def insert_test_data():
     """Insert test data into the system."""
-    if not app.config["FEATURES"]["test_data"]["enabled"]:
+    if not settings.get_features()["test_data"]["enabled"]:
         flask.abort(404)
 
     if flask.request.method == "POST":
         if flask.request.form["confirm_radio"] == "True":
 
-            # Create test_recently_added.html for test repositories
-            repos = storage_interface.read_file("./repoarchivetool/test_data/test_repositories.json")
+            # Copied, as the dictionaries read are shared with other reads of the file (see read_file)
+            repos = [
+                dict(repo) for repo in storage_interface.read_file("./repoarchivetool/test_data/test_repositories.json")
+            ]
 
             domain = flask.request.url_root
 
-            gh = github_api_toolkit.github_interface(flask.session["pat"])
-
-            with open("./repoarchivetool/test_data/test_recently_added.html", "w", encoding="utf-8") as f:
-                f.write("<h1>Repositories to be Archived</h1><ul>")
-
-                for i in range(0, len(repos)):
-                    # Update test_repositories.json dates
-
-                    # I know this isn't ideal but I need to make certain changes depending on each repo
-                    if repos[i]["name"] == "KPArchiveTest":
-                        # Make eligable for archive
-                        repos[i]["dateAdded"] = (datetime.now() - timedelta(days=archive_threshold_days + 1)).strftime(
-                            "%Y-%m-%d"
-                        )
-                    elif repos[i]["name"] == "KPArchiveTest2":
-                        # Make non-eligable for archive
-                        repos[i]["dateAdded"] = (datetime.now() - timedelta(days=archive_threshold_days - 1)).strftime(
-                            "%Y-%m-%d"
-                        )
-                    elif repos[i]["name"] == "KPInternalArchiveTest":
-                        # Make exempt from archive
-                        repos[i]["dateAdded"] = (datetime.now() - timedelta(days=archive_threshold_days + 15)).strftime(
-                            "%Y-%m-%d"
-                        )
-                        repos[i]["exemptUntil"] = (datetime.now() + timedelta(days=90)).strftime("%Y-%m-%d")
-                    elif repos[i]["name"] == "KPPrivateArchiveTest":
-                        # Make eligable for archive
-                        repos[i]["dateAdded"] = (datetime.now() - timedelta(days=archive_threshold_days + 1)).strftime(
-                            "%Y-%m-%d"
-                        )
-
-                    f.write(
-                        f"<li>{repos[i]['name']} (<a href='{gh.get(repos[i]["apiUrl"], {}, False).json()["html_url"]}' target='_blank'>View Repository</a> - <a href='{domain}/set_exempt_date?repoName={repos[i]['name']}' target='_blank'>Mark Repository as Exempt</a>)</li>"
-                    )
-
-                f.write(
-                    f"</ul><p>Total Repositories: {len(repos)}</p><p>These repositories will be archived in <b>{archive_threshold_days} days</b>, unless marked as exempt.</p>"
-                )
+            org = organisation_storage.get_organisation()
+
+            for i in range(0, len(repos)):
+                # Update test_repositories.json dates
+
+                # I know this isn't ideal but I need to make certain changes depending on each repo
+                if repos[i]["name"] == "KPArchiveTest":
+                    # Make eligable for archive
+                    repos[i]["dateAdded"] = (
+                        datetime.now() - timedelta(days=settings.archive_threshold_days + 1)
+                    ).strftime("%Y-%m-%d")
+                elif repos[i]["name"] == "KPArchiveTest2":
+                    # Make non-eligable for archive
+                    repos[i]["dateAdded"] = (
+                        datetime.now() - timedelta(days=settings.archive_threshold_days - 1)
+                    ).strftime("%Y-%m-%d")
+                elif repos[i]["name"] == "KPInternalArchiveTest":
+                    # Make exempt from archive
+                    repos[i]["dateAdded"] = (
+                        datetime.now() - timedelta(days=settings.archive_threshold_days + 15)
+                    ).strftime("%Y-%m-%d")
+                    repos[i]["exemptUntil"] = (datetime.now() + timedelta(days=90)).strftime("%Y-%m-%d")
+                elif repos[i]["name"] == "KPPrivateArchiveTest":
+                    # Make eligable for archive
+                    repos[i]["dateAdded"] = (
+                        datetime.now() - timedelta(days=settings.archive_threshold_days + 1)
+                    ).strftime("%Y-%m-%d")
 
             with open("./repoarchivetool/test_data/test_repositories.json", "w", encoding="utf-8") as f:
                 f.write(json.dumps(repos, indent=4))
 
-            storage_interface.update_bucket_content(
-                bucket_name,
-                "repositories.json",
-                "./repoarchivetool/test_data/test_repositories.json",
-            )
-            storage_interface.update_bucket_content(
-                bucket_name,
-                "recently_added.html",
-                "./repoarchivetool/test_data/test_recently_added.html",
-            )
+            with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+                storage_interface.update_bucket_content(
+                    settings.bucket_name,
+                    organisation_storage.org_file(org, "repositories.json"),
+                    "./repoarchivetool/test_data/test_repositories.json",
+                )
+
+            # The test repositories' htmlUrls are stored, so the report is rendered without calling GitHub
+            sweeps.save_recently_added(org, models.decode_repositories(repos), domain, app.jinja_env)
 
             return flask.redirect("/manage_repositories?msg=Test%20data%20inserted%20successfully")
 
@@ -3,11 +3,30 @@
 # pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R1705, R0914, E0601, R0911, R0912, R1710, R0915, R1702
 
 import datetime
+import math
+import time
 from http import HTTPStatus
 
+import models
 import requests
 from github_api_toolkit import github_interface
 
+# The search API only returns the first 1,000 results of a query
+SEARCH_RESULT_LIMIT = 1000
+SEARCH_PER_PAGE = 100
+
+# The earliest push date searched for (GitHub launched in 2008)
+SEARCH_START = datetime.datetime(2008, 1, 1)
+
+# The search API allows 30 requests a minute. A search refused for being over its rate limit is retried once the
+# limit resets (or after GitHub's Retry-After), up to SEARCH_MAX_RETRIES times, if that is at most SEARCH_MAX_WAIT
+# seconds away.
+SEARCH_MAX_RETRIES = 5
+SEARCH_MAX_WAIT = 90
+
+# The most contributors Github returns per page
+CONTRIBUTORS_PER_PAGE = 100
+
 
 def get_archive_flag(gh: github_interface, repo_url: str, comp_date: datetime.date) -> bool | str:
     """Calculates whether a given repo should be archived or not.
@@ -76,8 +95,8 @@ def get_organisation_repos(  # noqa: C901 PLR0911 PLR0912 PLR0915
     Returns:
         str: An error message.
         or
-        list: A list of dictionaries containing information about the repositories collected from
-        the Github API.
+        list: A list of models.Repository records (without contributors or dateAdded) for the repositories
+        collected from the Github API.
     """
     # Test API Call
     response = gh.get(
@@ -221,14 +240,14 @@ def get_organisation_repos(  # noqa: C901 PLR0911 PLR0912 PLR0915
                                     # If needs archiving and hasn't already been archived, add it to the archive list
                                     if not repo["archived"] and archive_flag:
                                         repos_to_archive.append(
-                                            {
-                                                "name": repo["name"],
-                                                "type": repo["visibility"],
-                                                "apiUrl": repo["url"],
-                                                "lastCommitDate": str(last_update),
-                                                "contributorsUrl": repo["contributors_url"],
-                                                "htmlUrl": repo["html_url"],
-                                            }
+                                            models.Repository(
+                                                name=repo["name"],
+                                                type=repo["visibility"],
+                                                api_url=repo["url"],
+                                                last_commit=last_update,
+                                                html_url=repo["html_url"],
+                                                contributors_url=repo["contributors_url"],
+                                            )
                                         )
                             else:
                                 return f"Error: {response} <br> Point of Failure: Getting Individual Repositories."
@@ -240,40 +259,236 @@ def get_organisation_repos(  # noqa: C901 PLR0911 PLR0912 PLR0915
         return f"Error: {response} <br> Point of Failure: Test API Call."
 
 
-def get_repo_contributors(gh: github_interface, contributors_url: str) -> str | list:
+def get_retry_delay(response: requests.Response | Exception) -> float | None:
+    """Gets how long to wait before retrying a request which GitHub refused for being over a rate limit.
+
+    ==========
+
+    Args:
+        response (Response or Exception): the result of the github_interface call. Failed requests return the
+            exception raised, which holds the response.
+
+    Returns:
+        The seconds to wait, from the Retry-After or X-RateLimit-Reset header, or None if the request was not refused
+        for being over a rate limit.
+    """
+    http_response = response if isinstance(response, requests.Response) else getattr(response, "response", None)
+
+    if http_response is None or http_response.status_code not in (HTTPStatus.FORBIDDEN, HTTPStatus.TOO_MANY_REQUESTS):
+        return None
+
+    headers = http_response.headers
+
+    if "Retry-After" in headers:
+        return float(headers["Retry-After"])
+
+    if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in headers:
+        # The reset time is in whole seconds, so a second is added to make sure it has passed
+        return max(float(headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+
+    return None
+
+
+def search(gh: github_interface, params: dict) -> requests.Response | Exception:
+    """Makes a search API request, waiting and retrying it if it is refused for being over the search rate limit.
+
+    ==========
+
+    Args:
+        gh (api_controller): An instance of the APIHandler class to interact with the Github API.
+        params (dict): the query parameters of the search.
+
+    Returns:
+        The result of the github_interface call: a Response if successful, otherwise the raised exception.
+    """
+    response = gh.get("/search/repositories", params)
+
+    for _ in range(SEARCH_MAX_RETRIES):
+        delay = get_retry_delay(response)
+
+        if delay is None or delay > SEARCH_MAX_WAIT:
+            break
+
+        time.sleep(delay)
+
+        response = gh.get("/search/repositories", params)
+
+    return response
+
+
+def search_window(gh: github_interface, query: str, start: datetime.datetime, end: datetime.datetime) -> str | list:
+    """Gets all repositories matching a search query which were last pushed to within a time window.
+
+    ==========
+
+    If the window contains more repositories than the search API will return, it is split in half and each half
+    is searched separately, until every window is under the limit.
+
+    Args:
+        gh (api_controller): An instance of the APIHandler class to interact with the Github API.
+        query (str): The search query, without a pushed qualifier.
+        start (datetime): The start of the window (inclusive).
+        end (datetime): The end of the window (inclusive).
+
+    Returns:
+        str: An error message.
+        or
+        list: The repositories returned by the search API.
+    """
+    window_query = f"{query} pushed:{start.strftime('%Y-%m-%dT%H:%M:%SZ')}..{end.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+
+    response = search(gh, {"q": window_query, "per_page": SEARCH_PER_PAGE, "page": 1})
+
+    if not isinstance(response, requests.Response):
+        return f"Error: {response} <br> Point of Failure: Searching Repositories."
+
+    search_results = response.json()
+
+    if search_results["total_count"] > SEARCH_RESULT_LIMIT and end - start > datetime.timedelta(seconds=1):
+        midpoint = start + (end - start) / 2
+        midpoint = midpoint.replace(microsecond=0)
+
+        older = search_window(gh, query, start, midpoint)
+        if isinstance(older, str):
+            return older
+
+        newer = search_window(gh, query, midpoint + datetime.timedelta(seconds=1), end)
+        if isinstance(newer, str):
+            return newer
+
+        return older + newer
+
+    repos = search_results["items"]
+
+    last_page = math.ceil(min(search_results["total_count"], SEARCH_RESULT_LIMIT) / SEARCH_PER_PAGE)
+
+    for page in range(2, last_page + 1):
+        response = search(gh, {"q": window_query, "per_page": SEARCH_PER_PAGE, "page": page})
+
+        if not isinstance(response, requests.Response):
+            return f"Error: {response} <br> Point of Failure: Getting Page of Search Results."
+
+        repos.extend(response.json()["items"])
+
+    return repos
+
+
+def search_organisation_repos(org: str, date: str, repo_type: str, gh: github_interface) -> str | list:
+    """Gets all repositories which fit the given parameters using the search API.
+
+    ==========
+
+    Unlike get_organisation_repos, which pages through every repository in the organisation,
+    this only requests the repositories which need archiving, so the number of requests scales with
+    the number of stale repositories rather than the size of the organisation.
+
+    Searches for unarchived repositories in the organisation which were last pushed to before the given date,
+    including forks (which the search API leaves out unless asked for, but get_organisation_repos returns).
+    Searches refused for being over the search API's rate limit are retried once it resets (see search()).
+    As the search API returns at most 1,000 results per query, the date range is split into smaller windows
+    when needed (see search_window).
+
+    Args:
+        org (str): The name of the organisation whose repositories are to be returned.
+        date (str): The date which repositories that have been committed prior to will be archived.
+        repo_type (str): The type of repository to be returned (public, private, internal or all).
+        gh (api_controller): An instance of the APIHandler class to interact with the Github API.
+
+    Returns:
+        str: An error message.
+        or
+        list: A list of models.Repository records for the repositories collected from
+        the Github API, in the same format as get_organisation_repos.
+    """
+    query = f"org:{org} archived:false fork:true"
+
+    if repo_type != "all":
+        query += f" is:{repo_type}"
+
+    year, month, day = date.split("-")
+    comp_date = datetime.datetime(int(year), int(month), int(day))
+
+    repos = search_window(gh, query, SEARCH_START, comp_date - datetime.timedelta(seconds=1))
+
+    if isinstance(repos, str):
+        return repos
+
+    repos_to_archive = []
+    seen = set()
+
+    for repo in repos:
+        if repo["archived"] or repo["name"] in seen:
+            continue
+
+        seen.add(repo["name"])
+
+        last_update = datetime.datetime.strptime(repo["pushed_at"], "%Y-%m-%dT%H:%M:%SZ")
+
+        repos_to_archive.append(
+            models.Repository(
+                name=repo["name"],
+                type=repo["visibility"],
+                api_url=repo["url"],
+                last_commit=last_update.date(),
+                html_url=repo["html_url"],
+                contributors_url=repo["contributors_url"],
+            )
+        )
+
+    return repos_to_archive
+
+
+def get_repo_contributors(gh: github_interface, contributors_url: str, limit: int | None = None) -> str | list:
     """Gets the list of contributors for a given repository.
 
     ==========
 
+    Contributors are returned by Github with the most contributions first, so the first limit contributors
+    are the repository's top contributors. Pages are followed until limit contributors have been collected,
+    or until the last page if no limit is given.
+
     Args:
         gh (api_controller): An instance of the APIHandler class.
         contributors_url (str): The Github API endpoint URL for the repository's contributors.
+        limit (int): The maximum number of contributors to get. If None is passed, all of them are returned.
 
     Returns:
         str: An error message.
         or
-        list: A list of dictionaries containing information about the contributors to the given
+        list: A list of models.Contributor records for the contributors to the given
         repository collected from the Github API.
     """
-    # Get contributors information
-    response = gh.get(contributors_url, {}, False)
+    contributor_list = []
 
-    if isinstance(response, requests.Response):
-        return f"Error: {response} <br> Point of Failure: Getting Contributors."
+    url = contributors_url
+    params = {"per_page": CONTRIBUTORS_PER_PAGE if limit is None else min(limit, CONTRIBUTORS_PER_PAGE)}
 
-    contributor_list = []
+    while url is not None:
+        # Get contributors information
+        response = gh.get(url, params, False)
+
+        if not isinstance(response, requests.Response):
+            return f"Error: {response} <br> Point of Failure: Getting Contributors."
 
-    if response.status_code == HTTPStatus.OK:
-        contributors = response.json()
+        # Repositories with no commits return 204 No Content
+        if response.status_code != HTTPStatus.OK:
+            break
 
-        for contributor in contributors:
+        for contributor in response.json():
             contributor_list.append(
-                {
-                    "avatar": contributor["avatar_url"],
-                    "login": contributor["login"],
-                    "url": contributor["html_url"],
-                    "contributions": contributor["contributions"],
-                }
+                models.Contributor(
+                    login=contributor["login"],
+                    avatar=contributor["avatar_url"],
+                    url=contributor["html_url"],
+                    contributions=contributor["contributions"],
+                )
             )
 
+        if limit is not None and len(contributor_list) >= limit:
+            return contributor_list[:limit]
+
+        # The next page's URL includes the query parameters
+        url = response.links.get("next", {}).get("url")
+        params = {}
+
     return contributor_list
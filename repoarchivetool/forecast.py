@@ -0,0 +1,134 @@
+"""Forecasts how many stored repositories become eligible for archive on each of the next days,
+under several thresholds.
+
+A repository is eligible once it has been stored for archive_threshold_days
+(see is_eligible_for_archive in sweeps.py). The day it becomes eligible is therefore the day its
+threshold counts from plus the threshold. The dates of every repository are held in NumPy arrays,
+so the forecast for all of the thresholds is computed in one vectorised pass rather than a loop
+over the repositories for each threshold and day.
+
+numpy is imported when a forecast is made, so it does not slow down the app's start.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0415
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING
+
+import models
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Limits on what a forecast can be asked for, so a single request cannot hold a worker for long
+MAX_DAYS = 365
+MAX_THRESHOLDS = 10
+MAX_THRESHOLD_DAYS = 3650
+
+# Dates are converted to datetime64[D] (days since 1970-01-01) from their ordinals, which is quicker than from date objects
+_epoch_ordinal = date(1970, 1, 1).toordinal()
+
+
+@dataclass(frozen=True, slots=True)
+class RepositoryDates:
+    """The dates of an organisation's stored repositories, as datetime64[D] arrays.
+
+    Entries at the same index are for the same repository.
+    """
+
+    # The day each repository's threshold counts from
+    start: np.ndarray
+    last_commit: np.ndarray
+
+    @classmethod
+    def from_repositories(cls, repos: list[models.Repository], today: date) -> RepositoryDates:
+        """Gets the dates of stored repositories.
+
+        ==========
+
+        An exempt repository is added again on the day its exemption expires (see manage_repos in app.py),
+        so its threshold counts from then rather than from when it was first added.
+
+        Args:
+            repos (list): the stored repositories.
+            today (date): the date used for repositories with no date added.
+
+        Returns:
+            RepositoryDates
+        """
+        import numpy as np
+
+        start = np.fromiter(
+            (
+                (repo.exemption.until if repo.exemption is not None else repo.date_added or today).toordinal()
+                for repo in repos
+            ),
+            dtype=np.int64,
+            count=len(repos),
+        )
+        last_commit = np.fromiter((repo.last_commit.toordinal() for repo in repos), dtype=np.int64, count=len(repos))
+
+        return cls(
+            start=(start - _epoch_ordinal).astype("datetime64[D]"),
+            last_commit=(last_commit - _epoch_ordinal).astype("datetime64[D]"),
+        )
+
+
+def forecast(
+    dates: RepositoryDates, today: date, days: int, thresholds: list[int], last_commit_before: date | None = None
+) -> dict:
+    """Counts the repositories which become eligible for archive on each of the next days, for each threshold.
+
+    ==========
+
+    Repositories which are already eligible are counted on the first day (today), as the next archive would archive them.
+
+    Args:
+        dates (RepositoryDates): the dates of the stored repositories.
+        today (date): the first day of the forecast.
+        days (int): the number of days to forecast.
+        thresholds (list): the thresholds (in days) to forecast for.
+        last_commit_before (date): if given, only repositories last committed to before this date are counted,
+            as if they had been found with it as the archive date.
+
+    Returns:
+        dict: the days forecast, and for each threshold the repositories which become eligible on each day
+        (newlyEligible, i.e those a daily archive would archive) and the total eligible by each day (eligible).
+    """
+    import numpy as np
+
+    start = dates.start
+
+    if last_commit_before is not None:
+        start = start[dates.last_commit < np.datetime64(last_commit_before, "D")]
+
+    threshold_days = np.asarray(thresholds, dtype=np.int64)
+
+    # The day (counted from today) each repository becomes eligible under each threshold, one row per threshold.
+    # Repositories which are already eligible are counted today.
+    due = (start - np.datetime64(today, "D")).astype(np.int64)[np.newaxis, :] + threshold_days[:, np.newaxis]
+    np.maximum(due, 0, out=due)
+
+    # Each (threshold, day) pair is given its own bin, so every threshold is counted by a single bincount
+    in_forecast = due < days
+    bins = (np.arange(len(thresholds))[:, np.newaxis] * days + due)[in_forecast]
+    newly_eligible = np.bincount(bins, minlength=len(thresholds) * days).reshape(len(thresholds), days)
+    eligible = np.cumsum(newly_eligible, axis=1)
+
+    return {
+        "today": today.isoformat(),
+        "dates": np.arange(np.datetime64(today, "D"), np.datetime64(today, "D") + days).astype(str).tolist(),
+        "repositories": len(start),
+        "lastCommitBefore": last_commit_before.isoformat() if last_commit_before is not None else None,
+        "forecasts": [
+            {
+                "threshold": threshold,
+                "newlyEligible": newly_eligible[i].tolist(),
+                "eligible": eligible[i].tolist(),
+            }
+            for i, threshold in enumerate(thresholds)
+        ],
+    }
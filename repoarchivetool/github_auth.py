@@ -0,0 +1,159 @@
+"""Gets the GitHub App installation tokens each organisation's requests are made with.
+
+Tokens are shared by every session in the process, and each session keeps the token of each
+organisation it has used (see check_organisation_token()).
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R1710, C0415
+
+import functools
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import flask
+import metrics
+import settings
+import token_pool
+
+logger = logging.getLogger(__name__)
+
+# Installation tokens are refreshed this long before they expire, so a token never expires mid-request
+token_refresh_margin = timedelta(minutes=5)
+
+# Installation tokens shared by every session in this process ({(organisation, App client ID): (token, time to refresh it)})
+installation_tokens: dict[tuple[str, str | None], tuple[str, datetime]] = {}
+installation_tokens_lock = threading.Lock()
+
+# Each organisation's GitHub API requests are spread across the installation tokens of the main App and any in
+# github_app_pool, shared by every session in this process ({organisation: pool})
+token_pools: dict[str, token_pool.TokenPool] = {}
+token_pools_lock = threading.Lock()
+
+
+def get_github_interface(org: str) -> metrics.InstrumentedGitHubInterface:
+    """Returns a github_interface for the organisation's tokens, with each API call timed for /metrics.
+
+    Requests are spread across the session's token and those of the Apps in github_app_pool (see get_token_pool()).
+    Raises KeyError if the session has no token for the organisation.
+    """
+    return metrics.instrument_github(token_pool.PooledGitHubInterface(get_token_pool(org, flask.session["pats"][org])))
+
+
+def get_token_pool(org: str, token: str) -> token_pool.TokenPool:
+    """Gets the organisation's token pool, brought up to date with the given token and the pooled Apps' tokens.
+
+    ==========
+
+    An App whose installation token cannot be minted (i.e it is not installed in the organisation) is left out
+    of the pool until it can be.
+
+    Args:
+        org (str): the organisation.
+        token (str): the main App's installation token, from the session.
+
+    Returns:
+        TokenPool
+    """
+    import github_api_toolkit
+
+    with token_pools_lock:
+        pool = token_pools.setdefault(org, token_pool.TokenPool(org))
+
+    pool.set_token(settings.client_id or "main", token, github_api_toolkit.github_interface)
+
+    for github_app in settings.github_app_pool:
+        installation_token = get_installation_token(org, github_app)
+
+        if installation_token is None:
+            logger.warning("Could not get an installation token for %s from GitHub App %s", org, github_app[0])
+            pool.remove_token(github_app[0])
+        else:
+            pool.set_token(github_app[0], installation_token[0], github_api_toolkit.github_interface)
+
+    return pool
+
+
+@functools.cache
+def get_github_app_key(secret: str | None = None) -> str:
+    """Gets a GitHub App's private key (.pem file) from AWS Secrets Manager.
+
+    The key is fetched when the first installation token is needed, then reused by the process.
+    The main App's key (secret_name) is fetched unless another secret is given.
+    """
+    import boto3
+
+    session = boto3.Session()
+    secret_manager = session.client("secretsmanager", region_name=settings.secret_reigon)
+
+    return secret_manager.get_secret_value(SecretId=secret or settings.secret_name)["SecretString"]
+
+
+def get_installation_token(org: str, github_app: tuple[str, str] | None = None) -> tuple[str, datetime] | None:
+    """Gets an installation token for the given organisation.
+
+    Each organisation has its own installation of the GitHub App, so needs its own token.
+    Tokens are shared by every session in the process, so a new token is only requested once the last one is about to expire.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        github_app (tuple): the client ID and secret name of an App in github_app_pool. Defaults to the main App.
+
+    Returns:
+        The token and the time it should be refreshed, or None if there is an error with the .pem file.
+    """
+    import github_api_toolkit
+
+    if github_app is None:
+        app_client_id, app_key = settings.client_id, get_github_app_key
+    else:
+        app_client_id, app_key = github_app[0], functools.partial(get_github_app_key, github_app[1])
+
+    with installation_tokens_lock:
+        cached = installation_tokens.get((org, app_client_id))
+
+        if cached is not None and cached[1] > datetime.now().astimezone():
+            return cached
+
+        response = github_api_toolkit.get_token_as_installation(org, app_key(), app_client_id)
+
+        # If type is not tuple, it is string
+        # This means there is an error with the .pem file
+        if not isinstance(response, tuple):
+            # Fetch the key again next time, in case it has been replaced
+            get_github_app_key.cache_clear()
+            return None
+
+        expiration = datetime.strptime(response[1], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+        installation_tokens[(org, app_client_id)] = (response[0], expiration - token_refresh_margin)
+
+        return installation_tokens[(org, app_client_id)]
+
+
+def update_token(org: str):
+    """Updates the pats and token_expirations session variables with a token for the given organisation."""
+    installation_token = get_installation_token(org)
+
+    if installation_token is not None:
+        token, expiration = installation_token
+
+        flask.session.setdefault("pats", {})[org] = token
+        flask.session.setdefault("token_expirations", {})[org] = expiration
+
+        # The session is only saved automatically when it is assigned to, not when a nested dictionary changes
+        flask.session.modified = True
+
+    else:
+        return flask.render_template("error.html", error="There is an error with the .pem file.")
+
+
+def check_organisation_token(org: str):
+    """Runs update_token for the organisation if it has no token or its token has expired."""
+    try:
+        if flask.session["token_expirations"][org] < datetime.now().astimezone():
+            return update_token(org)
+    except KeyError:
+        return update_token(org)
@@ -0,0 +1,281 @@
+"""Compresses responses, lets browsers revalidate pages with conditional requests,
+and fingerprints static assets.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long
+
+import functools
+import gzip
+import hashlib
+import os
+from collections.abc import Callable
+from datetime import datetime
+from http import HTTPStatus
+
+import brotli
+import flask
+from werkzeug.http import is_resource_modified
+
+# Responses with these Content-Types are compressed (images, other than SVGs, are already compressed)
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# Smaller responses are not compressed, as the saving would be smaller than the cost of compressing them
+MINIMUM_COMPRESS_SIZE = 512
+
+# Files sent from disk (i.e static assets) are read into memory to be compressed, so larger ones are sent as they are
+MAXIMUM_FILE_COMPRESS_SIZE = 1024 * 1024
+
+# Content-Encodings in order of preference, and how to compress with each.
+# Pages are compressed as they are served, so quick levels are used rather than the smallest output.
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "br": lambda data: brotli.compress(data, quality=5),
+    "gzip": lambda data: gzip.compress(data, compresslevel=6),
+}
+
+# Fingerprinted static assets never change, so may be cached by browsers for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The fingerprints of files ({path: (mtime, fingerprint)}) and the compressed bodies of static files
+# ({(path, encoding): (mtime, body)}), kept until the file is modified.
+_fingerprints: dict[str, tuple[float, str]] = {}
+_compressed_files: dict[tuple[str, str], tuple[float, bytes]] = {}
+
+
+def fingerprint(path: str) -> str:
+    """Gets the fingerprint of a file, which changes whenever its content does.
+
+    Fingerprints are cached until the file is modified.
+
+    ==========
+
+    Args:
+        path (str): the path of the file.
+
+    Returns:
+        str
+    """
+    mtime = os.path.getmtime(path)
+    cached = _fingerprints.get(path)
+
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:16])
+
+        _fingerprints[path] = cached
+
+    return cached[1]
+
+
+def compress_file(path: str, encoding: str) -> bytes:
+    """Gets the body of a static file compressed with the given Content-Encoding.
+
+    Static files only change when the tool is deployed, so each is compressed once and cached until it is modified.
+
+    ==========
+
+    Args:
+        path (str): the path of the file.
+        encoding (str): the Content-Encoding to compress it with.
+
+    Returns:
+        bytes
+    """
+    mtime = os.path.getmtime(path)
+    cached = _compressed_files.get((path, encoding))
+
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, ENCODERS[encoding](f.read()))
+
+        _compressed_files[path, encoding] = cached
+
+    return cached[1]
+
+
+def add_static_fingerprint(endpoint: str, values: dict) -> None:
+    """Adds the fingerprint of a static asset to its URL, so url_for("static", ...) changes whenever the asset does.
+
+    Registered with app.url_defaults.
+
+    ==========
+
+    Args:
+        endpoint (str): the endpoint the URL is for.
+        values (dict): the URL's arguments.
+    """
+    if endpoint != "static" or "filename" not in values:
+        return
+
+    path = os.path.join(flask.current_app.static_folder, values["filename"])
+
+    if os.path.isfile(path):
+        values.setdefault("v", fingerprint(path))
+
+
+@functools.cache
+def get_build_version(*directories: str) -> str:
+    """Gets a hash of every file in the given directories (i.e the templates and static assets).
+
+    This is part of each page's ETag, so a new version of the tool does not reuse pages cached by the last one.
+
+    ==========
+
+    Args:
+        directories (str): the directories to hash.
+
+    Returns:
+        str
+    """
+    digest = hashlib.sha256()
+
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+
+            for filename in sorted(files):
+                digest.update(fingerprint(os.path.join(root, filename)).encode())
+
+    return digest.hexdigest()[:16]
+
+
+def page_etag(*parts: object) -> str:
+    """Creates an ETag for a page from everything it is rendered from.
+
+    ==========
+
+    Args:
+        parts: the versions of the storage files the page shows, and any other inputs to the page.
+
+    Returns:
+        str
+    """
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def is_modified(request: flask.Request, etag: str, last_modified: datetime) -> bool:
+    """Checks whether a page has changed since the browser cached it (If-None-Match and If-Modified-Since).
+
+    ==========
+
+    Args:
+        request (flask.Request): the request.
+        etag (str): the page's current ETag.
+        last_modified (datetime): when the page last changed.
+
+    Returns:
+        bool
+    """
+    return is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def add_validators(response: flask.Response, etag: str, last_modified: datetime) -> flask.Response:
+    """Adds a page's ETag and Last-Modified to a response, so the browser can revalidate it next time.
+
+    Pages depend on the session (i.e the selected organisation), so are only cached by the browser,
+    and are always revalidated before being reused.
+
+    ==========
+
+    Args:
+        response (flask.Response): the response.
+        etag (str): the page's ETag.
+        last_modified (datetime): when the page last changed.
+
+    Returns:
+        flask.Response
+    """
+    # The ETag is weak as the page is the same whether or not it is compressed
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+
+    return response
+
+
+def not_modified(etag: str, last_modified: datetime) -> flask.Response:
+    """Creates a 304 Not Modified response, telling the browser to reuse the page it has cached."""
+    return add_validators(flask.Response(status=304), etag, last_modified)
+
+
+def cache_static_asset(request: flask.Request, response: flask.Response) -> flask.Response:
+    """Marks a static asset as immutable if it was requested by its current fingerprint.
+
+    Assets requested without a fingerprint (or with an old one) keep Flask's default headers, so are revalidated.
+
+    ==========
+
+    Args:
+        request (flask.Request): the request.
+        response (flask.Response): the response.
+
+    Returns:
+        flask.Response
+    """
+    if request.endpoint != "static" or response.status_code != HTTPStatus.OK or "v" not in request.args:
+        return response
+
+    path = os.path.join(flask.current_app.static_folder, request.view_args["filename"])
+
+    if os.path.isfile(path) and request.args["v"] == fingerprint(path):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+
+    return response
+
+
+def compress(request: flask.Request, response: flask.Response) -> flask.Response:
+    """Compresses a response with the best Content-Encoding the browser accepts (brotli, then gzip).
+
+    Streamed responses (i.e downloads), large files and responses which are small, already compressed or not text
+    are left as they are. Static files are compressed once and reused until they change.
+
+    ==========
+
+    Args:
+        request (flask.Request): the request.
+        response (flask.Response): the response.
+
+    Returns:
+        flask.Response
+    """
+    if response.direct_passthrough:
+        # Files sent from disk are only compressed if they are small enough to read into memory
+        if (response.content_length or MAXIMUM_FILE_COMPRESS_SIZE + 1) > MAXIMUM_FILE_COMPRESS_SIZE:
+            return response
+    elif response.is_streamed:
+        return response
+
+    if (
+        response.status_code != HTTPStatus.OK
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+        or (response.content_length or 0) < MINIMUM_COMPRESS_SIZE
+    ):
+        return response
+
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+
+    # Whether or not it is compressed, the response depends on Accept-Encoding
+    response.vary.add("Accept-Encoding")
+
+    if encoding is None:
+        return response
+
+    if request.endpoint == "static" and response.direct_passthrough:
+        path = os.path.join(flask.current_app.static_folder, request.view_args["filename"])
+        response.close()
+        response.direct_passthrough = False
+        response.set_data(compress_file(path, encoding))
+    else:
+        response.direct_passthrough = False
+        response.set_data(ENCODERS[encoding](response.get_data()))
+
+    response.headers["Content-Encoding"] = encoding
+
+    # Strong ETags (i.e of static files) identify the uncompressed bytes, so are weakened
+    etag, weak = response.get_etag()
+
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
@@ -0,0 +1,101 @@
+"""Progress journals, which record the work done by a long running request (i.e an archive or undo)
+so it can be resumed if the request is interrupted.
+
+Journals are JSON Lines files, appended to locally and flushed to S3 every few entries.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R0903
+
+import json
+import os
+import threading
+
+import metrics
+import storage_interface
+
+
+def append_journal(filename: str, entry: dict):
+    """Appends an entry to a local progress journal.
+
+    Journals are stored as JSON Lines so each entry is a single small append, rather than rewriting the whole file.
+
+    ==========
+
+    Args:
+        filename (str): the name of the journal
+        entry (dict): the entry to append
+    """
+    storage_interface.create_parent_directory(filename)
+
+    with open(filename, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+class JournalWriter:
+    """Appends entries to a progress journal from any number of threads, flushing it to S3 every flush_interval entries."""
+
+    def __init__(self, bucket: str, filename: str, flush_interval: int, count: int = 0) -> None:
+        """Creates the writer.
+
+        ==========
+
+        Args:
+            bucket (str): the name of the bucket the journal is flushed to
+            filename (str): the name of the journal
+            flush_interval (int): the number of entries between each flush
+            count (int): the number of entries already in the journal
+        """
+        self.bucket = bucket
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.count = count
+        self._lock = threading.Lock()
+
+    def append(self, entry: dict):
+        """Appends an entry to the journal, flushing it to S3 if flush_interval entries have been added since the last flush.
+
+        ==========
+
+        Args:
+            entry (dict): the entry to append
+        """
+        with self._lock:
+            append_journal(self.filename, entry)
+            self.count += 1
+
+            if self.count % self.flush_interval == 0:
+                storage_interface.update_bucket_content(self.bucket, self.filename)
+
+
+@metrics.timed(storage_interface.STORAGE_METRIC, storage_interface.STORAGE_METRIC_HELP, operation="read_journal")
+def read_journal(bucket: str, filename: str) -> list:
+    """Reads a progress journal, downloading it from S3 if it does not exist locally.
+
+    A local journal is always preferred as it may contain entries which have not been flushed to S3 yet.
+
+    ==========
+
+    Args:
+        bucket (str): the name of the bucket the journal is flushed to
+        filename (str): the name of the journal
+
+    Returns:
+        list: the journal's entries, or an empty list if there is no journal.
+    """
+    if not os.path.isfile(filename):
+        storage_interface.get_bucket_content(bucket, filename)
+
+    entries = []
+
+    try:
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the process stopped while writing it
+                    continue
+    except FileNotFoundError:
+        pass
+
+    return entries
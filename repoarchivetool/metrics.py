@@ -0,0 +1,488 @@
+"""Collects performance metrics for the app and exposes them in the Prometheus text format.
+
+Each process collects its own metrics. When MULTIPROCESS_DIR is set (as it is by gunicorn.conf.py),
+each process also publishes them to a file in that directory, and /metrics sums the files of every
+process, so it covers all of gunicorn's workers whichever one answers the scrape.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R0903
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any
+
+# Histogram bucket upper bounds (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Methods of github_interface which make a request to the GitHub API
+GITHUB_METHODS = ("get", "patch", "post", "put", "delete")
+
+# The directory each process publishes its metrics to. If empty, /metrics only covers the process which answers it.
+MULTIPROCESS_DIR = os.getenv("METRICS_MULTIPROCESS_DIR", "")
+
+# The size a process's metrics file starts at, and at least how much it grows by when full (bytes)
+METRICS_FILE_SIZE = 64 * 1024
+
+# The bytes of a metrics file in use, at its start
+_used_header = struct.Struct("Q")
+
+# The length of an entry's key, at the start of each entry
+_key_header = struct.Struct("I")
+
+_lock = threading.Lock()
+
+# {metric_name: (metric_type, help_text)}
+_metadata: dict[str, tuple[str, str]] = {}
+
+# {(metric_name, labels): value}
+_counters: dict[tuple[str, tuple], float] = {}
+
+# {(metric_name, labels): [bucket_counts, sum, count]}
+_histograms: dict[tuple[str, tuple], list] = {}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+class MetricsFile:
+    """A process's metrics, published to a memory-mapped file which other processes can read.
+
+    The file starts with the number of bytes in use, followed by an entry for each counter and histogram: the length of
+    its key, its key (the metric's type, name, help text and labels, in JSON) padded to 8 bytes, then its values as
+    doubles. Values are updated in place. New entries are written in full before the bytes in use are updated, so
+    readers never see half of one.
+
+    A file left by an earlier process with the same pid is appended to, so its metrics are still counted.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = max(os.fstat(self._fd).st_size, METRICS_FILE_SIZE)
+        os.ftruncate(self._fd, size)
+
+        self._map = mmap.mmap(self._fd, size)
+        self._used = _used_header.unpack_from(self._map)[0] or _used_header.size
+
+        # {(metric_name, labels): offset of its values}
+        self._offsets: dict[tuple, int] = {}
+
+    def write(self, key: tuple, metric_type: str, help_text: str, values: list) -> None:
+        """Writes the values of a counter or histogram, adding an entry for it if it has none.
+
+        ==========
+
+        Args:
+            key (tuple): the metric's name and labels.
+            metric_type (str): "counter" or "histogram".
+            help_text (str): the metric's description.
+            values (list): the metric's values.
+        """
+        offset = self._offsets.get(key)
+
+        if offset is not None:
+            struct.pack_into(f"{len(values)}d", self._map, offset, *values)
+            return
+
+        name, labels = key
+        encoded = json.dumps([metric_type, name, help_text, labels]).encode()
+        padding = -(_key_header.size + len(encoded)) % 8
+        offset = self._used + _key_header.size + len(encoded) + padding
+        end = offset + 8 * len(values)
+
+        if end > len(self._map):
+            self._grow(end)
+
+        _key_header.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _key_header.size : self._used + _key_header.size + len(encoded)] = encoded
+        struct.pack_into(f"{len(values)}d", self._map, offset, *values)
+
+        self._used = end
+        _used_header.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+
+    def _grow(self, needed: int) -> None:
+        size = max(needed, len(self._map) + METRICS_FILE_SIZE)
+
+        self._map.close()
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def close(self) -> None:
+        """Unmaps and closes the file."""
+        self._map.close()
+        os.close(self._fd)
+
+
+def read_metrics_file(path: str) -> Iterator[tuple[str, str, str, tuple, tuple]]:
+    """Reads the metrics a process has published.
+
+    ==========
+
+    Args:
+        path (str): the path of the process's metrics file.
+
+    Yields:
+        tuple: the type, name, help text, labels and values of each counter and histogram.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _used_header.size:
+        return
+
+    used = _used_header.unpack_from(data)[0]
+    position = _used_header.size
+
+    while position < used:
+        (length,) = _key_header.unpack_from(data, position)
+        position += _key_header.size
+
+        metric_type, name, help_text, labels = json.loads(data[position : position + length])
+        padding = -(_key_header.size + length) % 8
+        position += length + padding
+
+        count = 1 if metric_type == "counter" else len(DEFAULT_BUCKETS) + 2
+        values = struct.unpack_from(f"{count}d", data, position)
+        position += 8 * count
+
+        yield metric_type, name, help_text, tuple(tuple(label) for label in labels), values
+
+
+# {pid: the process's metrics file}, so a forked process opens a file of its own
+_files: dict[int, MetricsFile] = {}
+
+
+def _metrics_filename(pid: int) -> str:
+    return os.path.join(MULTIPROCESS_DIR, f"metrics_{pid}.db")
+
+
+def _publish(key: tuple) -> None:
+    """Writes a metric's values to this process's metrics file. Must be called holding _lock."""
+    pid = os.getpid()
+
+    if pid not in _files:
+        os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+        _files[pid] = MetricsFile(_metrics_filename(pid))
+
+    metric_type, help_text = _metadata[key[0]]
+
+    if metric_type == "counter":
+        values = [_counters[key]]
+    else:
+        buckets, total, count = _histograms[key]
+        values = [*buckets, total, count]
+
+    _files[pid].write(key, metric_type, help_text, values)
+
+
+def inc(name: str, value: float = 1, help_text: str = "", **labels: Any) -> None:
+    """Increments a counter.
+
+    ==========
+
+    Args:
+        name (str): the name of the counter.
+        value (float): the amount to increment the counter by. Defaults to 1.
+        help_text (str): a description of the counter shown in /metrics.
+        **labels: the labels of the counter.
+    """
+    key = (name, _label_key(labels))
+
+    with _lock:
+        _metadata.setdefault(name, ("counter", help_text))
+        _counters[key] = _counters.get(key, 0) + value
+
+        if MULTIPROCESS_DIR:
+            _publish(key)
+
+
+def observe(name: str, seconds: float, help_text: str = "", **labels: Any) -> None:
+    """Records a duration in a histogram.
+
+    ==========
+
+    Args:
+        name (str): the name of the histogram.
+        seconds (float): the duration to record.
+        help_text (str): a description of the histogram shown in /metrics.
+        **labels: the labels of the histogram.
+    """
+    key = (name, _label_key(labels))
+
+    with _lock:
+        _metadata.setdefault(name, ("histogram", help_text))
+
+        histogram = _histograms.setdefault(key, [[0] * len(DEFAULT_BUCKETS), 0.0, 0])
+
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+
+        histogram[1] += seconds
+        histogram[2] += 1
+
+        if MULTIPROCESS_DIR:
+            _publish(key)
+
+
+@contextmanager
+def timer(name: str, help_text: str = "", **labels: Any) -> Iterator[None]:
+    """Times the enclosed block and records the duration in a histogram.
+
+    ==========
+
+    Args:
+        name (str): the name of the histogram.
+        help_text (str): a description of the histogram shown in /metrics.
+        **labels: the labels of the histogram.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, help_text, **labels)
+
+
+def timed(name: str, help_text: str = "", **labels: Any) -> Callable:
+    """Decorator which times each call of the decorated function.
+
+    ==========
+
+    Args:
+        name (str): the name of the histogram.
+        help_text (str): a description of the histogram shown in /metrics.
+        **labels: the labels of the histogram.
+
+    Returns:
+        Callable
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timer(name, help_text, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_status(response: Any) -> str:
+    """Gets the HTTP status code of a github_interface response as a string.
+
+    github_interface returns a Response if successful, otherwise the raised exception.
+
+    ==========
+
+    Args:
+        response: the object returned from github_interface.
+
+    Returns:
+        str: the status code or "error" if the request did not get a response.
+    """
+    status = getattr(response, "status_code", None)
+
+    if status is None:
+        # HTTPError keeps the failed response on the exception
+        status = getattr(getattr(response, "response", None), "status_code", None)
+
+    return str(status) if status is not None else "error"
+
+
+class InstrumentedGitHubInterface:
+    """Wraps a github_interface so each request made to the GitHub API is timed and counted."""
+
+    def __init__(self, gh: Any) -> None:
+        self._gh = gh
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._gh, name)
+
+        if name not in GITHUB_METHODS:
+            return attribute
+
+        @wraps(attribute)
+        def call(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            response = attribute(*args, **kwargs)
+
+            observe(
+                "repoarchive_github_request_duration_seconds",
+                time.perf_counter() - start,
+                "Time spent waiting on the GitHub API.",
+                method=name.upper(),
+                status=get_status(response),
+            )
+
+            return response
+
+        return call
+
+
+def instrument_github(gh: Any) -> InstrumentedGitHubInterface:
+    """Returns the given github_interface wrapped with request timers.
+
+    ==========
+
+    Args:
+        gh (github_interface): the instance to wrap.
+
+    Returns:
+        InstrumentedGitHubInterface
+    """
+    if isinstance(gh, InstrumentedGitHubInterface):
+        return gh
+
+    return InstrumentedGitHubInterface(gh)
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+
+    if not pairs:
+        return ""
+
+    escaped = []
+    for key, value in pairs:
+        escaped_value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{key}="{escaped_value}"')
+
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _read_published() -> tuple[dict, dict, dict]:
+    """Sums the metrics published to MULTIPROCESS_DIR by every process."""
+    metadata: dict[str, tuple[str, str]] = {}
+    counters: dict[tuple[str, tuple], float] = {}
+    histograms: dict[tuple[str, tuple], list] = {}
+
+    for filename in sorted(os.listdir(MULTIPROCESS_DIR)):
+        if not filename.startswith("metrics_"):
+            continue
+
+        for metric_type, name, help_text, labels, values in read_metrics_file(os.path.join(MULTIPROCESS_DIR, filename)):
+            metadata.setdefault(name, (metric_type, help_text))
+            key = (name, labels)
+
+            if metric_type == "counter":
+                counters[key] = counters.get(key, 0) + values[0]
+                continue
+
+            histogram = histograms.setdefault(key, [[0] * len(DEFAULT_BUCKETS), 0.0, 0])
+
+            for i, bucket_count in enumerate(values[: len(DEFAULT_BUCKETS)]):
+                histogram[0][i] += int(bucket_count)
+
+            histogram[1] += values[-2]
+            histogram[2] += int(values[-1])
+
+    return metadata, counters, histograms
+
+
+def _render(metadata: dict, counters: dict, histograms: dict) -> str:
+    lines = []
+
+    for name, (metric_type, help_text) in sorted(metadata.items()):
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+        if metric_type == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        else:
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+
+                for bound, bucket_count in zip(DEFAULT_BUCKETS, buckets, strict=True):
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {bucket_count}")
+
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def render() -> str:
+    """Renders all collected metrics in the Prometheus text exposition format (version 0.0.4).
+
+    If MULTIPROCESS_DIR is set, these are the metrics of every process publishing to it, otherwise this process's.
+
+    ==========
+
+    Returns:
+        str
+    """
+    if MULTIPROCESS_DIR:
+        # Counters published as doubles are read back as floats, so those counted in whole numbers are shown as such
+        metadata, counters, histograms = _read_published()
+        counters = {key: int(value) if value.is_integer() else value for key, value in counters.items()}
+
+        return _render(metadata, counters, histograms)
+
+    with _lock:
+        return _render(_metadata, _counters, _histograms)
+
+
+def reset() -> None:
+    """Removes all collected metrics."""
+    pid = os.getpid()
+
+    with _lock:
+        _metadata.clear()
+        _counters.clear()
+        _histograms.clear()
+
+        if pid in _files:
+            _files.pop(pid).close()
+            os.remove(_metrics_filename(pid))
+
+
+def clear_published() -> None:
+    """Removes every metrics file in MULTIPROCESS_DIR, and this process's metrics.
+
+    Files outlive the processes which wrote them, so the metrics of a worker which has been restarted are still
+    counted. gunicorn's master calls this before starting, so a directory used by an earlier run starts empty.
+    """
+    reset()
+
+    if not MULTIPROCESS_DIR or not os.path.isdir(MULTIPROCESS_DIR):
+        return
+
+    for filename in os.listdir(MULTIPROCESS_DIR):
+        if filename.startswith("metrics_"):
+            os.remove(os.path.join(MULTIPROCESS_DIR, filename))
+
+
+def _after_fork_in_child() -> None:
+    """Starts a forked process's metrics afresh, if publishing them.
+
+    The parent's metrics are already in its own file, so they would otherwise be counted twice.
+    """
+    if MULTIPROCESS_DIR:
+        _metadata.clear()
+        _counters.clear()
+        _histograms.clear()
+
+    _lock.release()
+
+
+# The lock is held while forking, so it is not held by a thread which does not exist in the child
+os.register_at_fork(before=_lock.acquire, after_in_parent=_lock.release, after_in_child=_after_fork_in_child)
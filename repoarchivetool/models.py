@@ -0,0 +1,249 @@
+"""Typed records for the repositories and archive batches the tool stores, and the codec to and
+from the storage format.
+
+The storage format (repositories.json, archived.json and the progress journals) is unchanged,
+so existing files can still be read. Records are converted at the edge: decoded once when a file
+is read and encoded when it is written.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R0902
+
+import contextlib
+import gc
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+
+# Stored in place of a date when a repository is not exempt
+NO_EXEMPTION = "1900-01-01"
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> date:
+    """Parses a YYYY-MM-DD date.
+
+    Dates are cached, so the many records added or last pushed to on the same day share a single date object.
+    """
+    return date.fromisoformat(value)
+
+
+@contextlib.contextmanager
+def gc_paused() -> Iterator[None]:
+    """Pauses the cyclic garbage collector while a large file is decoded.
+
+    Decoding creates hundreds of thousands of records, which would otherwise trigger many collections. None of them form
+    reference cycles, so the collections would free nothing.
+
+    The collector is paused for the whole process, not just the calling thread, so this should only wrap work that
+    finishes quickly and does not wait on I/O.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@dataclass(slots=True)
+class Contributor:
+    """A contributor to a repository."""
+
+    login: str
+    avatar: str
+    url: str
+    contributions: int
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Contributor":
+        """Decodes a contributor from its stored form."""
+        # The same contributors appear across many repositories, so their strings are shared
+        return cls(
+            login=sys.intern(data["login"]),
+            avatar=sys.intern(data["avatar"]),
+            url=sys.intern(data["url"]),
+            contributions=data["contributions"],
+        )
+
+    def to_dict(self) -> dict:
+        """Encodes the contributor to its stored form."""
+        return {"avatar": self.avatar, "login": self.login, "url": self.url, "contributions": self.contributions}
+
+
+@dataclass(slots=True)
+class Exemption:
+    """Why, and until when, a repository should not be archived."""
+
+    until: date
+    reason: str
+    by_name: str
+    by_email: str
+
+
+@dataclass(slots=True)
+class Repository:
+    """A repository waiting to be archived."""
+
+    name: str
+    type: str
+    api_url: str
+    last_commit: date
+    date_added: date | None = None
+    # An error message if the contributors could not be fetched
+    contributors: list[Contributor] | str = field(default_factory=list)
+    exemption: Exemption | None = None
+    # Not stored by older versions of the tool, so may be empty
+    html_url: str = ""
+
+    # Only set for repositories found by data_retrieval, this is not stored
+    contributors_url: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Repository":
+        """Decodes a repository from its entry in repositories.json."""
+        # Called for every repository in repositories.json, so the records are built positionally and the contributors
+        # are built here rather than through Contributor.from_dict
+        intern = sys.intern
+        contributors = data["contributors"]
+
+        if isinstance(contributors, list):
+            contributors = [
+                Contributor(intern(c["login"]), intern(c["avatar"]), intern(c["url"]), c["contributions"])
+                for c in contributors
+            ]
+
+        exempt_until = data["exemptUntil"]
+        exemption = None
+
+        if exempt_until != NO_EXEMPTION:
+            exempt_by = data["exemptBy"]
+            exemption = Exemption(parse_date(exempt_until), data["exemptReason"], exempt_by["name"], exempt_by["email"])
+
+        return cls(
+            data["name"],
+            intern(data["type"]),
+            data["apiUrl"],
+            parse_date(data["lastCommit"]),
+            parse_date(data["dateAdded"]),
+            contributors,
+            exemption,
+            data.get("htmlUrl", ""),
+        )
+
+    def to_dict(self) -> dict:
+        """Encodes the repository to its entry in repositories.json."""
+        contributors: list[dict] | str
+
+        # As in from_dict, the contributors are encoded here rather than through Contributor.to_dict
+        if isinstance(self.contributors, list):
+            contributors = [
+                {"avatar": c.avatar, "login": c.login, "url": c.url, "contributions": c.contributions}
+                for c in self.contributors
+            ]
+        else:
+            contributors = self.contributors
+
+        if self.exemption is None:
+            exempt_until, exempt_reason, exempt_by = NO_EXEMPTION, "", {"name": "", "email": ""}
+        else:
+            exempt_until = self.exemption.until.isoformat()
+            exempt_reason = self.exemption.reason
+            exempt_by = {"name": self.exemption.by_name, "email": self.exemption.by_email}
+
+        return {
+            "name": self.name,
+            "type": self.type,
+            "contributors": contributors,
+            "apiUrl": self.api_url,
+            "htmlUrl": self.html_url,
+            "lastCommit": self.last_commit.isoformat(),
+            "dateAdded": self.date_added.isoformat() if self.date_added is not None else "",
+            "exemptUntil": exempt_until,
+            "exemptReason": exempt_reason,
+            "exemptBy": exempt_by,
+        }
+
+
+@dataclass(slots=True)
+class ArchivedRepository:
+    """The outcome of archiving a repository, as part of an archive batch."""
+
+    name: str
+    api_url: str
+    status: str
+    message: str
+    # Not stored by older versions of the tool, so may be empty
+    html_url: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ArchivedRepository":
+        """Decodes an archived repository from its entry in an archive batch."""
+        return cls(
+            name=data["name"],
+            api_url=data["apiurl"],
+            status=data["status"],
+            message=data["message"],
+            html_url=data.get("htmlurl", ""),
+        )
+
+    def to_dict(self) -> dict:
+        """Encodes the archived repository to its entry in an archive batch."""
+        return {
+            "name": self.name,
+            "apiurl": self.api_url,
+            "htmlurl": self.html_url,
+            "status": self.status,
+            "message": self.message,
+        }
+
+
+@dataclass(slots=True)
+class ArchiveBatch:
+    """A group of repositories archived together, which can be undone together."""
+
+    batch_id: int
+    date: date
+    repos: list[ArchivedRepository] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ArchiveBatch":
+        """Decodes an archive batch from its entry in archived.json."""
+        return cls(
+            batch_id=data["batchID"],
+            date=parse_date(data["date"]),
+            repos=[ArchivedRepository.from_dict(repo) for repo in data.get("repos", [])],
+        )
+
+    def to_dict(self) -> dict:
+        """Encodes the archive batch to its entry in archived.json."""
+        return {
+            "batchID": self.batch_id,
+            "date": self.date.isoformat(),
+            "repos": [repo.to_dict() for repo in self.repos],
+        }
+
+
+def decode_repositories(data: list) -> list[Repository]:
+    """Decodes the contents of repositories.json."""
+    with gc_paused():
+        return [Repository.from_dict(repo) for repo in data]
+
+
+def encode_repositories(repos: list[Repository]) -> list[dict]:
+    """Encodes repositories for repositories.json."""
+    return [repo.to_dict() for repo in repos]
+
+
+def decode_archive_list(data: list) -> list[ArchiveBatch]:
+    """Decodes the contents of archived.json."""
+    with gc_paused():
+        return [ArchiveBatch.from_dict(batch) for batch in data]
+
+
+def encode_archive_list(archive_list: list[ArchiveBatch]) -> list[dict]:
+    """Encodes archive batches for archived.json."""
+    return [batch.to_dict() for batch in archive_list]
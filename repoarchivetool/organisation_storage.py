@@ -0,0 +1,331 @@
+"""Loads and saves each organisation's storage files (repositories.json and archived.json),
+and the exemption overrides and analytics exports kept beside them.
+
+Each organisation's files are stored locally and in S3 under repo-archive/ (see org_file()).
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date
+
+import analytics
+import flask
+import models
+import settings
+import storage_interface
+
+logger = logging.getLogger(__name__)
+
+# Changes to a repository's exemption are recorded as small override objects (see record_exemption()),
+# which may only change these fields
+exemption_fields = ("dateAdded", "exemptUntil", "exemptReason", "exemptBy")
+
+# Overrides this process has merged into a repositories.json which is waiting to be uploaded, so are not
+# merged again before they are deleted ({override name})
+merged_overrides: set[str] = set()
+merged_overrides_lock = threading.Lock()
+
+
+def check_file_integrity(files: list[str], directory: str = "./"):
+    """Makes sure local storage files are up to date with S3.
+
+    If the file does not exist locally or has changed in S3, try to download it.
+
+    A downloaded file's last modified date is set to match S3's, so it does not need to be reuploaded.
+
+    If the download is not successful, the file does not exist in S3.
+    Therefore, if the file exists locally, remove it as it is outdated.
+
+    If neither the file exists locally or in S3, nothing should happen as this is handled in the UI.
+
+    ==========
+
+    Args:
+        files (list): the list of files to check. This prevents unneeded calls to S3.
+        directory (str): the directory where the files are stored. Defaults to "./".
+    """
+    for file in files:
+        file_path = os.path.join(directory, file)
+
+        if not os.path.isfile(file_path) or storage_interface.has_file_changed(
+            settings.bucket_name, f"repo-archive/{file}", file
+        ):
+
+            # If the file does not exist locally or has changed in S3, download it
+            download_successful = storage_interface.get_bucket_content(settings.bucket_name, file)
+
+            # get_bucket_content returns the ClientError if the download fails, which is truthy
+            if download_successful is not True and os.path.isfile(file_path):
+                os.remove(file_path)
+
+                # If it doesn't exist in either location, nothing should happen as this is handled in the UI
+
+
+def org_file(org: str, filename: str) -> str:
+    """Gets the name of an organisation's storage file.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        filename (str): the name of the file (i.e repositories.json).
+
+    Returns:
+        str: the file's name, both locally and within repo-archive/ in S3.
+    """
+    if org == settings.organisations[0]:
+        return filename
+
+    return f"{org}/{filename}"
+
+
+def record_exemption(org: str, repo_name: str, exemption: dict):
+    """Records a change to a repository's exemption as an override object in S3.
+
+    ==========
+
+    Each change is written as a new object (exemptions/<repository>/<time>-<id>.json), rather than changing
+    repositories.json. Setting an exemption is therefore a single small write whatever the size of the organisation,
+    and concurrent changes never overwrite each other. The overrides are merged into repositories.json the next time
+    it is loaded by load_repositories().
+
+    Args:
+        org (str): the organisation.
+        repo_name (str): the name of the repository.
+        exemption (dict): the fields of the repository to change (see exemption_fields).
+    """
+    filename = org_file(org, f"exemptions/{repo_name}/{time.time_ns():020d}-{uuid.uuid4().hex}.json")
+
+    storage_interface.write_object(settings.bucket_name, filename, {"name": repo_name, **exemption})
+
+
+def get_new_overrides(org: str) -> list[str]:
+    """Lists an organisation's exemption overrides which this process has not already merged (see merged_overrides)."""
+    # Object names sort by repository, then by the time they were recorded
+    overrides = storage_interface.list_objects(settings.bucket_name, org_file(org, "exemptions/"))
+
+    with merged_overrides_lock:
+        return [override_name for override_name in overrides if override_name not in merged_overrides]
+
+
+def merge_overrides(org: str):
+    """Merges an organisation's exemption overrides into its repositories.json.
+
+    ==========
+
+    Overrides are applied in the order they were recorded, so the latest change to each repository wins.
+    repositories.json is written with them merged, then the merged overrides are deleted once it has been uploaded.
+    Overrides recorded while merging are not listed, so are kept for the next merge.
+
+    Merges hold the organisation's storage_lock, shared by every process sharing the directory, so a merge never
+    overwrites another merge's overrides or any other change to repositories.json. repositories.json is uploaded in
+    the background (see write_file()), so a merge only waits for the others to write their local files.
+
+    Args:
+        org (str): the organisation.
+    """
+    repositories = org_file(org, "repositories.json")
+
+    with storage_interface.file_lock(org_file(org, settings.storage_lock)):
+        overrides = get_new_overrides(org)
+
+        if len(overrides) == 0:
+            return
+
+        check_file_integrity([repositories])
+
+        repos = storage_interface.read_file(repositories)
+        indexes = {repos[i]["name"]: i for i in range(0, len(repos))}
+
+        for override_name in overrides:
+            override = storage_interface.read_object(settings.bucket_name, override_name)
+
+            # Overrides for repositories which are no longer stored are discarded.
+            # The stored dictionary is shared with other reads of the file (see read_file), so it is replaced.
+            if override is not None and override["name"] in indexes:
+                i = indexes[override["name"]]
+                repos[i] = {**repos[i], **{field: override[field] for field in exemption_fields if field in override}}
+
+        with merged_overrides_lock:
+            merged_overrides.update(overrides)
+
+        def delete_overrides():
+            for override_name in overrides:
+                storage_interface.delete_file(settings.bucket_name, override_name)
+
+            with merged_overrides_lock:
+                merged_overrides.difference_update(overrides)
+
+        # Overrides are only deleted once they have been saved in repositories.json in S3
+        storage_interface.write_file(settings.bucket_name, repositories, repos, on_uploaded=delete_overrides)
+
+
+def load_repositories(org: str, sort_field: str | None = None) -> list[models.Repository]:
+    """Loads an organisation's stored repositories, merging in any exemption overrides (see merge_overrides()).
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        sort_field (str): the attribute the repositories should be sorted on. If None is passed, they are not sorted.
+
+    Returns:
+        list
+    """
+    repositories = org_file(org, "repositories.json")
+
+    if len(get_new_overrides(org)) > 0:
+        merge_overrides(org)
+
+    # Check storage files exist and are up to date with S3
+    check_file_integrity([repositories])
+
+    # Get repos from storage
+    records = models.decode_repositories(storage_interface.read_file(repositories))
+
+    if sort_field is not None:
+        records.sort(key=lambda repo: getattr(repo, sort_field))
+
+    return records
+
+
+def save_repositories(org: str, repos: list[models.Repository]):
+    """Writes an organisation's stored repositories to repositories.json."""
+    storage_interface.write_file(
+        settings.bucket_name, org_file(org, "repositories.json"), models.encode_repositories(repos)
+    )
+
+
+def expire_exemptions(org: str, today: date) -> list[models.Repository]:
+    """Removes the exemptions of an organisation's repositories which have expired.
+
+    ==========
+
+    Repositories whose exemption has expired are treated as added today, so they are not archived straight away.
+    repositories.json is loaded again while holding the organisation's storage_lock, so changes made since the
+    caller loaded it (i.e a find, or another page expiring the same exemptions) are not overwritten.
+
+    Args:
+        org (str): the organisation.
+        today (date): the date exemptions expire on or before.
+
+    Returns:
+        list: the organisation's repositories, with the expired exemptions removed.
+    """
+    with storage_interface.file_lock(org_file(org, settings.storage_lock)):
+        repos = load_repositories(org)
+        expired = False
+
+        for repo in repos:
+            if repo.exemption is not None and repo.exemption.until <= today:
+                repo.date_added = today
+                repo.exemption = None
+                expired = True
+
+        if expired:
+            save_repositories(org, repos)
+
+    return repos
+
+
+def load_archive_list(org: str, reverse: bool = False) -> list[models.ArchiveBatch]:
+    """Loads an organisation's archive batches from archived.json.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        reverse (bool): whether the batches should be returned newest first.
+
+    Returns:
+        list
+    """
+    archived = org_file(org, "archived.json")
+
+    # Check storage files exist and are up to date with S3
+    check_file_integrity([archived])
+
+    return models.decode_archive_list(storage_interface.read_file(archived, reverse=reverse))
+
+
+def save_archive_list(org: str, archive_list: list[models.ArchiveBatch]):
+    """Writes an organisation's archive batches to archived.json."""
+    storage_interface.write_file(
+        settings.bucket_name, org_file(org, "archived.json"), models.encode_archive_list(archive_list)
+    )
+
+
+def export_analytics(org: str, repos: list[models.Repository], batches: list[models.ArchiveBatch]):
+    """Exports an organisation's stored repositories, and the given archive batches, as Parquet datasets in S3.
+
+    ==========
+
+    Exports are only made if analytics_export is enabled in feature.json and pyarrow is installed.
+    They are written under analytics/ (see analytics.py). A failed export is logged rather than
+    failing the archive run it follows, and is caught up by the next one (or tools/export_analytics.py).
+
+    Args:
+        org (str): the organisation.
+        repos (list): the organisation's stored repositories.
+        batches (list): the archive batches which have changed.
+    """
+    if not settings.get_features()["analytics_export"]["enabled"]:
+        return
+
+    if not analytics.is_available():
+        logger.warning("Analytics export is enabled, but pyarrow is not installed (poetry install --extras analytics)")
+        return
+
+    write_analytics(org, repos, batches)
+
+
+def write_analytics(org: str, repos: list[models.Repository], batches: list[models.ArchiveBatch]) -> list[str]:
+    """Writes an organisation's analytics exports to S3, whether or not analytics_export is enabled.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        repos (list): the organisation's stored repositories.
+        batches (list): the archive batches to export.
+
+    Returns:
+        list: the files which could not be written.
+    """
+    failed = []
+    files = analytics.export_repositories(org, repos, date.today())
+
+    for batch in batches:
+        files.update(analytics.export_archive_batch(org, batch))
+
+    for filename, data in files.items():
+        result = storage_interface.upload_object(
+            settings.bucket_name, org_file(org, filename), data, analytics.CONTENT_TYPE
+        )
+
+        if result is not True:
+            logger.warning("Could not export %s for %s: %s", filename, org, result)
+            failed.append(filename)
+
+    return failed
+
+
+def get_organisation() -> str:
+    """Gets the organisation the request is for.
+
+    This is taken from the org arguement if given (i.e in the links sent to repository owners),
+    otherwise the organisation selected in the session, otherwise the default organisation.
+
+    Aborts with a 404 if the organisation is not one of the configured organisations.
+    """
+    org = flask.request.args.get("org") or flask.session.get("organisation") or settings.organisations[0]
+
+    if org not in settings.organisations:
+        flask.abort(404)
+
+    return org
@@ -0,0 +1,184 @@
+"""Profiles individual requests with a sampling profiler and exports the result in the
+speedscope format.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, W0212, R0902
+
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+
+import flask
+
+# Requests are signed with this secret to be profiled on demand
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+
+# How long a profiling signature is valid for, in seconds
+SIGNATURE_TTL = 300
+
+
+def sign(secret: str, timestamp: str, path: str) -> str:
+    """Creates the signature which requests a profile of the given path.
+
+    ==========
+
+    Args:
+        secret (str): the shared profiling secret.
+        timestamp (str): the unix time the signature was created (sent as X-Profile-Timestamp).
+        path (str): the path of the request to profile (i.e /find_repositories).
+
+    Returns:
+        str: the hex HMAC-SHA256 signature (sent as X-Profile-Signature).
+    """
+    return hmac.new(secret.encode(), f"{timestamp}:{path}".encode(), hashlib.sha256).hexdigest()
+
+
+def has_valid_signature(request: flask.Request) -> bool:
+    """Checks whether a request has a valid, unexpired profiling signature.
+
+    ==========
+
+    Args:
+        request (flask.Request): the request to check.
+
+    Returns:
+        bool
+    """
+    signature = request.headers.get("X-Profile-Signature")
+    timestamp = request.headers.get("X-Profile-Timestamp", "")
+
+    if not PROFILING_SECRET or signature is None:
+        return False
+
+    try:
+        if abs(time.time() - int(timestamp)) > SIGNATURE_TTL:
+            return False
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(signature, sign(PROFILING_SECRET, timestamp, request.path))
+
+
+def should_profile(request: flask.Request, config: dict) -> bool:
+    """Checks whether a request should be profiled.
+
+    A request is profiled if profiling is enabled in feature.json (optionally only for the listed endpoints),
+    or if the request has a valid profiling signature.
+
+    ==========
+
+    Args:
+        request (flask.Request): the request to check.
+        config (dict): the profiling section of feature.json.
+
+    Returns:
+        bool
+    """
+    if config["enabled"] and (not config.get("endpoints") or request.endpoint in config["endpoints"]):
+        return True
+
+    return has_valid_signature(request)
+
+
+class SamplingProfiler:
+    """Periodically samples the call stack of a single thread from a background thread.
+
+    Sampling, rather than tracing every call, keeps the overhead low enough to use on production traffic.
+    """
+
+    def __init__(self, interval_ms: float = 5, thread_id: int | None = None) -> None:
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+
+        # {(name, file, line): index}
+        self.frames: dict[tuple[str, str, int], int] = {}
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        """Starts sampling the thread's call stack every interval."""
+        self.start_time = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling, waiting for the sample being taken (if any) to be recorded."""
+        self._stopped.set()
+        self._thread.join()
+        self.end_time = time.perf_counter()
+
+    def _frame_index(self, code: object) -> int:
+        key = (code.co_qualname, code.co_filename, code.co_firstlineno)  # type: ignore[attr-defined]
+
+        if key not in self.frames:
+            self.frames[key] = len(self.frames)
+
+        return self.frames[key]
+
+    def _sample(self) -> list[int] | None:
+        frame = sys._current_frames().get(self.thread_id)
+
+        if frame is None:
+            return None
+
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_index(frame.f_code))
+            frame = frame.f_back
+
+        # speedscope expects stacks ordered from the root frame
+        stack.reverse()
+
+        return stack
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+
+        while not self._stopped.wait(self.interval):
+            stack = self._sample()
+            now = time.perf_counter()
+
+            if stack is not None:
+                self.samples.append(stack)
+                self.weights.append(now - last)
+
+            last = now
+
+    def to_speedscope(self, name: str) -> dict:
+        """Exports the samples as a speedscope profile (https://www.speedscope.app).
+
+        ==========
+
+        Args:
+            name (str): the name of the profile.
+
+        Returns:
+            dict
+        """
+        frames = [{"name": frame[0], "file": frame[1], "line": frame[2]} for frame in self.frames]
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "repoarchivetool",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.end_time - self.start_time,
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+        }
@@ -0,0 +1,188 @@
+"""Renders the recently added report, which lists the repositories found by a sweep,
+as HTML, JSON and CSV.
+
+Each report is generated as a stream of chunks, so it can be uploaded as it is rendered
+(see storage_interface.upload_stream).
+The part of a report for each repository (its fragment) is cached, so the same repository
+is only rendered once until any of its details change.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R0902
+
+import csv
+import functools
+import io
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+import jinja2
+import models
+from markupsafe import Markup
+
+# The report's formats, and the Content-Type each is stored with
+formats = {
+    "html": "text/html; charset=utf-8",
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+}
+
+csv_columns = ("organisation", "name", "type", "html_url", "last_commit", "date_added", "archive_after", "exempt_url")
+
+
+@dataclass(frozen=True, slots=True)
+class ReportEntry:
+    """The details of a repository shown in the report.
+
+    Entries are immutable and hashable, so they are used as the key of the fragment cache.
+    """
+
+    organisation: str
+    name: str
+    type: str
+    html_url: str
+    last_commit: date
+    date_added: date
+    archive_after: date
+    exempt_url: str
+
+    @classmethod
+    def from_repository(
+        cls, org: str, repo: models.Repository, domain: str, archive_threshold_days: int
+    ) -> "ReportEntry":
+        """Creates the entry for a stored repository.
+
+        ==========
+
+        Args:
+            org (str): the organisation the repository belongs to.
+            repo (Repository): the repository.
+            domain (str): the root URL of the tool, used to link to /set_exempt_date.
+            archive_threshold_days (int): the days after being added that a repository is archived.
+
+        Returns:
+            ReportEntry
+        """
+        date_added = repo.date_added or date.today()
+
+        # Repositories stored before htmlUrl was recorded have their URL derived from their API URL, rather than requesting it
+        html_url = repo.html_url or repo.api_url.replace("https://api.github.com/repos/", "https://github.com/", 1)
+
+        return cls(
+            organisation=org,
+            name=repo.name,
+            type=repo.type,
+            html_url=html_url,
+            last_commit=repo.last_commit,
+            date_added=date_added,
+            archive_after=date_added + timedelta(days=archive_threshold_days),
+            exempt_url=f"{domain.rstrip('/')}/set_exempt_date?{urlencode({'repoName': repo.name, 'org': org})}",
+        )
+
+    def to_dict(self) -> dict:
+        """Converts the entry to the object listed in the JSON report.
+
+        ==========
+
+        Returns:
+            dict
+        """
+        return {
+            "organisation": self.organisation,
+            "name": self.name,
+            "type": self.type,
+            "htmlUrl": self.html_url,
+            "lastCommit": self.last_commit.isoformat(),
+            "dateAdded": self.date_added.isoformat(),
+            "archiveAfter": self.archive_after.isoformat(),
+            "exemptUrl": self.exempt_url,
+        }
+
+
+@functools.lru_cache(maxsize=8192)
+def render_fragment(env: jinja2.Environment, fmt: str, entry: ReportEntry) -> str:
+    """Renders the part of a report for a single repository.
+
+    ==========
+
+    Args:
+        env (jinja2.Environment): the environment the HTML templates are loaded from.
+        fmt (str): the report's format (a key of formats).
+        entry (ReportEntry): the repository.
+
+    Returns:
+        str
+    """
+    if fmt == "html":
+        return str(env.get_template("recentlyAddedRepository.html").module.repository(entry))
+
+    if fmt == "json":
+        return json.dumps(entry.to_dict())
+
+    row = io.StringIO()
+    csv.writer(row).writerow(
+        [
+            entry.organisation,
+            entry.name,
+            entry.type,
+            entry.html_url,
+            entry.last_commit.isoformat(),
+            entry.date_added.isoformat(),
+            entry.archive_after.isoformat(),
+            entry.exempt_url,
+        ]
+    )
+    return row.getvalue()
+
+
+def render(
+    env: jinja2.Environment, fmt: str, org: str, entries: list[ReportEntry], archive_threshold_days: int
+) -> Iterator[str]:
+    """Renders a report as a stream of chunks.
+
+    ==========
+
+    Args:
+        env (jinja2.Environment): the environment the HTML templates are loaded from.
+        fmt (str): the report's format (a key of formats).
+        org (str): the organisation the report is for.
+        entries (list): the repositories in the report.
+        archive_threshold_days (int): the days after being added that a repository is archived.
+
+    Returns:
+        An iterator of the report's contents.
+    """
+    fragments = (render_fragment(env, fmt, entry) for entry in entries)
+
+    if fmt == "html":
+        # The fragments are already escaped, so are marked as safe to be inserted as they are
+        return env.get_template("recentlyAdded.html").generate(
+            organisation=org,
+            fragments=(Markup(fragment) for fragment in fragments),
+            total=len(entries),
+            archive_threshold_days=archive_threshold_days,
+        )
+
+    if fmt == "json":
+        return _render_json(org, fragments, len(entries), archive_threshold_days)
+
+    return _render_csv(fragments)
+
+
+def _render_json(org: str, fragments: Iterable[str], total: int, archive_threshold_days: int) -> Iterator[str]:
+    yield f'{{"organisation": {json.dumps(org)}, "total": {total}, "archiveThresholdDays": {archive_threshold_days}, "repositories": ['
+
+    for i, fragment in enumerate(fragments):
+        yield fragment if i == 0 else ", " + fragment
+
+    yield "]}"
+
+
+def _render_csv(fragments: Iterable[str]) -> Iterator[str]:
+    header = io.StringIO()
+    csv.writer(header).writerow(csv_columns)
+    yield header.getvalue()
+
+    yield from fragments
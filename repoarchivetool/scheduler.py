@@ -0,0 +1,172 @@
+"""Runs work from several organisations on a shared thread pool, giving each organisation
+a fair share.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, W0718, R0902
+
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+
+class FairScheduler:
+    """Runs tasks from named queues (one per organisation) on a shared thread pool.
+
+    Tasks are not started in the order they were submitted. Instead, whenever a worker is free the
+    scheduler takes the next task from each queue in turn (round-robin). An organisation with thousands
+    of tasks therefore cannot hold up one with only a few.
+
+    Tasks may submit further tasks (i.e a discovery task submitting a task per repository found).
+    join() waits until every task, including those submitted later, has finished.
+    """
+
+    def __init__(self, max_workers: int, max_in_flight_per_queue: int | None = None) -> None:
+        """Creates the scheduler.
+
+        ==========
+
+        Args:
+            max_workers (int): the number of tasks which can run at once.
+            max_in_flight_per_queue (int): the number of tasks from a single queue which can run at once.
+                Defaults to no limit beyond max_workers.
+        """
+        self.max_workers = max_workers
+        self.max_in_flight_per_queue = max_in_flight_per_queue or max_workers
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._condition = threading.Condition()
+
+        # {queue name: deque of (future, function, args)}
+        self._queues: dict[str, deque] = {}
+        self._order: deque[str] = deque()
+
+        self._in_flight: dict[str, int] = {}
+        self._total_in_flight = 0
+        self._pending = 0
+
+    def submit(self, queue: str, func: Callable, *args: Any) -> Future:
+        """Adds a task to the end of a queue.
+
+        ==========
+
+        Args:
+            queue (str): the name of the queue (i.e the organisation).
+            func (Callable): the task.
+            *args: the arguments to call func with.
+
+        Returns:
+            Future: the result of the task.
+        """
+        future: Future = Future()
+
+        with self._condition:
+            if queue not in self._queues:
+                self._queues[queue] = deque()
+                self._in_flight[queue] = 0
+                self._order.append(queue)
+
+            self._queues[queue].append((future, func, args))
+            self._pending += 1
+
+            self._dispatch()
+
+        return future
+
+    def submit_all(self, queue: str, func: Callable, items: list[tuple], then: Callable) -> Future:
+        """Adds a task to a queue for each item, then a final task once they have all finished.
+
+        The final task is called with a list of the tasks' results (in the order of items).
+        It does not wait on a worker while the tasks run, so pipelines cannot deadlock the pool.
+
+        ==========
+
+        Args:
+            queue (str): the name of the queue (i.e the organisation).
+            func (Callable): the task to run for each item.
+            items (list): the arguments to call func with, as a tuple for each item.
+            then (Callable): the final task.
+
+        Returns:
+            Future: the result of the final task. If any of the tasks failed, this holds its exception instead.
+        """
+        result: Future = Future()
+        futures: list[Future] = []
+        remaining = [len(items)]
+        lock = threading.Lock()
+
+        def run_then() -> None:
+            try:
+                result.set_result(then([future.result() for future in futures]))
+            except Exception as e:
+                result.set_exception(e)
+
+        def task_done(_future: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+
+            if finished:
+                self.submit(queue, run_then)
+
+        if len(items) == 0:
+            self.submit(queue, run_then)
+            return result
+
+        futures.extend(self.submit(queue, func, *args) for args in items)
+
+        for future in futures:
+            future.add_done_callback(task_done)
+
+        return result
+
+    def _next_task(self) -> tuple[str, tuple] | None:
+        """Takes the next task, moving round the queues in turn. Must be called holding the condition."""
+        for _ in range(len(self._order)):
+            queue = self._order[0]
+            self._order.rotate(-1)
+
+            if self._queues[queue] and self._in_flight[queue] < self.max_in_flight_per_queue:
+                return queue, self._queues[queue].popleft()
+
+        return None
+
+    def _dispatch(self) -> None:
+        """Starts tasks until all workers are busy. Must be called holding the condition."""
+        while self._total_in_flight < self.max_workers:
+            task = self._next_task()
+
+            if task is None:
+                return
+
+            queue, (future, func, args) = task
+
+            self._pending -= 1
+            self._in_flight[queue] += 1
+            self._total_in_flight += 1
+
+            self._executor.submit(self._run, queue, future, func, args)
+
+    def _run(self, queue: str, future: Future, func: Callable, args: tuple) -> None:
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            # Done callbacks have run by this point, so any tasks they submitted are already pending
+            with self._condition:
+                self._in_flight[queue] -= 1
+                self._total_in_flight -= 1
+
+                self._dispatch()
+                self._condition.notify_all()
+
+    def join(self) -> None:
+        """Waits for all tasks to finish, then shuts down the thread pool."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending == 0 and self._total_in_flight == 0)
+
+        self._executor.shutdown()
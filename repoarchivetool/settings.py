@@ -0,0 +1,89 @@
+"""The tool's configuration, shared by the app and the modules which handle its requests.
+
+Settings which vary between deployments are read from the environment, and the features which can be
+switched on and off from config/feature.json.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import json
+import os
+from datetime import timedelta
+
+# The days after being added that a repository is archived
+archive_threshold_days = 30
+
+# The number of GitHub requests made concurrently when working through a batch of repositories
+undo_max_workers = 8
+
+# The number of GitHub requests made concurrently when sweeping through organisations,
+# and how many of those can be for a single organisation (so one large organisation cannot starve the others)
+sweep_max_workers = 16
+sweep_max_workers_per_organisation = 8
+
+# How many repositories are processed between each upload of a progress journal to S3
+journal_flush_interval = 25
+
+# Progress journal of the archive batch currently being created
+archive_journal = "archive_journal.jsonl"
+
+# Held while an organisation's repositories.json or archived.json is loaded, changed and written back (by finds,
+# archives, undos, exemption merges and webhooks), so no change overwrites another's.
+# This is a file lock, so it is shared by all of the production server's workers.
+storage_lock = "storage.lock"
+
+# Held while an organisation's repositories are archived, from loading its archive batches until the new batch is
+# saved and its journal deleted, so concurrent runs cannot create the same batch or share a journal.
+# This is a file lock, so it is shared by all of the production server's workers. It is taken before storage_lock.
+archive_lock = "archive.lock"
+
+# Only each repository's top contributors are stored. The full list is fetched when it is expanded on the
+# Manage Repositories page (see /repository_contributors), then reused until it expires.
+contributor_summary_size = 5
+contributors_ttl = timedelta(minutes=15)
+
+# The feature configuration. This is found relative to this file, so the app can be started from any directory.
+config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "feature.json")
+
+# The feature configuration, loaded from config_path on first use (see get_features())
+features: dict = {}
+
+# GitHub Organisations, as a comma separated list (i.e "ONS-Innovation,ONS-Digital")
+# The first organisation is the default. Its files are stored at the root of repo-archive/ in S3 (where they were
+# stored before the tool supported multiple organisations), the others' under repo-archive/<organisation>/
+organisations = [org.strip() for org in os.getenv("GITHUB_ORG", "").split(",") if org.strip() != ""]
+
+# GitHub App Client ID
+client_id = os.getenv("GITHUB_APP_CLIENT_ID")
+
+# AWS Secret Manager Secret Name for the .pem file
+secret_name = os.getenv("AWS_SECRET_NAME")
+secret_reigon = os.getenv("AWS_DEFAULT_REGION")
+
+# Further GitHub Apps installed in the organisations, whose rate limits are pooled with the main App's (see token_pool.py)
+# As a comma separated list of <client ID>:<AWS Secret Manager Secret Name for its .pem file> pairs (i.e "Iv1.abc:archive-app-2")
+github_app_pool = [
+    (pool_app.split(":", 1)[0].strip(), pool_app.split(":", 1)[1].strip())
+    for pool_app in os.getenv("GITHUB_APP_POOL", "").split(",")
+    if ":" in pool_app
+]
+
+account = os.getenv("AWS_ACCOUNT_NAME")
+
+# AWS Bucket Name
+bucket_name = f"{account}-github-audit-tool"
+
+
+def load_config():
+    """Loads the feature configuration from the feature.json file."""
+    with open(config_path, encoding="utf-8") as f:
+        features.clear()
+        features.update(json.load(f)["features"])
+
+
+def get_features() -> dict:
+    """Gets the feature configuration, loading it on first use."""
+    if len(features) == 0:
+        load_config()
+
+    return features
@@ -58,7 +58,7 @@ function searchRepos(){
             rowRepoName = rowContents[0].innerHTML.toUpperCase();
             rowRepoType = rowContents[1].innerHTML.toUpperCase();
     
-            rowContributors = rowContents[2].children;
+            rowContributors = rowContents[2].querySelectorAll("a[aria-label]");
 
             // Search for repo name and type
             // If the repo name or type is found, show the row
@@ -129,6 +129,53 @@ function searchRepos(){
 }
 
 
+function expandContributors(button){
+    // Replaces a repository's top contributors in /manage_repositories with all of its contributors
+
+    cell = button.parentElement;
+    buttonText = button.getElementsByClassName("ons-btn__text")[0];
+
+    button.disabled = true;
+    buttonText.innerHTML = "Loading...";
+
+    fetch("/repository_contributors?repoName=" + encodeURIComponent(button.dataset.repoName))
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(data => {
+            for(avatar of cell.querySelectorAll("a[aria-label]")){
+                avatar.remove();
+            }
+
+            for(contributor of data.contributors){
+                link = document.createElement("a");
+                link.href = contributor.url;
+                link.target = "_blank";
+                link.className = "text-decoration-none";
+                link.setAttribute("aria-label", contributor.login);
+
+                avatar = document.createElement("img");
+                avatar.src = contributor.avatar;
+                avatar.alt = "User Avatar";
+                avatar.width = 32;
+                avatar.height = 32;
+                avatar.loading = "lazy";
+
+                link.appendChild(avatar);
+                cell.insertBefore(link, button);
+            }
+
+            cell.dataset.sortValue = data.contributors.length;
+            button.remove();
+
+            // Highlight any contributors matching the current search
+            searchRepos();
+        })
+        .catch(() => {
+            button.disabled = false;
+            buttonText.innerHTML = "Could not load contributors. Try again";
+        });
+}
+
+
 function searchBatches(searchbarID){
     // Searches for a repo within a list of archive batches
 
@@ -1,28 +1,281 @@
 """This module contains functions that interact with the S3 Bucket."""
 
-# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, W0612, R1705
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, W0612, R1705, C0415
 
+import atexit
+import contextlib
+import fcntl
+import gzip
 import json
+import logging
+import marshal
+import mimetypes
+import mmap
 import os
-
-import boto3
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+import metrics
+import write_behind
 from botocore.exceptions import ClientError
 
+STORAGE_METRIC = "repoarchive_storage_operation_duration_seconds"
+STORAGE_METRIC_HELP = "Time spent in storage_interface operations (S3 and local files)."
+JSON_METRIC = "repoarchive_json_duration_seconds"
+JSON_METRIC_HELP = "Time spent encoding and decoding JSON."
+
+logger = logging.getLogger(__name__)
+
+
+# Objects are stored in S3 gzipped (Content-Encoding: gzip), unless they are smaller than COMPRESSION_MIN_SIZE.
+# Objects stored before compression was added, or with compression disabled, are read as they are.
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = 6
+
+# The length of a compressed object once decompressed is stored in its metadata, to compare it with the local file
+UNCOMPRESSED_LENGTH = "uncompressed-length"
+
+# Each local JSON file has a snapshot beside it (<file>.snapshot): the parsed contents in marshal format,
+# which is several times quicker to load than JSON. Snapshots start with this header: a magic number, the Python
+# version which wrote them (marshal's format can change between versions) and the version of the JSON file they
+# were made from (its inode, size and modification time, all of which change when the file is replaced).
+_SNAPSHOT_HEADER = struct.Struct("<8sQQQQ")
+_SNAPSHOT_MAGIC = b"RATSNAP1"
+
+# The snapshots mapped into this process ({file name: (version, mmap)}).
+# Only the snapshot's encoded bytes are shared: every process mapping the same snapshot (i.e each of the production
+# server's workers) reads the same pages of the OS's file cache, rather than its own copy of the file. Each process
+# still decodes (marshal.loads) its own objects from them.
+_snapshots: dict[str, tuple[tuple[int, int, int], mmap.mmap]] = {}
+_snapshots_lock = threading.Lock()
+
+# The contents last read from each file ({file name: (version, contents)}), so each version of a file is only loaded
+# once per process. Guarded by _snapshots_lock.
+_contents: dict[str, tuple[tuple[int, int, int], list]] = {}
+
+
+# S3 clients are slow to create, so each process creates one and reuses it ({process ID: client}).
+# Clients are not shared with forked processes (i.e the production server's workers), as their connections would be.
+_s3_clients: dict = {}
+_s3_clients_lock = threading.Lock()
+
+# The lock files held by each thread (see file_lock), so a block holding a lock can call code which takes it again
+_held_file_locks = threading.local()
+
 
 def get_s3_client():
-    """Returns an S3 Client.
+    """Returns this process's S3 Client, creating it on first use.
 
     ==========
 
     Returns:
         S3 Client
     """
-    session = boto3.Session()
-    s3 = session.client("s3")
+    # boto3 is slow to import, so it is only imported when the first client is created
+    import boto3
+
+    pid = os.getpid()
+
+    with _s3_clients_lock:
+        if pid not in _s3_clients:
+            session = boto3.Session()
+            _s3_clients[pid] = session.client("s3")
+
+        return _s3_clients[pid]
+
+
+@contextlib.contextmanager
+def file_lock(filename: str) -> Iterator[None]:
+    """Holds an exclusive lock on a local lock file while the block runs.
+
+    Unlike a threading.Lock, this is shared by every process running from the same directory
+    (i.e each of the production server's workers), as well as by threads within a process.
+    A thread which already holds the lock can take it again, in which case it is held until the outermost block ends.
+
+    ==========
+
+    Args:
+        filename (str): the name of the lock file.
+    """
+    path = os.path.abspath(filename)
+    held = _held_file_locks.__dict__.setdefault("paths", set())
 
-    return s3
+    if path in held:
+        yield
+        return
+
+    create_parent_directory(filename)
+
+    with open(filename, "a", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(path)
+
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def lock_file(filename: str) -> str:
+    """Returns the name of the lock file held while a local file is being replaced (see file_lock)."""
+    return f"{filename}.lock"
+
+
+def snapshot_file(filename: str) -> str:
+    """Returns the name of the snapshot of a local JSON file."""
+    return f"{filename}.snapshot"
+
+
+def etag_file(filename: str) -> str:
+    """Returns the name of the file recording which S3 object a local file matches (see record_etag)."""
+    return f"{filename}.etag"
+
+
+def atomic_write(filename: str, data: bytes | BinaryIO, mtime: float | None = None) -> os.stat_result:
+    """Replaces a local file in a single step, so it is never seen half written.
+
+    The data is written to a temporary file in the same directory, which is then renamed over the file.
+    Readers see either the old file or the new one.
+
+    ==========
+
+    Args:
+        filename (str): the name of the file
+        data (bytes or file object): the file's new contents, or a file object to copy them from
+        mtime (float): the file's modification time. If None is passed, it is the time it was written.
+
+    Returns:
+        os.stat_result: the new file's status, which identifies this version of it.
+    """
+    create_parent_directory(filename)
+
+    fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", prefix=f".{os.path.basename(filename)}.")
+
+    try:
+        with open(fd, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
 
+            f.flush()
+            os.fsync(f.fileno())
 
+            if mtime is not None:
+                os.utime(f.fileno(), (mtime, mtime))
+
+            status = os.fstat(f.fileno())
+
+        os.replace(temp_filename, filename)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_filename)
+        raise
+
+    return status
+
+
+def _file_version(status: os.stat_result) -> tuple[int, int, int]:
+    return status.st_ino, status.st_size, status.st_mtime_ns
+
+
+def record_etag(filename: str, status: os.stat_result, etag: str):
+    """Records the ETag of the S3 object a version of a local file was uploaded as or downloaded from.
+
+    ==========
+
+    An object's LastModified is when it was uploaded rather than when the local file was written, so has_file_changed()
+    compares ETags instead while the local file is still the recorded version.
+
+    Args:
+        filename (str): the name of the file
+        status (os.stat_result): the status of the version of the file the object matches
+        etag (str): the object's ETag
+    """
+    atomic_write(etag_file(filename), " ".join((etag, *map(str, _file_version(status)))).encode())
+
+
+def read_etag(filename: str) -> str | None:
+    """Gets the ETag recorded for a local file, or None if there is none for its current version (see record_etag)."""
+    try:
+        with open(etag_file(filename), encoding="utf-8") as f:
+            etag, *version = f.read().split(" ")
+
+        status = os.stat(filename)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    return etag if version == [str(part) for part in _file_version(status)] else None
+
+
+def write_snapshot(filename: str, version: tuple[int, int, int], content: list):
+    """Writes the snapshot of a local JSON file's contents.
+
+    ==========
+
+    Args:
+        filename (str): the name of the JSON file
+        version (tuple): the version of the JSON file the contents are from
+        content (list): the JSON file's contents
+    """
+    header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, sys.hexversion, *version)
+    atomic_write(snapshot_file(filename), header + marshal.dumps(content))
+
+
+def _map_snapshot(filename: str, version: tuple[int, int, int]) -> mmap.mmap | None:
+    """Maps the snapshot of a local JSON file into memory, if there is one for the given version of the file."""
+    with _snapshots_lock:
+        cached = _snapshots.get(filename)
+
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        try:
+            with open(snapshot_file(filename), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError is raised for empty files, which cannot be mapped
+            return None
+
+        if len(mapped) < _SNAPSHOT_HEADER.size or _SNAPSHOT_HEADER.unpack_from(mapped) != (
+            _SNAPSHOT_MAGIC,
+            sys.hexversion,
+            *version,
+        ):
+            return None
+
+        # The previous map is not closed, as other threads may still be reading it. It is unmapped once they have finished.
+        _snapshots[filename] = (version, mapped)
+
+        return mapped
+
+
+def create_parent_directory(filename: str):
+    """Creates the local directory a file is stored in, if it does not exist.
+
+    Files belonging to organisations other than the default one are stored in a directory per organisation.
+
+    ==========
+
+    Args:
+        filename (str): the name of the file
+    """
+    directory = os.path.dirname(filename)
+
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="has_file_changed")
 def has_file_changed(bucket: str, key: str, filename: str) -> bool:
     """Checks if a file in an S3 Bucket has changed.
 
@@ -36,17 +289,28 @@ def has_file_changed(bucket: str, key: str, filename: str) -> bool:
     Returns:
         bool
     """
+    # The local file has been written since it was last uploaded, so is newer than S3's
+    if has_pending_upload(bucket, filename):
+        return False
+
     s3 = get_s3_client()
 
     try:
-        obj = s3.get_object(Bucket=bucket, Key=key)
+        # Only the object's metadata is needed, so it is not downloaded
+        obj = s3.head_object(Bucket=bucket, Key=key)
     except ClientError:
         # ClientError is raised when the key does not exist in the bucket
         # Therefore we need to return True to indicate that the file should be created
         return True
     else:
-        s3_last_modified = int(obj["LastModified"].strftime("%s")) // 10
-        s3_content_length = obj["ContentLength"]
+        # The local file is the version last uploaded or downloaded by the tool, and the object has not changed since
+        if "ETag" in obj and obj["ETag"] == read_etag(filename):
+            return False
+
+        s3_last_modified = int(obj["LastModified"].timestamp()) // 10
+
+        # Compressed objects are compared by their length once decompressed, which is the length of the local file
+        s3_content_length = int(obj.get("Metadata", {}).get(UNCOMPRESSED_LENGTH, obj["ContentLength"]))
 
         try:
             local_last_modified = os.path.getmtime(filename) // 10
@@ -59,11 +323,16 @@ def has_file_changed(bucket: str, key: str, filename: str) -> bool:
         return s3_last_modified != local_last_modified or s3_content_length != local_content_length
 
 
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="get_bucket_content")
 def get_bucket_content(bucket: str, filename: str) -> bool | ClientError:
     """Downloads a given file from an S3 Bucket.
 
     ==========
 
+    The file is decompressed as it is downloaded if it is stored compressed. Its modification time is set to
+    when the object was last modified, and the object's ETag is recorded, so has_file_changed() sees it as up to
+    date without downloading it again.
+
     Args:
         bucket (str): The name of the bucket
         filename (str): The name of the file to download
@@ -74,17 +343,70 @@ def get_bucket_content(bucket: str, filename: str) -> bool | ClientError:
     s3 = get_s3_client()
 
     try:
-        s3.download_file(bucket, f"repo-archive/{filename}", filename)
+        obj = s3.get_object(Bucket=bucket, Key=f"repo-archive/{filename}")
     except ClientError as e:
         return e
+
+    body = obj["Body"]
+
+    if obj.get("ContentEncoding") == "gzip":
+        body = gzip.GzipFile(fileobj=body)
+
+    with body:
+        status = atomic_write(filename, body, mtime=obj["LastModified"].timestamp())
+
+    if "ETag" in obj:
+        record_etag(filename, status, obj["ETag"])
+
     return True
 
 
+def get_content_type(filename: str) -> str:
+    """Guesses the Content-Type of a file from its name."""
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def encode_object(filename: str, data: bytes) -> dict:
+    """Gets the body and metadata of an object to upload, compressing it if it is large enough.
+
+    ==========
+
+    Args:
+        filename (str): The name of the file
+        data (bytes): The file's contents
+
+    Returns:
+        dict: The arguments for put_object (Body, ContentType and, if compressed, ContentEncoding and Metadata).
+    """
+    arguments = {"Body": data, "ContentType": get_content_type(filename)}
+
+    if COMPRESSION_ENABLED and len(data) >= COMPRESSION_MIN_SIZE:
+        arguments["Body"] = gzip.compress(data, compresslevel=COMPRESSION_LEVEL, mtime=0)
+        arguments["ContentEncoding"] = "gzip"
+        arguments["Metadata"] = {UNCOMPRESSED_LENGTH: str(len(data))}
+
+    return arguments
+
+
+def decode_object(obj: dict) -> bytes:
+    """Reads the body of a downloaded object, decompressing it if it is stored compressed."""
+    body = obj["Body"].read()
+
+    if obj.get("ContentEncoding") == "gzip":
+        return gzip.decompress(body)
+
+    return body
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="update_bucket_content")
 def update_bucket_content(bucket: str, filename: str, local_filename: str = "") -> bool | ClientError:
     """Uploads a given file to an S3 Bucket.
 
     ==========
 
+    If the file is the object's local copy, the uploaded object's ETag is recorded (see record_etag), so
+    has_file_changed() does not see the object as newer than the local file and download it again.
+
     Args:
         bucket (str): The name of the bucket
         filename (str): The name of the file to upload
@@ -98,36 +420,238 @@ def update_bucket_content(bucket: str, filename: str, local_filename: str = "")
 
     s3 = get_s3_client()
 
+    with open(local_filename, "rb") as f:
+        status = os.fstat(f.fileno())
+        data = f.read()
+
     try:
-        response = s3.upload_file(local_filename, bucket, f"repo-archive/{filename}")  # noqa F841
+        response = s3.put_object(Bucket=bucket, Key=f"repo-archive/{filename}", **encode_object(filename, data))
     except ClientError as e:
         return e
+
+    # Only a file uploaded from its own local copy is kept as that copy (i.e not profiles or test data)
+    if local_filename == filename and "ETag" in response:
+        record_etag(local_filename, status, response["ETag"])
+
     return True
 
 
-def write_file(bucket: str, filename: str, content: list):
+def has_pending_upload(bucket: str, filename: str) -> bool:
+    """Checks whether a local file has been written since it was last uploaded, by any process sharing the directory.
+
+    ==========
+
+    If the process which wrote it has stopped before uploading it (i.e a worker which was killed), this process
+    takes over the upload.
+
+    Args:
+        bucket (str): The name of the bucket the file is uploaded to
+        filename (str): The name of the file
+
+    Returns:
+        bool
+    """
+    marker = write_behind.read_marker(filename)
+
+    if marker is None:
+        return False
+
+    owner = write_behind.marker_owner(marker)
+
+    if owner != os.getpid() and not write_behind.is_running(owner):
+        with file_lock(lock_file(filename)):
+            # Another process may have taken it over, or written the file, since it was read
+            adopted = write_behind.read_marker(filename) == marker
+
+            if adopted:
+                atomic_write(write_behind.pending_file(filename), write_behind.new_marker())
+
+        if adopted:
+            logger.warning("Uploading %s, which process %s stopped before uploading", filename, owner)
+
+            if write_behind.is_write_through():
+                upload_pending(bucket, filename)
+            else:
+                get_uploader().schedule(bucket, filename)
+
+    return True
+
+
+def give_up_upload(filename: str, marker: bytes | None, result: bool | Exception):
+    """Gives up on uploading a local file, logging the write which is dropped.
+
+    ==========
+
+    The marker is only removed if the file has not been written since the upload was attempted, as that write
+    is uploaded separately.
+
+    Args:
+        filename (str): The name of the file
+        marker (bytes): The file's marker when the upload was attempted
+        result: The failed upload's result
+    """
+    logger.error(
+        "Gave up uploading %s after S3 refused it %s times (%s). Changes to it since it was last uploaded are dropped.",
+        filename,
+        write_behind.WRITE_BEHIND_MAX_REFUSALS,
+        result,
+    )
+
+    with file_lock(lock_file(filename)):
+        if marker is not None and write_behind.read_marker(filename) == marker:
+            os.remove(write_behind.pending_file(filename))
+
+
+def upload_pending(bucket: str, filename: str) -> bool | ClientError:
+    """Uploads the latest version of a local file with an upload pending, then removes its marker.
+
+    ==========
+
+    The marker is only removed if no process has written the file since it was read, otherwise that
+    process's upload is still to come. If there is no marker, a later version has already been uploaded.
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the file
+
+    Returns:
+        Bool or ClientError
+    """
+    with file_lock(lock_file(filename)):
+        marker = write_behind.read_marker(filename)
+
+    if marker is None:
+        return True
+
+    # The file may have been deleted (see delete_file) since it was written
+    result = update_bucket_content(bucket, filename) if os.path.isfile(filename) else True
+
+    if result is not True:
+        return result
+
+    with file_lock(lock_file(filename)):
+        if write_behind.read_marker(filename) == marker:
+            os.remove(write_behind.pending_file(filename))
+
+    return True
+
+
+# Each process's uploader ({process ID: uploader})
+_uploaders: dict[int, write_behind.WriteBehindUploader] = {}
+_uploaders_lock = threading.Lock()
+
+
+def get_uploader() -> write_behind.WriteBehindUploader:
+    """Returns this process's write-behind uploader, creating it on first use."""
+    pid = os.getpid()
+
+    with _uploaders_lock:
+        if pid not in _uploaders:
+            _uploaders[pid] = write_behind.WriteBehindUploader(
+                write_behind.WRITE_BEHIND_DELAY, write_behind.WRITE_BEHIND_MAX_DELAY, upload_pending, give_up_upload
+            )
+
+        return _uploaders[pid]
+
+
+def flush_uploads(filenames: Iterable[str] | None = None) -> bool:
+    """Makes this process's pending uploads now (all, or those of the given files), waiting until they are done.
+
+    ==========
+
+    Called before a change is relied on outside this process (i.e before deleting the progress journal which
+    could otherwise recover it), and when the process exits.
+
+    Args:
+        filenames (list): the files to upload. If None is passed, every pending upload is made.
+
+    Returns:
+        bool: False if any of the uploads failed, otherwise True.
+    """
+    uploader = _uploaders.get(os.getpid())
+
+    if uploader is None:
+        return True
+
+    return uploader.flush(filenames)
+
+
+atexit.register(flush_uploads)
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="write_file")
+def write_file(bucket: str, filename: str, content: list, on_uploaded: Callable[[], None] | None = None):
     """Writes to a given file in JSON.
 
     ==========
 
+    The local file is replaced straight away. It is uploaded to S3 in the background if WRITE_BEHIND_ENABLED
+    is True (see write_behind.WriteBehindUploader) and write_behind.write_through() is not in use, otherwise before returning.
+
     Args:
         bucket (str): the name of the bucket to upload the file to
         filename (str): the name of the file to write to
         content (list): the data to be written as a list of dictionaries to mimic JSON
+        on_uploaded (Callable): called once the file has been uploaded, i.e to remove what it replaces
     returns:
         None
     """
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(json.dumps(content, indent=4))
+    with metrics.timer(JSON_METRIC, JSON_METRIC_HELP, action="dump"):
+        serialised = json.dumps(content, indent=4)
+
+    in_background = write_behind.WRITE_BEHIND_ENABLED and not write_behind.is_write_through()
+
+    # The file is replaced rather than rewritten, so other threads and workers never read it half written.
+    # The lock makes sure the file and its snapshot are replaced by one writer at a time.
+    with file_lock(lock_file(filename)):
+        status = atomic_write(filename, serialised.encode())
+        write_snapshot(filename, _file_version(status), content)
 
-    update_bucket_content(bucket, filename)
+        if in_background:
+            atomic_write(write_behind.pending_file(filename), write_behind.new_marker())
 
+    if in_background:
+        get_uploader().schedule(bucket, filename, on_uploaded)
+    elif update_bucket_content(bucket, filename) is True and on_uploaded is not None:
+        on_uploaded()
 
+
+def _load_contents(filename: str, version: tuple[int, int, int], f: BinaryIO) -> list:
+    """Loads a version of a local JSON file from its snapshot, or parses it and writes the snapshot, and caches it."""
+    mapped = _map_snapshot(filename, version)
+
+    if mapped is not None:
+        # Snapshots are only written by this module, and their header is checked before they are mapped
+        # (_map_snapshot), so this is not loading untrusted data
+        with memoryview(mapped) as view, view[_SNAPSHOT_HEADER.size :] as body:
+            contents = marshal.loads(body)  # noqa: S302
+    else:
+        with metrics.timer(JSON_METRIC, JSON_METRIC_HELP, action="load"):
+            contents = json.load(f)
+
+        write_snapshot(filename, version, contents)
+
+    with _snapshots_lock:
+        _contents[filename] = (version, contents)
+
+    return contents
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="read_file")
 def read_file(filename: str, sort_field: str | None = None, reverse: bool = False) -> list:
     """Reads a given file.
 
     ==========
 
+    The contents are loaded from the file's snapshot if it is up to date, which is mapped into memory once
+    per version of the file. Otherwise the JSON is parsed and the snapshot written, so the file is only
+    parsed once per version by all of the processes sharing the directory.
+
+    The loaded contents are kept until the file changes, and shared by every read of that version. The list
+    returned is a copy, but the dictionaries in it are shared, so they must not be changed.
+
+    ==========
+
     Args:
         filename (str): the name of the file to be read
         sort_field (str): the field the output should be sorted on. If None is passed, it will not be sorted.
@@ -137,16 +661,322 @@ def read_file(filename: str, sort_field: str | None = None, reverse: bool = Fals
         list
     """
     try:
-        with open(filename, encoding="utf-8") as f:
-            contents = json.load(f)
+        with open(filename, "rb") as f:
+            version = _file_version(os.fstat(f.fileno()))
 
-            if sort_field is not None:
-                contents.sort(key=lambda x: x[sort_field])
+            with _snapshots_lock:
+                cached = _contents.get(filename)
 
-            if reverse:
-                contents.reverse()
+            if cached is not None and cached[0] == version:
+                contents = cached[1]
+            else:
+                contents = _load_contents(filename, version, f)
 
     except FileNotFoundError:
-        contents = []
+        return []
+
+    # Sorted and reversed in place, so the cached list is copied
+    contents = list(contents)
+
+    if sort_field is not None:
+        contents.sort(key=lambda x: x[sort_field])
+
+    if reverse:
+        contents.reverse()
 
     return contents
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="delete_file")
+def delete_file(bucket: str, filename: str) -> bool | ClientError:
+    """Deletes a given file locally and from an S3 Bucket.
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the file to delete
+
+    Returns:
+        Bool or ClientError
+    """
+    get_uploader().discard(bucket, filename)
+
+    with _snapshots_lock:
+        _contents.pop(filename, None)
+
+    for local_filename in (filename, snapshot_file(filename), write_behind.pending_file(filename), etag_file(filename)):
+        if os.path.isfile(local_filename):
+            os.remove(local_filename)
+
+    s3 = get_s3_client()
+
+    try:
+        s3.delete_object(Bucket=bucket, Key=f"repo-archive/{filename}")
+    except ClientError as e:
+        return e
+    return True
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="write_object")
+def write_object(bucket: str, filename: str, content: dict | list) -> bool | ClientError:
+    """Writes content as JSON directly to an S3 Bucket, without a local copy.
+
+    Used for small objects which are written once and read back by another process (i.e exemption overrides).
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+        content (dict or list): The data to be written
+
+    Returns:
+        Bool or ClientError
+    """
+    s3 = get_s3_client()
+
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"repo-archive/{filename}",
+            Body=json.dumps(content).encode(),
+            ContentType="application/json",
+        )
+    except ClientError as e:
+        return e
+    return True
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="upload_object")
+def upload_object(bucket: str, filename: str, data: bytes, content_type: str) -> bool | ClientError:
+    """Uploads bytes directly to an S3 Bucket as they are, without a local copy.
+
+    Used for objects in formats which are already compressed (i.e the Parquet analytics exports),
+    so are not gzipped.
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+        data (bytes): The object's contents
+        content_type (str): The object's Content-Type
+
+    Returns:
+        Bool or ClientError
+    """
+    s3 = get_s3_client()
+
+    try:
+        s3.put_object(Bucket=bucket, Key=f"repo-archive/{filename}", Body=data, ContentType=content_type)
+    except ClientError as e:
+        return e
+    return True
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="read_object")
+def read_object(bucket: str, filename: str) -> dict | list | None:
+    """Reads a JSON object directly from an S3 Bucket.
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+
+    Returns:
+        The object's contents, or None if it does not exist.
+    """
+    s3 = get_s3_client()
+
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"repo-archive/{filename}")
+    except ClientError:
+        return None
+
+    return json.loads(decode_object(obj))
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="get_object_version")
+def get_object_version(bucket: str, filename: str) -> tuple[str, datetime] | None:
+    """Gets the version of an object in an S3 Bucket, without downloading it.
+
+    ==========
+
+    If the local copy has an upload pending, the version of the local copy is returned instead, as it is newer.
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+
+    Returns:
+        The object's ETag and when it was last modified, or None if it does not exist.
+    """
+    if has_pending_upload(bucket, filename):
+        with contextlib.suppress(FileNotFoundError):
+            status = os.stat(filename)
+            modified = datetime.fromtimestamp(status.st_mtime, timezone.utc)
+
+            return f'"{status.st_ino:x}-{status.st_size:x}-{status.st_mtime_ns:x}"', modified
+
+    s3 = get_s3_client()
+
+    try:
+        obj = s3.head_object(Bucket=bucket, Key=f"repo-archive/{filename}")
+    except ClientError:
+        return None
+
+    return obj["ETag"], obj["LastModified"]
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="list_objects")
+def list_objects(bucket: str, prefix: str) -> list:
+    """Lists the objects in an S3 Bucket with the given prefix.
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        prefix (str): The prefix of the objects' names (i.e exemptions/)
+
+    Returns:
+        list: The names of the objects (without repo-archive/), in order.
+    """
+    s3 = get_s3_client()
+
+    filenames = []
+    kwargs = {"Bucket": bucket, "Prefix": f"repo-archive/{prefix}"}
+
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+
+        filenames.extend(obj["Key"].removeprefix("repo-archive/") for obj in response.get("Contents", []))
+
+        if not response.get("IsTruncated"):
+            return filenames
+
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+# Streamed uploads are sent in parts of this size (S3's minimum part size is 5 MiB, except for the last part)
+STREAM_PART_SIZE = 8 * 1024 * 1024
+
+
+@metrics.timed(STORAGE_METRIC, STORAGE_METRIC_HELP, operation="upload_stream")
+def upload_stream(bucket: str, filename: str, chunks: Iterable[str | bytes], content_type: str) -> bool | ClientError:
+    """Uploads content to an S3 Bucket as it is generated, without a local copy.
+
+    The content is gzipped as it is generated (unless COMPRESSION_ENABLED is False), and stored with Content-Encoding: gzip.
+    At most one part (STREAM_PART_SIZE) of compressed content is held in memory. Content which fits in one part
+    is uploaded with a single request, otherwise it is sent as a multipart upload which is aborted if any part fails.
+
+    ==========
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+        chunks (Iterable): The content, as strings (encoded as UTF-8) or bytes
+        content_type (str): The object's Content-Type
+
+    Returns:
+        Bool or ClientError
+    """
+    s3 = get_s3_client()
+    key = f"repo-archive/{filename}"
+
+    # wbits=31 writes a gzip header and trailer, rather than a zlib one
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31) if COMPRESSION_ENABLED else None
+    encoding = {"ContentEncoding": "gzip"} if COMPRESSION_ENABLED else {}
+    buffer = bytearray()
+    parts: list[dict] = []
+    upload_id = None
+
+    try:
+        for chunk in chunks:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            buffer += compressor.compress(data) if compressor else data
+
+            if len(buffer) < STREAM_PART_SIZE:
+                continue
+
+            if upload_id is None:
+                upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type, **encoding)[
+                    "UploadId"
+                ]
+
+            response = s3.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=bytes(buffer)
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+            buffer.clear()
+
+        if compressor:
+            buffer += compressor.flush()
+
+        if upload_id is None:
+            s3.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), ContentType=content_type, **encoding)
+            return True
+
+        if buffer:
+            response = s3.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=bytes(buffer)
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+    except ClientError as e:
+        if upload_id is not None:
+            # Parts of an incomplete upload are stored (and charged for) until it is aborted
+            with contextlib.suppress(ClientError):
+                s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        return e
+    return True
+
+
+def stream_object(
+    bucket: str, filename: str, chunk_size: int = 64 * 1024, accept_gzip: bool = False
+) -> tuple[Iterator[bytes], str | None] | None:
+    """Streams an object from an S3 Bucket, without a local copy.
+
+    ==========
+
+    Compressed objects are decompressed as they are streamed, unless accept_gzip is True and the object is gzipped,
+    in which case it is streamed as it is stored (i.e to a browser which accepts gzip).
+
+    Args:
+        bucket (str): The name of the bucket
+        filename (str): The name of the object
+        chunk_size (int): The number of bytes in each chunk
+        accept_gzip (bool): Whether gzipped content may be returned without being decompressed
+
+    Returns:
+        A tuple of an iterator of the object's contents and their Content-Encoding (None if they are not encoded),
+        or None if the object does not exist.
+    """
+    s3 = get_s3_client()
+
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"repo-archive/{filename}")
+    except ClientError:
+        return None
+
+    body = obj["Body"]
+    content_encoding = obj.get("ContentEncoding")
+    decompressor = None
+
+    if content_encoding == "gzip" and not accept_gzip:
+        decompressor = zlib.decompressobj(31)
+        content_encoding = None
+
+    def generate() -> Iterator[bytes]:
+        try:
+            while chunk := body.read(chunk_size):
+                yield decompressor.decompress(chunk) if decompressor else chunk
+
+            if decompressor:
+                yield decompressor.flush()
+        finally:
+            body.close()
+
+    return generate(), content_encoding
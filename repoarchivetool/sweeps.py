@@ -0,0 +1,571 @@
+"""Finds and archives repositories, for one organisation or sweeping through all of them at once.
+
+Each sweep runs its organisations concurrently on a shared pool of workers (see scheduler.py).
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, W0718, C0415
+
+from __future__ import annotations
+
+import contextlib
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import date
+from http import HTTPStatus
+from typing import TYPE_CHECKING
+
+import flask
+import github_auth
+import journals
+import models
+import organisation_storage
+import reports
+import scheduler
+import settings
+import storage_interface
+
+if TYPE_CHECKING:
+    import github_api_toolkit
+    import jinja2
+
+# Ways of finding repositories to archive, selected on the Find Repositories page ({mode: data_retrieval function})
+discovery_modes = {
+    # Pages through every repository in the organisation
+    "listing": "get_organisation_repos",
+    # Only requests stale repositories, using the search API
+    "search": "search_organisation_repos",
+}
+
+
+def get_sweep_result(pipeline: Future) -> int | str | None:
+    """Gets the result of an organisation's sweep.
+
+    ==========
+
+    Args:
+        pipeline (Future): the first task of the organisation's sweep. If the task started further tasks,
+            it returns the future of the last one.
+
+    Returns:
+        The result of the sweep, or a string if it failed.
+    """
+    try:
+        result = pipeline.result()
+
+        if isinstance(result, Future):
+            result = result.result()
+
+    except Exception as e:
+        return f"Error: {e}"
+
+    return result
+
+
+def run_sweep(orgs: list[str], task, *args) -> dict:
+    """Runs a sweep of the given organisations concurrently, sharing a pool of workers fairly between them.
+
+    ==========
+
+    Args:
+        orgs (list): the organisations to sweep.
+        task (Callable): the first task of each organisation's sweep.
+            It is called with the scheduler, the organisation, the organisation's github_interface and args.
+        *args: further arguements for task.
+
+    Returns:
+        dict: the result of each organisation's sweep (see get_sweep_result()).
+
+    Raises KeyError if the session has no token for one of the organisations.
+    """
+    interfaces = {org: github_auth.get_github_interface(org) for org in orgs}
+
+    sweep = scheduler.FairScheduler(settings.sweep_max_workers, settings.sweep_max_workers_per_organisation)
+
+    pipelines = {org: sweep.submit(org, task, sweep, org, interfaces[org], *args) for org in orgs}
+
+    sweep.join()
+
+    return {org: get_sweep_result(pipeline) for org, pipeline in pipelines.items()}
+
+
+# Functions used within find_repos()
+@dataclass(frozen=True, slots=True)
+class FindParameters:
+    """The parameters of a find, shared by each organisation's sweep."""
+
+    # The archive date. Repositories with no commits since this date are found.
+    date: str
+    # The type of repository to find (all, public or private)
+    repo_type: str
+    # The key of the discovery method in discovery_modes
+    discovery_mode: str
+    # The root URL of the tool, used to link to /set_exempt_date
+    domain: str
+
+
+def get_new_repos(
+    gh: github_api_toolkit.github_interface, org: str, params: FindParameters
+) -> list[models.Repository] | str:
+    """Gets the repositories which fit the given parameters and are not already stored.
+
+    ==========
+
+    Args:
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+        org (str): the organisation.
+        params (FindParameters): the parameters of the find.
+
+    Returns:
+        A list of the new repositories, or a string if there was an error.
+    """
+    import data_retrieval
+
+    discover = getattr(data_retrieval, discovery_modes[params.discovery_mode])
+    found_repos = discover(org, params.date, params.repo_type, gh)
+
+    if isinstance(found_repos, str):
+        # Error Message Returned
+        return found_repos
+
+    stored_names = {repo.name for repo in organisation_storage.load_repositories(org)}
+
+    new_repos = []
+
+    for repo in found_repos:
+        if repo.name not in stored_names:
+            new_repos.append(repo)
+            stored_names.add(repo.name)
+
+    return new_repos
+
+
+def save_recently_added(org: str, repos: list[models.Repository], domain: str, env: jinja2.Environment):
+    """Stores the organisation's recently added report, listing the given repositories, in each of its formats.
+
+    ==========
+
+    Each report is rendered from templates/recentlyAdded.html (or as JSON or CSV) and uploaded to S3 as it is rendered,
+    so it is never held in memory or written locally in full.
+
+    Args:
+        org (str): the organisation.
+        repos (list): the repositories to list.
+        domain (str): the root URL of the tool, used to link to /set_exempt_date.
+        env (jinja2.Environment): the app's template environment, the HTML report is rendered with.
+    """
+    entries = [
+        reports.ReportEntry.from_repository(org, repo, domain, settings.archive_threshold_days) for repo in repos
+    ]
+
+    for fmt, content_type in reports.formats.items():
+        storage_interface.upload_stream(
+            settings.bucket_name,
+            organisation_storage.org_file(org, f"recently_added.{fmt}"),
+            reports.render(env, fmt, org, entries, settings.archive_threshold_days),
+            content_type,
+        )
+
+
+def save_new_repos(
+    org: str, new_repos: list[models.Repository], contributor_lists: list, domain: str, env: jinja2.Environment
+) -> int:
+    """Adds new repositories to the organisation's repositories.json and lists them in its recently added report.
+
+    ==========
+
+    Args:
+        org (str): the organisation.
+        new_repos (list): the new repositories, from get_new_repos().
+        contributor_lists (list): the contributors of each new repository.
+        domain (str): the root URL of the tool, used to link to /set_exempt_date.
+        env (jinja2.Environment): the app's template environment, the recently added report is rendered with.
+
+    Returns:
+        int: the number of repositories added (those stored by another find in the meantime are not added again).
+    """
+    # Get current date for logging purposes
+    current_date = date.today()
+    added = []
+
+    with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+        stored_repos = organisation_storage.load_repositories(org)
+
+        # Another find may have stored some of the repositories since get_new_repos() checked, so they are skipped
+        stored_names = {repo.name for repo in stored_repos}
+
+        for repo, contributor_list in zip(new_repos, contributor_lists, strict=True):
+            if repo.name in stored_names:
+                continue
+
+            repo.contributors = contributor_list
+            repo.date_added = current_date
+
+            stored_repos.append(repo)
+            added.append(repo)
+
+        organisation_storage.save_repositories(org, stored_repos)
+
+    # List which NEW repos will be archived
+    save_recently_added(org, added, domain, env)
+
+    return len(added)
+
+
+def find_organisation_repos(
+    sweep: scheduler.FairScheduler,
+    org: str,
+    gh: github_api_toolkit.github_interface,
+    params: FindParameters,
+    env: jinja2.Environment,
+) -> Future | str:
+    """Finds and stores an organisation's new repositories as part of a sweep.
+
+    ==========
+
+    Once the new repositories are found, a task is queued to get each one's top contributors.
+    When they have all finished, the repositories are saved by save_new_repos().
+
+    Args:
+        sweep (FairScheduler): the scheduler running the sweep.
+        org (str): the organisation.
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+        params (FindParameters): the parameters of the find.
+        env (jinja2.Environment): the app's template environment. The sweep's workers have no app context,
+            so it is passed to them.
+
+    Returns:
+        The future of save_new_repos(), or a string if there was an error.
+    """
+    import data_retrieval
+
+    new_repos = get_new_repos(gh, org, params)
+
+    if isinstance(new_repos, str):
+        return new_repos
+
+    return sweep.submit_all(
+        org,
+        data_retrieval.get_repo_contributors,
+        [(gh, repo.contributors_url, settings.contributor_summary_size) for repo in new_repos],
+        lambda contributor_lists: save_new_repos(org, new_repos, contributor_lists, params.domain, env),
+    )
+
+
+def find_repos():
+    """Gets and stores any Github repositories, using api_controller.py, which fits the given parameters.
+
+    ==========
+
+    When posted to, the function will use the inputted values from the homepage to make
+    a request to the Github API using api_controller.py and its APIHandler class.
+    The request will return any repositories which fit the inputted parameters, in which
+    this function will store ANY NEW repositories in JSON (repositories.json).
+
+    If allOrganisations is posted, every configured organisation is searched concurrently.
+    Each organisation's new repositories are stored in its own repositories.json.
+
+    If this function is not posted to, it will return a redirect to the homepage.
+
+    If the function receives an error after using api_controller.py, it will return a render of
+    error.html with an appropriate error message.
+
+    If the function is successful with obtaining the information, it will return a redirect to
+    /manage_repositories with an in-URL arguement (reposAdded) which is used to display how many
+    repositories are added to JSON.
+    """
+    if flask.request.method != "POST":
+        return flask.redirect("/")
+
+    all_organisations = flask.request.form.get("allOrganisations") == "true"
+    orgs = settings.organisations if all_organisations else [organisation_storage.get_organisation()]
+
+    # Get form values
+    params = FindParameters(
+        date=flask.request.form["date"],
+        repo_type=flask.request.form["repoType"],
+        discovery_mode=flask.request.form.get("discoveryMode", "listing"),
+        domain=flask.request.url_root,
+    )
+
+    if params.discovery_mode not in discovery_modes:
+        return flask.render_template("error.html", error=f"Unknown discovery mode: {params.discovery_mode}.")
+
+    try:
+        results = run_sweep(orgs, find_organisation_repos, params, flask.current_app.jinja_env)
+    except KeyError:
+        return flask.render_template("error.html", error="Personal Access Token Undefined.")
+
+    errors = [f"{org}: {result}" for org, result in results.items() if isinstance(result, str)]
+
+    if len(errors) > 0:
+        # A single organisation's error message is shown as it is
+        error = (
+            f"Point of Failure: Finding repositories. The following organisations could not be searched:<br>{'<br>'.join(errors)}"
+            if all_organisations
+            else results[orgs[0]]
+        )
+
+        return flask.render_template("error.html", error=error)
+
+    if not all_organisations:
+        return flask.redirect(f"/manage_repositories?reposAdded={results[orgs[0]]}")
+
+    repos_added = sum(results.values())
+
+    return flask.redirect(
+        f"/manage_repositories?msg={repos_added}%20repositories%20added%20across%20{len(orgs)}%20organisations"
+    )
+
+
+# Functions used within archive_repos()
+def start_archive_batch(org: str, batch_id: int) -> models.ArchiveBatch:
+    """Starts an archive batch, resuming it from the organisation's archive journal if a previous run was interrupted.
+
+    ==========
+
+    Each archived repository is recorded in the archive journal (archive_journal.jsonl). If a journal for this batch
+    already exists, the previous run was interrupted, so the batch is resumed with the repositories the journal
+    records as archived.
+
+    Args:
+        org (str): the organisation.
+        batch_id (int): the id of the batch within archive_instance.
+
+    Returns:
+        archive_instance (ArchiveBatch)
+    """
+    journal_file = organisation_storage.org_file(org, settings.archive_journal)
+
+    # The first journal entry holds the batch information, the rest are archive_instance repos
+    journal = journals.read_journal(settings.bucket_name, journal_file)
+
+    if len(journal) > 0 and journal[0]["batchID"] == batch_id:
+        archive_instance = models.ArchiveBatch.from_dict(journal[0])
+        archive_instance.repos = [
+            models.ArchivedRepository.from_dict(entry) for entry in journal[1:] if entry["status"] == "Success"
+        ]
+
+        return archive_instance
+
+    # Any other journal belongs to a batch which has already been saved
+    storage_interface.delete_file(settings.bucket_name, journal_file)
+
+    archive_instance = models.ArchiveBatch(batch_id=batch_id, date=date.today())
+
+    journals.append_journal(journal_file, archive_instance.to_dict())
+
+    return archive_instance
+
+
+def is_eligible_for_archive(repo: models.Repository) -> bool:
+    """Checks whether a stored repository is not exempt and was added over archive_threshold_days days ago."""
+    return repo.exemption is None and (date.today() - repo.date_added).days >= settings.archive_threshold_days
+
+
+def archive_repository(
+    gh: github_api_toolkit.github_interface, journal: journals.JournalWriter, repo: models.Repository
+) -> models.ArchivedRepository | None:
+    """Archives a repository and records the outcome in the archive journal.
+
+    ==========
+
+    Args:
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+        journal (JournalWriter): the organisation's archive journal.
+        repo (Repository): the stored repository.
+
+    Returns:
+        The repository's entry for archive_instance, or None if Github responded with an unexpected status.
+    """
+    from requests import Response
+
+    response = gh.patch(repo.api_url, {"archived": True}, False)
+
+    entry = None
+
+    if isinstance(response, Response):
+        if response.status_code == HTTPStatus.OK:
+
+            entry = models.ArchivedRepository(
+                name=repo.name,
+                api_url=repo.api_url,
+                status="Success",
+                message="Repository Archived Successfully.",
+                html_url=repo.html_url,
+            )
+
+    else:
+        entry = models.ArchivedRepository(
+            name=repo.name,
+            api_url=repo.api_url,
+            status="Failed",
+            message=f"Error: {response}",
+            html_url=repo.html_url,
+        )
+
+    if entry is not None:
+        journal.append(entry.to_dict())
+
+    return entry
+
+
+def save_archive_batch(org: str, archive_instance: models.ArchiveBatch, entries: list) -> int | None:
+    """Saves an organisation's archive batch once all its repositories have been archived.
+
+    ==========
+
+    Removes any archived repositories from repositories.json.
+    Adds archive_instance to archived.json.
+    Deletes the archive journal, as the batch is now saved.
+
+    Both files are loaded again while holding the organisation's storage_lock, as they may have changed while the
+    repositories were being archived (i.e an exemption was merged or a webhook handled).
+    repositories.json is written before archived.json so that, if the process stops between the two, the journal
+    still holds the batch and the next run saves it.
+
+    Args:
+        org (str): the organisation.
+        archive_instance (ArchiveBatch): the new batch, from start_archive_batch().
+        entries (list): the result of archive_repository() for each repository archived by this run.
+
+    Returns:
+        The id of the batch, or None if no repositories were archived.
+    """
+    archive_instance.repos.extend(entry for entry in entries if entry is not None)
+
+    # If repos have been archived, log changes in storage
+    if len(archive_instance.repos) > 0:
+        archived_names = {entry.name for entry in archive_instance.repos if entry.status == "Success"}
+
+        with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+            remaining_repos = [
+                repo for repo in organisation_storage.load_repositories(org) if repo.name not in archived_names
+            ]
+
+            organisation_storage.save_repositories(org, remaining_repos)
+
+            archive_list = organisation_storage.load_archive_list(org)
+            archive_list.append(archive_instance)
+
+            organisation_storage.save_archive_list(org, archive_list)
+
+        # The journal can recover the batch until it has been uploaded, so is kept if the upload fails
+        if storage_interface.flush_uploads(
+            [
+                organisation_storage.org_file(org, "repositories.json"),
+                organisation_storage.org_file(org, "archived.json"),
+            ]
+        ):
+            storage_interface.delete_file(
+                settings.bucket_name, organisation_storage.org_file(org, settings.archive_journal)
+            )
+
+        organisation_storage.export_analytics(org, remaining_repos, [archive_instance])
+
+        return archive_instance.batch_id
+
+    storage_interface.delete_file(settings.bucket_name, organisation_storage.org_file(org, settings.archive_journal))
+
+    return None
+
+
+def archive_organisation_repos(
+    sweep: scheduler.FairScheduler, org: str, gh: github_api_toolkit.github_interface
+) -> Future:
+    """Archives an organisation's eligible repositories as part of a sweep.
+
+    ==========
+
+    Loads the organisation's archive batches and stored repositories, then starts (or resumes) a batch.
+    A task is queued to archive each eligible repository which the batch has not already archived.
+    When they have all finished, the batch is saved by save_archive_batch().
+
+    Args:
+        sweep (FairScheduler): the scheduler running the sweep.
+        org (str): the organisation.
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+
+    Returns:
+        The future of save_archive_batch().
+    """
+    # Get archive batches from storage
+    archive_list = organisation_storage.load_archive_list(org)
+
+    # Get repos from storage, including any exemptions set since they were last loaded
+    repos = organisation_storage.load_repositories(org)
+
+    archive_instance = start_archive_batch(org, len(archive_list) + 1)
+    already_archived = {entry.name for entry in archive_instance.repos}
+
+    journal = journals.JournalWriter(
+        settings.bucket_name,
+        organisation_storage.org_file(org, settings.archive_journal),
+        settings.journal_flush_interval,
+        len(archive_instance.repos),
+    )
+
+    repos_to_archive = [repo for repo in repos if repo.name not in already_archived and is_eligible_for_archive(repo)]
+
+    return sweep.submit_all(
+        org,
+        archive_repository,
+        [(gh, journal, repo) for repo in repos_to_archive],
+        lambda entries: save_archive_batch(org, archive_instance, entries),
+    )
+
+
+def archive_repos():
+    """Archives any repositories which are:
+        - older than archive_threshold_days days within the system
+        - have not been marked to be kept using the keep attribute in repositories.json.
+
+    ==========
+
+    Uses archive_organisation_repos() to:
+        - Load any archive batches from archived.json and the repositories from repositories.json
+        - Archive any repositories older than archive_threshold_days, resuming an interrupted batch if there is one
+        - Save the new batch to archived.json and remove the archived repositories from repositories.json
+
+    If allOrganisations is passed as true, every configured organisation is archived concurrently, each in its own batch.
+
+    Only one run archives each organisation at a time (see archive_lock). A run started while another is archiving
+    the organisation waits for it to finish, then archives any repositories which are still eligible.
+
+    Returns a redirect to recentlyArchived.
+
+    If the function fails to create an APIHandler instance, it will return a render of error.html
+    with an appropriate error message.
+
+    """
+    all_organisations = flask.request.args.get("allOrganisations") == "true"
+    orgs = settings.organisations if all_organisations else [organisation_storage.get_organisation()]
+
+    try:
+        with contextlib.ExitStack() as stack:
+            # Locks are always taken in the order of organisations, so concurrent runs cannot wait on each other
+            for org in orgs:
+                stack.enter_context(
+                    storage_interface.file_lock(organisation_storage.org_file(org, settings.archive_lock))
+                )
+
+            results = run_sweep(orgs, archive_organisation_repos)
+    except KeyError:
+        return flask.render_template("error.html", error="Personal Access Token Undefined.")
+
+    errors = [f"{org}: {result}" for org, result in results.items() if isinstance(result, str)]
+
+    if len(errors) > 0:
+        return flask.render_template(
+            "error.html",
+            error=f"Point of Failure: Archiving repositories. The following organisations could not be archived:<br>{'<br>'.join(errors)}",
+        )
+
+    batches = {org: batch_id for org, batch_id in results.items() if batch_id is not None}
+
+    if len(batches) == 0:
+        return flask.redirect("/manage_repositories?msg=No%20repositories%20eligable%20for%20archive")
+
+    if not all_organisations:
+        return flask.redirect(f"/recently_archived?msg=Batch%20{batches[orgs[0]]}%20created")
+
+    return flask.redirect(f"/recently_archived?msg=Batches%20created%20for%20{len(batches)}%20organisations")
@@ -0,0 +1,265 @@
+"""Spreads an organisation's GitHub API requests across the installation tokens of several GitHub
+Apps.
+
+Each installation of a GitHub App has its own rate limit, so installing further Apps in an
+organisation adds to the requests the tool can make each hour. Reads are made with whichever token
+has the most requests remaining, and are retried with the next token if GitHub refuses one for being
+over its limit. Changes (i.e archiving a repository) are made with the first token (the main App's)
+while it has requests remaining, so they are attributed to one App.
+
+The search API has its own, much smaller, rate limit, so each token's core and search limits are
+tracked separately (by GitHub's X-RateLimit-Resource).
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0415
+
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import urlparse
+
+import metrics
+
+# The requests an installation token is assumed to have remaining of each rate limit (by its
+# X-RateLimit-Resource) before GitHub reports the real number. Other resources are assumed to have the core limit.
+DEFAULT_RATE_LIMITS = {"core": 5000, "search": 30}
+
+# A token refused for a secondary rate limit without a Retry-After is not used again for this many seconds
+DEFAULT_RETRY_AFTER = 60
+
+
+@dataclass(slots=True)
+class RateLimit:
+    """What GitHub last reported of one of a token's rate limits."""
+
+    remaining: int
+    # When the rate limit resets, as a Unix time
+    reset: float = 0.0
+
+    def is_available(self, now: float) -> bool:
+        """Checks whether a request can be made against the rate limit (i.e it has requests remaining or has reset)."""
+        return self.remaining > 0 or self.reset <= now
+
+
+@dataclass(slots=True)
+class PooledToken:
+    """An installation token in a pool, and what GitHub last reported of its rate limits."""
+
+    # The GitHub App the token belongs to (its client ID)
+    app: str
+    token: str
+    # A github_interface using the token
+    gh: Any
+    # The token's rate limits, by the resource they cover ({X-RateLimit-Resource: RateLimit})
+    rate_limits: dict[str, RateLimit] = field(default_factory=dict)
+
+    def rate_limit(self, resource: str) -> RateLimit:
+        """Gets the token's rate limit for a resource (i.e core or search), assuming the default until GitHub reports it."""
+        rate_limit = self.rate_limits.get(resource)
+
+        if rate_limit is None:
+            rate_limit = self.rate_limits[resource] = RateLimit(
+                DEFAULT_RATE_LIMITS.get(resource, DEFAULT_RATE_LIMITS["core"])
+            )
+
+        return rate_limit
+
+
+def get_resource(url: str) -> str:
+    """Gets the rate limit a request to a GitHub API URL counts against (its X-RateLimit-Resource)."""
+    return "search" if urlparse(url).path.lstrip("/").startswith("search/") else "core"
+
+
+def get_response(response: Any) -> Any:
+    """Gets the HTTP response of a github_interface result, which is the exception raised if the request failed."""
+    return response if hasattr(response, "headers") else getattr(response, "response", None)
+
+
+class TokenPool:
+    """The installation tokens one organisation's requests can be made with.
+
+    Pools are shared by every thread and session in the process, so their rate limits are tracked together.
+    """
+
+    def __init__(self, org: str) -> None:
+        self.org = org
+        self.tokens: list[PooledToken] = []
+        self.lock = threading.Lock()
+
+    def set_token(self, app: str, token: str, create_interface: Callable[[str], Any]) -> None:
+        """Adds an App's token to the pool, or replaces its previous token once refreshed.
+
+        ==========
+
+        The rate limit belongs to the App's installation rather than the token, so a refreshed token keeps it.
+
+        Args:
+            app (str): the GitHub App the token belongs to.
+            token (str): the installation token.
+            create_interface (Callable): creates a github_interface for the token.
+        """
+        with self.lock:
+            pooled = next((pooled for pooled in self.tokens if pooled.app == app), None)
+
+            if pooled is None:
+                self.tokens.append(PooledToken(app=app, token=token, gh=create_interface(token)))
+            elif pooled.token != token:
+                pooled.token = token
+                pooled.gh = create_interface(token)
+
+    def remove_token(self, app: str) -> None:
+        """Removes an App's token from the pool (i.e if a new one could not be minted)."""
+        with self.lock:
+            self.tokens = [pooled for pooled in self.tokens if pooled.app != app]
+
+    def choose(self, write: bool, exclude: set[str], resource: str = "core") -> PooledToken | None:
+        """Chooses the token to make a request with.
+
+        ==========
+
+        A request is counted against the chosen token straight away, so concurrent requests are spread across the
+        tokens rather than all choosing the same one before GitHub reports its new remaining requests.
+
+        Args:
+            write (bool): whether the request changes anything. If so, the first available token is chosen.
+            exclude (set): the Apps whose tokens have already been tried for this request.
+            resource (str): the rate limit the request counts against (i.e core or search).
+
+        Returns:
+            The token, or None if every token is over its rate limit.
+        """
+        now = time.time()
+
+        with self.lock:
+            available = [
+                pooled
+                for pooled in self.tokens
+                if pooled.app not in exclude and pooled.rate_limit(resource).is_available(now)
+            ]
+
+            if len(available) == 0:
+                return None
+
+            chosen = available[0] if write else max(available, key=lambda pooled: pooled.rate_limit(resource).remaining)
+            rate_limit = chosen.rate_limit(resource)
+
+            if rate_limit.reset <= now and rate_limit.remaining <= 0:
+                # The rate limit has reset since GitHub last reported it
+                rate_limit.remaining = DEFAULT_RATE_LIMITS.get(resource, DEFAULT_RATE_LIMITS["core"])
+
+            rate_limit.remaining -= 1
+
+            return chosen
+
+    def record(self, pooled: PooledToken, response: Any, resource: str = "core") -> bool:
+        """Records the rate limit GitHub reported in a response.
+
+        ==========
+
+        The limit updated is the one GitHub says the response counted against (X-RateLimit-Resource), so searches
+        do not use up the budget of the core limit, or the other way round.
+
+        Args:
+            pooled (PooledToken): the token the request was made with.
+            response: the result of the github_interface call.
+            resource (str): the rate limit the request was expected to count against, if GitHub does not say.
+
+        Returns:
+            bool: False if GitHub refused the request because the token is over its rate limit, otherwise True.
+        """
+        http_response = get_response(response)
+
+        if http_response is None:
+            return True
+
+        headers = http_response.headers
+        remaining = headers.get("X-RateLimit-Remaining")
+        limited = http_response.status_code in (HTTPStatus.FORBIDDEN, HTTPStatus.TOO_MANY_REQUESTS) and (
+            remaining == "0" or "Retry-After" in headers
+        )
+
+        with self.lock:
+            rate_limit = pooled.rate_limit(headers.get("X-RateLimit-Resource", resource))
+
+            if remaining is not None:
+                rate_limit.remaining = int(remaining)
+                rate_limit.reset = float(headers.get("X-RateLimit-Reset", rate_limit.reset))
+
+            if limited:
+                # Secondary rate limits are reported with a Retry-After rather than the remaining requests
+                if "Retry-After" in headers:
+                    rate_limit.reset = time.time() + int(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+
+                rate_limit.remaining = 0
+
+        return not limited
+
+
+class PooledGitHubInterface:
+    """A github_interface which makes each request with a token from a TokenPool.
+
+    Requests refused because their token is over its rate limit are retried with the next token,
+    until every token has been tried.
+    """
+
+    def __init__(self, pool: TokenPool) -> None:
+        self.pool = pool
+
+    def get(self, *args: Any, **kwargs: Any) -> Any:
+        """Makes a GET request (see github_interface.get) with the token with the most requests remaining."""
+        return self.request("get", False, *args, **kwargs)
+
+    def patch(self, *args: Any, **kwargs: Any) -> Any:
+        """Makes a PATCH request (see github_interface.patch) with the main App's token while it is available."""
+        return self.request("patch", True, *args, **kwargs)
+
+    def request(self, method: str, write: bool, *args: Any, **kwargs: Any) -> Any:
+        """Makes a request with the best available token, failing over to the others if it is over its rate limit.
+
+        ==========
+
+        Args:
+            method (str): the github_interface method to call (get or patch).
+            write (bool): whether the request changes anything.
+            *args: the positional arguments of the github_interface method.
+            **kwargs: the keyword arguments of the github_interface method.
+
+        Returns:
+            The result of the github_interface call: a Response if successful, otherwise the raised exception.
+        """
+        tried: set[str] = set()
+        response = None
+        resource = get_resource(kwargs.get("url", args[0] if len(args) > 0 else ""))
+
+        while (pooled := self.pool.choose(write, tried, resource)) is not None:
+            tried.add(pooled.app)
+            response = getattr(pooled.gh, method)(*args, **kwargs)
+
+            metrics.inc(
+                "repoarchive_github_token_requests_total",
+                1,
+                "GitHub requests made with each GitHub App's token.",
+                org=self.pool.org,
+                app=pooled.app,
+            )
+
+            if self.pool.record(pooled, response, resource):
+                return response
+
+            metrics.inc(
+                "repoarchive_github_rate_limited_total",
+                1,
+                "GitHub requests refused because the token was over its rate limit.",
+                org=self.pool.org,
+                app=pooled.app,
+            )
+
+        if response is None:
+            from requests import HTTPError
+
+            return HTTPError(f"Every GitHub App's rate limit for {self.pool.org} has been used up")
+
+        return response
@@ -0,0 +1,249 @@
+"""Undoes archive batches, unarchiving their repositories and adding them back to repositories.json.
+
+Each undo records its progress in a checkpoint, so an interrupted undo carries on where it stopped.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R1705, C0123, C0415
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+
+import flask
+import github_auth
+import journals
+import models
+import organisation_storage
+import settings
+import storage_interface
+
+if TYPE_CHECKING:
+    import github_api_toolkit
+
+
+# Functions used within undo_batch()
+def get_repository_information(gh: github_api_toolkit.github_interface, repo_json: dict) -> models.Repository:
+    """Gets information for a given repository as part of the unarchive process.
+
+    ==========
+
+    The repository's details come from the response of the unarchive PATCH request,
+    so only the contributors need to be fetched from Github.
+
+    Args:
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+        repo_json (dict): The repository returned by the Github API.
+
+    Returns:
+        The repository's record for repositories.json.
+    """
+    import data_retrieval
+
+    last_update = datetime.strptime(repo_json["pushed_at"], "%Y-%m-%dT%H:%M:%SZ").date()
+
+    contributor_list = data_retrieval.get_repo_contributors(
+        gh, repo_json["contributors_url"], settings.contributor_summary_size
+    )
+
+    return models.Repository(
+        name=repo_json["name"],
+        type=repo_json["visibility"],
+        api_url=repo_json["url"],
+        last_commit=last_update,
+        date_added=date.today(),
+        contributors=contributor_list,
+        html_url=repo_json["html_url"],
+    )
+
+
+def undo_repository(
+    gh: github_api_toolkit.github_interface, repo_to_undo: models.ArchivedRepository, restore: bool
+) -> dict:
+    """Unarchives a repository from an archive batch.
+
+    ==========
+
+    Args:
+        gh (api_controller): An instance of the api_controller class from api_interface.py.
+        repo_to_undo (ArchivedRepository): The repository to unarchive, from the archive batch.
+        restore (bool): Whether the repository needs adding back to repositories.json.
+
+    Returns:
+        A dictionary containing the repository's name and either:
+            - error: an error message if it could not be unarchived.
+            - repository: its record for repositories.json if restore is True, otherwise None.
+    """
+    from requests import Response
+
+    response = gh.patch(repo_to_undo.api_url, {"archived": False}, False)
+
+    if type(response) is not Response:
+        return {"name": repo_to_undo.name, "error": f"Error: {response}"}
+
+    repository = get_repository_information(gh, response.json()) if restore else None
+
+    return {"name": repo_to_undo.name, "repository": repository}
+
+
+def resume_undo(org: str, batch_id: int) -> tuple[journals.JournalWriter, dict[str, models.Repository | None]]:
+    """Loads the checkpoint of an undo, which records the repositories it has already unarchived.
+
+    ==========
+
+    If a previous attempt to undo the batch was interrupted, its checkpoint is downloaded from S3
+    so the undo carries on from where it stopped.
+
+    Args:
+        org (str): the organisation.
+        batch_id (int): the ID of the batch being undone.
+
+    Returns:
+        The checkpoint's writer, and {name: the repository's record if it needs adding back to repositories.json,
+        otherwise None} for each repository already unarchived.
+    """
+    checkpoint = organisation_storage.org_file(org, f"undo_batch_{batch_id}.jsonl")
+
+    undone = {
+        entry["name"]: models.Repository.from_dict(entry["repository"]) if entry["repository"] is not None else None
+        for entry in journals.read_journal(settings.bucket_name, checkpoint)
+    }
+
+    return (
+        journals.JournalWriter(settings.bucket_name, checkpoint, settings.journal_flush_interval, len(undone)),
+        undone,
+    )
+
+
+def save_undone_repos(
+    org: str, batch_id: int, undone: dict[str, models.Repository | None]
+) -> tuple[list[models.Repository], models.ArchiveBatch]:
+    """Adds the unarchived repositories back to repositories.json and removes them from their batch in archived.json.
+
+    ==========
+
+    The storage files may have changed while the repositories were being unarchived, so are loaded again.
+
+    Args:
+        org (str): the organisation.
+        batch_id (int): the ID of the batch being undone.
+        undone (dict): the unarchived repositories (see resume_undo()).
+
+    Returns:
+        The stored repositories and the undone batch, as saved.
+    """
+    with storage_interface.file_lock(organisation_storage.org_file(org, settings.storage_lock)):
+        archive_list = organisation_storage.load_archive_list(org)
+        stored_repos = organisation_storage.load_repositories(org)
+        stored_names = {repo.name for repo in stored_repos}
+
+        batch_to_undo = archive_list[batch_id - 1]
+
+        # Add the repos to repositories.json
+        for name, repository in undone.items():
+            if repository is not None and name not in stored_names:
+                stored_repos.append(repository)
+                stored_names.add(name)
+
+        # Remove the repos from archived.json
+        batch_to_undo.repos = [repo for repo in batch_to_undo.repos if repo.name not in undone]
+
+        # Write changes to storage
+        organisation_storage.save_repositories(org, stored_repos)
+        organisation_storage.save_archive_list(org, archive_list)
+
+    return stored_repos, batch_to_undo
+
+
+def undo_batch():
+    """Unarchives a batch of archived repositories.
+
+    ==========
+
+    Creates an instance of the APIHandler class from api_controller.py.
+    Gets the passed batchID arguement.
+    Loads any archive batches from archived.json into archiveList.
+    Loads all stored repositories from repositories.json into storedRepos.
+    Gets the batch that needs undoing from archiveList using the given batchID.
+    Loads the batch's checkpoint (if a previous attempt was interrupted) and skips any repositories it has already unarchived.
+    Unarchives the remaining repositories within the batch concurrently (up to undo_max_workers at a time) using patch requests
+    from the APIHandler class instance. If any now unarchived repositories are not already stored, their information is taken
+    from the patch response and their contributors fetched from Github.
+    Each unarchived repository is recorded in the checkpoint, which is flushed to S3 every journal_flush_interval repositories.
+    Add any now unarchived repositories to storedRepos and remove them from the batch in archiveList.
+
+    Write storedRepos back to repositories.json.
+    Write archive_list back to archived.json.
+    Delete the checkpoint.
+
+    Returns a redirect to recentlyArchived with a passed arguement, batchID, which is used to show a success message.
+
+    If the function fails to create an APIHandler instance, it will return a render of error.html
+    with an appropriate error message.
+
+    If the function fails to unarchive any repositories, the successful ones are still saved and it will return a render of
+    error.html listing the failures. Retrying the undo will then only attempt the failed repositories.
+    """
+    org = organisation_storage.get_organisation()
+
+    try:
+        gh = github_auth.get_github_interface(org)
+    except KeyError:
+        return flask.render_template("error.html", error="Personal Access Token Undefined.")
+
+    batch_id = flask.request.args.get("batchID")
+
+    if batch_id is not None:
+        batch_id = int(batch_id)
+
+        batch_to_undo = organisation_storage.load_archive_list(org)[batch_id - 1]
+        stored_names = {repo.name for repo in organisation_storage.load_repositories(org)}
+
+        # Skip any repositories already unarchived by an interrupted attempt
+        journal, undone = resume_undo(org, batch_id)
+        repos_to_undo = [repo for repo in batch_to_undo.repos if repo.name not in undone]
+
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=settings.undo_max_workers) as executor:
+            futures = [
+                executor.submit(undo_repository, gh, repo, repo.name not in stored_names) for repo in repos_to_undo
+            ]
+
+            for future in as_completed(futures):
+                result = future.result()
+
+                if "error" in result:
+                    errors.append(f"{result['name']}: {result['error']}")
+                    continue
+
+                repository = result["repository"]
+
+                undone[result["name"]] = repository
+                journal.append(
+                    {"name": result["name"], "repository": repository.to_dict() if repository is not None else None}
+                )
+
+        stored_repos, batch_to_undo = save_undone_repos(org, batch_id, undone)
+
+        # The checkpoint can recover the undo until it has been uploaded, so is kept if the upload fails
+        if storage_interface.flush_uploads(
+            [
+                organisation_storage.org_file(org, "repositories.json"),
+                organisation_storage.org_file(org, "archived.json"),
+            ]
+        ):
+            storage_interface.delete_file(settings.bucket_name, journal.filename)
+
+        organisation_storage.export_analytics(org, stored_repos, [batch_to_undo])
+
+        if len(errors) > 0:
+            return flask.render_template(
+                "error.html",
+                error=f"Point of Failure: Restoring batch {batch_id}. The following repositories could not be unarchived:<br>{'<br>'.join(errors)}",
+            )
+
+        return flask.redirect(f"/recently_archived?batchID={batch_id}")
+
+    return flask.redirect("/")
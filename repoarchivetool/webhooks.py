@@ -0,0 +1,249 @@
+"""Applies GitHub webhook events to the stored repository information, so changes are picked up
+without a full scan.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long
+
+import hashlib
+import hmac
+import os
+from collections.abc import Callable
+
+import models
+
+# The secret set on the GitHub App's webhook, used to verify deliveries came from GitHub
+WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+
+
+def sign(secret: str, body: bytes) -> str:
+    """Creates the signature GitHub sends in the X-Hub-Signature-256 header.
+
+    ==========
+
+    Args:
+        secret (str): the webhook secret.
+        body (bytes): the raw request body.
+
+    Returns:
+        str: the signature (sha256=<hex HMAC-SHA256 of body>).
+    """
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def has_valid_signature(secret: str, body: bytes, signature: str | None) -> bool:
+    """Checks whether a webhook delivery was signed with the webhook secret.
+
+    ==========
+
+    Args:
+        secret (str): the webhook secret. If it is not set, no delivery is valid.
+        body (bytes): the raw request body.
+        signature (str): the X-Hub-Signature-256 header.
+
+    Returns:
+        bool
+    """
+    if not secret or signature is None:
+        return False
+
+    return hmac.compare_digest(signature, sign(secret, body))
+
+
+def get_event_organisation(payload: dict) -> str | None:
+    """Gets the organisation an event belongs to.
+
+    ==========
+
+    Args:
+        payload (dict): the event payload.
+
+    Returns:
+        str: the organisation's login, or None if the event does not belong to a repository or organisation.
+    """
+    if "organization" in payload:
+        return payload["organization"]["login"]
+
+    if "repository" in payload:
+        return payload["repository"]["owner"]["login"]
+
+    return None
+
+
+def is_sent_by_bot(payload: dict) -> bool:
+    """Checks whether an event was caused by a bot (i.e the tool's own GitHub App archiving a repository)."""
+    return payload.get("sender", {}).get("type") == "Bot"
+
+
+def find_repo(repos: list[models.Repository], name: str) -> int | None:
+    """Gets the index of a repository in a list of stored repositories, or None if it is not stored."""
+    for i, repo in enumerate(repos):
+        if repo.name == name:
+            return i
+
+    return None
+
+
+# Event handlers
+# Each handler is called with the event payload and the storage files it needs ({filename: decoded records}).
+# It updates the files' contents in place and returns the names of the files it changed.
+
+
+def remove_pending_repo(payload: dict, files: dict) -> set:
+    """Removes a repository from the list waiting to be archived.
+
+    Used for pushes, as the repository is no longer unused, and for repositories archived outside of the tool.
+    """
+    repos = files["repositories.json"]
+    i = find_repo(repos, payload["repository"]["name"])
+
+    if i is None:
+        return set()
+
+    repos.pop(i)
+
+    return {"repositories.json"}
+
+
+def remove_archived_repo(payload: dict, files: dict) -> set:
+    """Removes a repository from any archive batches, as it is no longer archived (or no longer exists)."""
+    changed = False
+
+    for batch in files["archived.json"]:
+        for i, repo in enumerate(batch.repos):
+            if repo.name == payload["repository"]["name"]:
+                batch.repos.pop(i)
+                changed = True
+                break
+
+    return {"archived.json"} if changed else set()
+
+
+def delete_repo(payload: dict, files: dict) -> set:
+    """Removes a deleted repository from the list waiting to be archived and from any archive batches."""
+    return remove_pending_repo(payload, files) | remove_archived_repo(payload, files)
+
+
+def rename_repo(payload: dict, files: dict) -> set:
+    """Updates the name and URLs of a renamed repository, wherever it is stored."""
+    old_name = payload["changes"]["repository"]["name"]["from"]
+    new_name = payload["repository"]["name"]
+    api_url = payload["repository"]["url"]
+    html_url = payload["repository"]["html_url"]
+
+    changed = set()
+
+    i = find_repo(files["repositories.json"], old_name)
+
+    if i is not None:
+        files["repositories.json"][i].name = new_name
+        files["repositories.json"][i].api_url = api_url
+        files["repositories.json"][i].html_url = html_url
+        changed.add("repositories.json")
+
+    for batch in files["archived.json"]:
+        for repo in batch.repos:
+            if repo.name == old_name:
+                repo.name = new_name
+                repo.api_url = api_url
+                repo.html_url = html_url
+                changed.add("archived.json")
+
+    return changed
+
+
+def update_repo_type(payload: dict, files: dict) -> set:
+    """Updates the type of a repository which has been made public or private."""
+    repos = files["repositories.json"]
+    i = find_repo(repos, payload["repository"]["name"])
+
+    if i is None:
+        return set()
+
+    repos[i].type = payload["repository"]["visibility"]
+
+    return {"repositories.json"}
+
+
+def add_member(payload: dict, files: dict) -> set:
+    """Adds a new collaborator to a repository's contributors, so they are shown as someone to contact."""
+    repos = files["repositories.json"]
+    i = find_repo(repos, payload["repository"]["name"])
+    member = payload["member"]
+
+    # contributors is an error message if they could not be fetched
+    if i is None or not isinstance(repos[i].contributors, list):
+        return set()
+
+    if any(contributor.login == member["login"] for contributor in repos[i].contributors):
+        return set()
+
+    repos[i].contributors.append(
+        models.Contributor(
+            login=member["login"],
+            avatar=member["avatar_url"],
+            url=member["html_url"],
+            contributions=0,
+        )
+    )
+
+    return {"repositories.json"}
+
+
+def remove_member(payload: dict, files: dict) -> set:
+    """Removes a collaborator from a repository's contributors if they were added by add_member() (have no contributions)."""
+    repos = files["repositories.json"]
+    i = find_repo(repos, payload["repository"]["name"])
+
+    if i is None or not isinstance(repos[i].contributors, list):
+        return set()
+
+    contributors = [
+        contributor
+        for contributor in repos[i].contributors
+        if contributor.login != payload["member"]["login"] or contributor.contributions > 0
+    ]
+
+    if len(contributors) == len(repos[i].contributors):
+        return set()
+
+    repos[i].contributors = contributors
+
+    return {"repositories.json"}
+
+
+# {(event, action): (handler, the storage files the handler needs)}
+# Push events have no action.
+handlers: dict[tuple[str, str | None], tuple[Callable[[dict, dict], set], tuple[str, ...]]] = {
+    ("push", None): (remove_pending_repo, ("repositories.json",)),
+    ("repository", "archived"): (remove_pending_repo, ("repositories.json",)),
+    ("repository", "unarchived"): (remove_archived_repo, ("archived.json",)),
+    ("repository", "deleted"): (delete_repo, ("repositories.json", "archived.json")),
+    ("repository", "renamed"): (rename_repo, ("repositories.json", "archived.json")),
+    ("repository", "publicized"): (update_repo_type, ("repositories.json",)),
+    ("repository", "privatized"): (update_repo_type, ("repositories.json",)),
+    ("member", "added"): (add_member, ("repositories.json",)),
+    ("member", "removed"): (remove_member, ("repositories.json",)),
+}
+
+
+def get_handler(event: str, payload: dict) -> tuple[Callable[[dict, dict], set], tuple[str, ...]] | None:
+    """Gets the handler for an event.
+
+    Archives and unarchives made by a bot are ignored, as the tool records its own changes when it makes them.
+    Handling them too would race with the tool's own write of the same files.
+
+    ==========
+
+    Args:
+        event (str): the X-GitHub-Event header.
+        payload (dict): the event payload.
+
+    Returns:
+        The handler and the storage files it needs, or None if the event is not handled.
+    """
+    action = None if event == "push" else payload.get("action")
+
+    if event == "repository" and action in ("archived", "unarchived") and is_sent_by_bot(payload):
+        return None
+
+    return handlers.get((event, action))
@@ -0,0 +1,339 @@
+"""Uploads local files to S3 in the background ("write-behind"), coalescing the writes made to each
+file while its upload waits.
+
+storage_interface.write_file() marks each file it writes and schedules its upload with the process's
+WriteBehindUploader, which makes the upload through storage_interface.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, R0902
+
+import contextlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from http import HTTPStatus
+
+import metrics
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Local files written by write_file are uploaded in the background ("write-behind"), so requests do not wait for S3.
+# Writes to a file within WRITE_BEHIND_DELAY seconds of each other are sent as one upload of its latest version,
+# which is made at most WRITE_BEHIND_MAX_DELAY seconds after the first of them. Failed uploads are retried after
+# WRITE_BEHIND_MAX_DELAY seconds.
+WRITE_BEHIND_ENABLED = True
+WRITE_BEHIND_DELAY = 0.5
+WRITE_BEHIND_MAX_DELAY = 5.0
+
+# A file with an upload pending has a marker beside it (<file>.pending), so every process sharing the directory
+# (i.e each of the production server's workers) keeps its newer local copy rather than downloading the older
+# one in S3. The marker holds the ID of the process which wrote the file, and is only removed once the file has
+# been uploaded, or its upload given up on. A marker left by a process which stopped before uploading is taken
+# over by the next process to check it, which makes the upload instead.
+
+# Uploads which fail because S3 cannot be reached are retried for as long as the process runs. Those which S3
+# refuses (a 4xx error, e.g the bucket does not exist) this many times in a row are given up on: the marker is
+# removed and the dropped write logged, so the local copy is replaced by S3's again.
+WRITE_BEHIND_MAX_REFUSALS = 10
+
+# Set while write_through() is in use
+_write_through = threading.Event()
+
+UPLOAD_METRIC = "repoarchive_write_behind_uploads_total"
+UPLOAD_METRIC_HELP = "Uploads made by the write-behind uploader, by result."
+COALESCED_METRIC = "repoarchive_write_behind_coalesced_writes_total"
+COALESCED_METRIC_HELP = "Writes to a local file which were added to an upload already pending."
+
+
+@contextlib.contextmanager
+def write_through() -> Iterator[None]:
+    """Uploads files within write_file() while the block runs, in every thread, rather than in the background.
+
+    Used for work done before the process forks (i.e warming up in gunicorn's master), so it does not start an
+    uploader thread which could be holding a lock when the workers are forked.
+    """
+    _write_through.set()
+
+    try:
+        yield
+    finally:
+        _write_through.clear()
+
+
+def is_write_through() -> bool:
+    """Checks whether write_through() is in use."""
+    return _write_through.is_set()
+
+
+def pending_file(filename: str) -> str:
+    """Returns the name of the marker of a local file with an upload pending (see WRITE_BEHIND_MAX_REFUSALS)."""
+    return f"{filename}.pending"
+
+
+def new_marker() -> bytes:
+    """Creates the marker of a write to a local file.
+
+    Markers are unique to each write, so an upload can tell whether the file has been written again since it started.
+    """
+    return f"{os.getpid()} {uuid.uuid4().hex}".encode()
+
+
+def read_marker(filename: str) -> bytes | None:
+    """Reads the marker of a local file, or returns None if it has no upload pending."""
+    try:
+        with open(pending_file(filename), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def marker_owner(marker: bytes) -> int | None:
+    """Returns the ID of the process which wrote a marker, or None if it was written by an older version of the tool."""
+    owner = marker.split(b" ", 1)[0]
+
+    return int(owner) if owner.isdigit() else None
+
+
+def is_running(pid: int | None) -> bool:
+    """Checks whether the process with the given ID is running."""
+    if pid is None:
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user
+        return True
+
+    return True
+
+
+def is_refused(result: bool | Exception) -> bool:
+    """Checks whether a failed upload was refused by S3, rather than failing to reach it (see WRITE_BEHIND_MAX_REFUSALS)."""
+    if not isinstance(result, ClientError):
+        return False
+
+    status = result.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+
+    return HTTPStatus.BAD_REQUEST <= status < HTTPStatus.INTERNAL_SERVER_ERROR and status not in (
+        HTTPStatus.REQUEST_TIMEOUT,
+        HTTPStatus.TOO_MANY_REQUESTS,
+    )
+
+
+@dataclass(slots=True)
+class PendingUpload:
+    """A file waiting to be uploaded by a WriteBehindUploader."""
+
+    # The time.monotonic() of the first write waiting to be uploaded
+    first: float
+    # The time.monotonic() the upload is due
+    due: float
+    # Called once the upload has been made
+    callbacks: list[Callable[[], None]] = field(default_factory=list)
+
+
+class WriteBehindUploader:
+    """Uploads local files to S3 from a background thread, coalescing the writes made to each file while it waits.
+
+    Each process has its own uploader (see storage_interface.get_uploader()), as its thread is not copied to
+    forked processes.
+    """
+
+    def __init__(
+        self,
+        delay: float,
+        max_delay: float,
+        upload: Callable[[str, str], bool | Exception],
+        give_up: Callable[[str, bytes | None, bool | Exception], None],
+    ) -> None:
+        """Creates the uploader. Its thread is started when the first upload is scheduled.
+
+        ==========
+
+        Args:
+            delay (float): seconds to wait after a file's last write before uploading it.
+            max_delay (float): the most seconds a file's first write waits to be uploaded, and between retries.
+            upload (Callable): uploads a file with an upload pending, called with the bucket and file name.
+                Returns True, or the error if the upload failed.
+            give_up (Callable): gives up on uploading a file, called with the file name, its marker when the
+                upload was attempted and the failed upload's result.
+        """
+        self.delay = delay
+        self.max_delay = max_delay
+        self.upload = upload
+        self.give_up = give_up
+        self._condition = threading.Condition()
+        # The files waiting to be uploaded ({(bucket, filename): PendingUpload})
+        self._pending: dict[tuple[str, str], PendingUpload] = {}
+        self._uploading: set[tuple[str, str]] = set()
+        # The number of times in a row each file's upload has been refused by S3 ({(bucket, filename): refusals})
+        self._refusals: dict[tuple[str, str], int] = {}
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, bucket: str, filename: str, on_uploaded: Callable[[], None] | None = None):
+        """Schedules a file to be uploaded, adding it to the upload already pending if there is one.
+
+        ==========
+
+        Args:
+            bucket (str): the name of the bucket to upload the file to
+            filename (str): the name of the file
+            on_uploaded (Callable): called from the uploader's thread once the file has been uploaded
+        """
+        key = (bucket, filename)
+        now = time.monotonic()
+
+        with self._condition:
+            pending = self._pending.get(key)
+
+            if pending is None:
+                pending = self._pending[key] = PendingUpload(now, now)
+            else:
+                metrics.inc(COALESCED_METRIC, 1, COALESCED_METRIC_HELP)
+
+            pending.due = min(now + self.delay, pending.first + self.max_delay)
+
+            if on_uploaded is not None:
+                pending.callbacks.append(on_uploaded)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+            self._condition.notify_all()
+
+    def _take(self, key: tuple[str, str]) -> list[Callable[[], None]]:
+        """Takes a pending upload to be made by the calling thread. The condition must be held."""
+        pending = self._pending.pop(key)
+        self._uploading.add(key)
+
+        return pending.callbacks
+
+    def _upload(self, key: tuple[str, str], callbacks: list[Callable[[], None]]) -> bool:
+        """Makes an upload taken with _take(), scheduling it to be retried if it fails.
+
+        The upload is given up on if S3 has refused it WRITE_BEHIND_MAX_REFUSALS times in a row.
+        """
+        marker = read_marker(key[1])
+
+        try:
+            result = self.upload(*key)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Any error (i.e S3 cannot be reached) must leave the upload pending to be retried, not stop the uploader
+            logger.warning("Uploading %s failed, so will be retried: %r", key[1], e)
+            result = e
+
+        with self._condition:
+            self._uploading.discard(key)
+
+            if is_refused(result):
+                self._refusals[key] = self._refusals.get(key, 0) + 1
+            else:
+                self._refusals.pop(key, None)
+
+            given_up = self._refusals.get(key, 0) >= WRITE_BEHIND_MAX_REFUSALS
+
+            if given_up:
+                # The callbacks of writes made since are dropped too, as their upload is also given up on
+                del self._refusals[key]
+                self._pending.pop(key, None)
+            elif result is not True:
+                # Retried later with any writes made since, and their callbacks
+                now = time.monotonic()
+                pending = self._pending.setdefault(key, PendingUpload(now, now))
+                pending.due = now + self.max_delay
+                pending.callbacks[:0] = callbacks
+
+            self._condition.notify_all()
+
+        if given_up:
+            self.give_up(key[1], marker, result)
+
+        outcome = "success" if result is True else "given_up" if given_up else "failure"
+        metrics.inc(UPLOAD_METRIC, 1, UPLOAD_METRIC_HELP, result=outcome)
+
+        if result is not True:
+            return False
+
+        for callback in callbacks:
+            callback()
+
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                ready = [key for key in self._pending if key not in self._uploading]
+
+                if len(ready) == 0:
+                    self._condition.wait()
+                    continue
+
+                key = min(ready, key=lambda key: self._pending[key].due)
+                wait = self._pending[key].due - time.monotonic()
+
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+
+                callbacks = self._take(key)
+
+            try:
+                self._upload(key, callbacks)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # The callbacks run any code given to write_file(), and a failed one must not stop the uploader
+                logger.exception("A callback of the upload of %s failed", key[1])
+
+    def flush(self, filenames: Iterable[str] | None = None) -> bool:
+        """Makes the pending uploads now, in the calling thread, waiting for any already being made.
+
+        ==========
+
+        Args:
+            filenames (list): the files to upload. If None is passed, every pending upload is made.
+
+        Returns:
+            bool: False if any of the uploads failed (they are retried later), otherwise True.
+        """
+        names = None if filenames is None else set(filenames)
+
+        # Uploads which fail are pending again, to be retried later rather than by this flush
+        failed: set[tuple[str, str]] = set()
+
+        while True:
+            with self._condition:
+                keys = [key for key in self._pending if key not in failed and (names is None or key[1] in names)]
+                in_flight = [key for key in self._uploading if names is None or key[1] in names]
+
+                if len(keys) == 0 and len(in_flight) == 0:
+                    return len(failed) == 0
+
+                ready = [key for key in keys if key not in self._uploading]
+
+                if len(ready) == 0:
+                    self._condition.wait()
+                    continue
+
+                key = ready[0]
+                callbacks = self._take(key)
+
+            if not self._upload(key, callbacks):
+                failed.add(key)
+
+    def discard(self, bucket: str, filename: str):
+        """Cancels a file's pending upload (i.e as it has been deleted), waiting for one already being made."""
+        key = (bucket, filename)
+
+        with self._condition:
+            self._pending.pop(key, None)
+
+            while key in self._uploading:
+                self._condition.wait()
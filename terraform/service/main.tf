@@ -61,8 +61,30 @@ resource "aws_ecs_task_definition" "ecs_service_definition" {
         {
           name = "AWS_SECRET_NAME"
           value = var.aws_secret_name
+        },
+        {
+          name = "GITHUB_WEBHOOK_SECRET"
+          value = var.github_webhook_secret
+        },
+        {
+          name  = "GUNICORN_WORKERS"
+          value = tostring(var.gunicorn_workers)
+        },
+        {
+          name  = "GUNICORN_THREADS"
+          value = tostring(var.gunicorn_threads)
+        },
+        {
+          name  = "GUNICORN_TIMEOUT"
+          value = tostring(var.gunicorn_timeout)
+        },
+        {
+          name  = "GUNICORN_GRACEFUL_TIMEOUT"
+          value = tostring(var.gunicorn_graceful_timeout)
         }
       ],
+      # Give requests in flight time to finish before the container is killed (Fargate allows at most 120 seconds)
+      stopTimeout = min(var.gunicorn_graceful_timeout + 10, 120),
       logConfiguration = {
         logDriver = "awslogs",
         options = {
@@ -102,6 +102,36 @@ variable "github_app_client_id" {
   type        = string
 }
 
+variable "github_webhook_secret" {
+  description = "Secret used to verify the Github App's webhook deliveries"
+  type        = string
+  default     = ""
+}
+
+variable "gunicorn_workers" {
+  description = "Number of worker processes serving the tool"
+  type        = number
+  default     = 2
+}
+
+variable "gunicorn_threads" {
+  description = "Number of threads per worker process"
+  type        = number
+  default     = 4
+}
+
+variable "gunicorn_timeout" {
+  description = "Seconds a request may run before its worker is restarted"
+  type        = number
+  default     = 900
+}
+
+variable "gunicorn_graceful_timeout" {
+  description = "Seconds given to requests in flight when the service is stopped"
+  type        = number
+  default     = 90
+}
+
 variable "project_tag" {
   description = "Project"
   type        = string
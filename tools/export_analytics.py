@@ -0,0 +1,60 @@
+"""Exports every configured organisation's stored repositories and archive batches as Parquet datasets in S3.
+
+Usage (from the project root, with the same environment variables as the tool):
+
+    poetry install --extras analytics
+    poetry run python tools/export_analytics.py
+
+Archive runs only export the batch they create (see export_analytics() in organisation_storage.py), so this backfills the batches
+archived before analytics_export was enabled, or any exports which failed. It also exports today's repositories
+and contributors. --batches limits the export to the given batch IDs.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+import analytics  # noqa: E402
+import organisation_storage  # noqa: E402
+import settings  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--organisations", nargs="+", help="organisations to export (defaults to all of GITHUB_ORG)")
+    parser.add_argument("--batches", type=int, nargs="+", help="IDs of the archive batches to export (defaults to all)")
+    args = parser.parse_args()
+
+    if not analytics.is_available():
+        print("pyarrow is not installed (poetry install --extras analytics)")
+        return 1
+
+    failed = 0
+
+    for org in args.organisations or settings.organisations:
+        repos = organisation_storage.load_repositories(org)
+        batches = [
+            batch
+            for batch in organisation_storage.load_archive_list(org)
+            if args.batches is None or batch.batch_id in args.batches
+        ]
+
+        failures = organisation_storage.write_analytics(org, repos, batches)
+        failed += len(failures)
+
+        print(f"{org}: exported {len(repos)} repositories and {len(batches)} archive batches")
+
+        for filename in failures:
+            print(f"  - could not write {filename}")
+
+    return 1 if failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
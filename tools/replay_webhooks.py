@@ -0,0 +1,240 @@
+"""Replays recorded GitHub webhook events against a running instance of the tool.
+
+Usage (from the project root, with the tool running locally):
+
+    export GITHUB_WEBHOOK_SECRET=<the secret the tool was started with>
+    poetry run python tools/replay_webhooks.py
+
+Each event file holds the event name (sent as X-GitHub-Event) and its payload:
+
+    {"event": "push", "payload": {...}}
+
+Files are replayed in name order. By default the sample events in repoarchivetool/test_data/webhooks are replayed.
+They refer to the repositories in test_repositories.json, so can be used after inserting the test data (/insert_test_data).
+
+With --check, the events are replayed against the tool in this process instead, with an in-memory S3 holding
+test_repositories.json and test_archived.json, as CI does (make webhook-check):
+
+    poetry run python tools/replay_webhooks.py --check
+
+After each event, the fields webhooks change are read back from S3 and compared with the state expected after it
+(test_data/webhooks_expected.json). The script exits with a non-zero status if any event fails or any state differs.
+--update-expected rewrites the expected states from the replay, i.e after adding an event; review the changes.
+"""
+
+# pylint: disable=locally-disabled, multiple-statements, fixme, line-too-long, C0103
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT / "repoarchivetool"))
+
+import webhooks  # noqa: E402
+
+TEST_DATA = PROJECT_ROOT / "repoarchivetool" / "test_data"
+DEFAULT_EVENTS = TEST_DATA / "webhooks"
+
+# The organisation of the sample events, and the files stored for it before they are replayed by --check
+CHECK_ORG = "ONS-Innovation"
+CHECK_FILES = {
+    "repositories.json": TEST_DATA / "test_repositories.json",
+    "archived.json": TEST_DATA / "test_archived.json",
+}
+
+# The state expected after each sample event ({event file name: state, see summarise()})
+EXPECTED_STATES = TEST_DATA / "webhooks_expected.json"
+
+
+def get_event_files(paths: list) -> list:
+    """Gets the event files to replay, expanding any directories into the JSON files they contain."""
+    files = []
+
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.json")))
+        else:
+            files.append(path)
+
+    return files
+
+
+def set_organisation(payload: dict, org: str) -> None:
+    """Changes the organisation an event belongs to, so recorded events can be replayed against any organisation."""
+    if "organization" in payload:
+        payload["organization"]["login"] = org
+
+    if "repository" in payload:
+        payload["repository"]["owner"]["login"] = org
+        payload["repository"]["full_name"] = f"{org}/{payload['repository']['name']}"
+
+
+def get_headers(secret: str, event: str, body: bytes) -> dict:
+    """Gets the headers GitHub sends with an event, including its signature."""
+    return {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": event,
+        "X-GitHub-Delivery": str(uuid.uuid4()),
+        "X-Hub-Signature-256": webhooks.sign(secret, body),
+    }
+
+
+def replay(url: str, secret: str, event: str, payload: dict) -> requests.Response:
+    """Sends an event to the webhook endpoint, signed as GitHub signs it."""
+    body = json.dumps(payload).encode()
+
+    return requests.post(url, data=body, headers=get_headers(secret, event, body), timeout=30)
+
+
+def summarise(repos: list, batches: list) -> dict:
+    """Summarises the fields of the stored files which webhooks change, to compare with the expected state."""
+    return {
+        "repositories": {
+            repo["name"]: {
+                "type": repo["type"],
+                "apiUrl": repo["apiUrl"],
+                "htmlUrl": repo.get("htmlUrl", ""),
+                "contributors": (
+                    [contributor["login"] for contributor in repo["contributors"]]
+                    if isinstance(repo["contributors"], list)
+                    else repo["contributors"]
+                ),
+            }
+            for repo in repos
+        },
+        "archived": {
+            str(batch["batchID"]): {
+                repo["name"]: {"apiurl": repo["apiurl"], "htmlurl": repo.get("htmlurl", "")} for repo in batch["repos"]
+            }
+            for batch in batches
+        },
+    }
+
+
+def check(paths: list, update_expected: bool) -> int:
+    """Replays events against the tool in this process and compares the stored state after each with the expected one.
+
+    ==========
+
+    Args:
+        paths (list): the event files or directories to replay.
+        update_expected (bool): whether to write the states after each event to EXPECTED_STATES instead.
+
+    Returns:
+        int: the number of events which failed or did not leave the expected state.
+    """
+    sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+
+    import app as archive_tool
+    import settings
+    import storage_interface
+    from local_s3 import LocalS3
+
+    s3 = LocalS3()
+    storage_interface.get_s3_client = lambda: s3
+    settings.organisations = [CHECK_ORG]
+
+    secret = uuid.uuid4().hex
+    webhooks.WEBHOOK_SECRET = secret
+
+    client = archive_tool.app.test_client()
+
+    expected = {}
+
+    if not update_expected:
+        with open(EXPECTED_STATES, encoding="utf-8") as f:
+            expected = json.load(f)
+
+    states = {}
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+
+        for filename, path in CHECK_FILES.items():
+            s3.put_object(Bucket=settings.bucket_name, Key=f"repo-archive/{filename}", Body=path.read_bytes())
+
+        for path in get_event_files(paths):
+            with open(path, encoding="utf-8") as f:
+                recorded = json.load(f)
+
+            body = json.dumps(recorded["payload"]).encode()
+            response = client.post("/webhooks/github", data=body, headers=get_headers(secret, recorded["event"], body))
+
+            storage_interface.flush_uploads()
+
+            states[path.name] = summarise(
+                storage_interface.read_object(settings.bucket_name, "repositories.json"),
+                storage_interface.read_object(settings.bucket_name, "archived.json"),
+            )
+
+            description = " ".join(filter(None, (recorded["event"], recorded["payload"].get("action"))))
+            matches = update_expected or states[path.name] == expected.get(path.name)
+            print(f"{response.status_code} {path.name} ({description}){'' if matches else ' - unexpected state'}")
+
+            if response.status_code != HTTPStatus.NO_CONTENT or not matches:
+                failures += 1
+
+            if not matches:
+                print(f"  expected: {json.dumps(expected.get(path.name))}")
+                print(f"  stored:   {json.dumps(states[path.name])}")
+
+        os.chdir(PROJECT_ROOT)
+
+    if update_expected:
+        with open(EXPECTED_STATES, "w", encoding="utf-8") as f:
+            json.dump(states, f, indent=4)
+            f.write("\n")
+
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=[str(DEFAULT_EVENTS)], help="event files or directories")
+    parser.add_argument("--url", default="http://localhost:5000/webhooks/github", help="the webhook endpoint")
+    parser.add_argument("--secret", default=os.getenv("GITHUB_WEBHOOK_SECRET", ""), help="the webhook secret")
+    parser.add_argument("--org", help="replay the events as if they belong to this organisation")
+    parser.add_argument(
+        "--check", action="store_true", help="replay against the tool in this process and check the results"
+    )
+    parser.add_argument("--update-expected", action="store_true", help="with --check, rewrite the expected states")
+    args = parser.parse_args()
+
+    if args.check:
+        return 1 if check(args.paths, args.update_expected) > 0 else 0
+
+    if not args.secret:
+        parser.error("a webhook secret is needed (--secret or GITHUB_WEBHOOK_SECRET)")
+
+    failures = 0
+
+    for path in get_event_files(args.paths):
+        with open(path, encoding="utf-8") as f:
+            recorded = json.load(f)
+
+        if args.org:
+            set_organisation(recorded["payload"], args.org)
+
+        response = replay(args.url, args.secret, recorded["event"], recorded["payload"])
+
+        description = " ".join(filter(None, (recorded["event"], recorded["payload"].get("action"))))
+        print(f"{response.status_code} {path.name} ({description})")
+
+        if not response.ok:
+            failures += 1
+
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())